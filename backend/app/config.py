@@ -76,16 +76,9 @@ def init_google_credentials():
         os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = _credentials_file
     return _credentials_file
 
-# Initialize credentials file (with error handling)
+# Written on first use (Speech client construction), never at import: importing the
+# app must not touch the filesystem or fail on missing service-account variables.
 _credentials_file = None
-try:
-    _credentials_file = get_google_credentials()
-    if _credentials_file:
-        os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = _credentials_file
-except Exception as e:
-    # Credentials will be initialized when services are first used (Speech-to-Text)
-    print(f"Warning: Could not initialize Google credentials at import: {e}")
-    _credentials_file = None
 
 
 def cleanup_google_credentials() -> None:
@@ -105,6 +98,31 @@ GOOGLE_LOCATION = os.getenv("GOOGLE_LOCATION", "us-central1")
 VERTEX_AI_API_KEY = os.getenv("VERTEX_AI_API_KEY", "")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY", VERTEX_AI_API_KEY)  # Fallback to Vertex AI key
 
+# Upstream endpoint overrides (e.g. http://127.0.0.1:8099 for the offline benchmark stand-in).
+# Empty means the real Google endpoints.
+VERTEX_API_ENDPOINT = os.getenv("VERTEX_API_ENDPOINT", "").strip().rstrip("/")
+SPEECH_API_ENDPOINT = os.getenv("SPEECH_API_ENDPOINT", "").strip().rstrip("/")
+
+# Vertex regions to route Gemini calls across (fastest healthy first, failover on
+# 429/5xx). Defaults to GOOGLE_LOCATION alone. VERTEX_REGION_ENDPOINTS maps regions
+# to explicit hosts, e.g. "us-central1=http://127.0.0.1:8099,europe-west4=http://127.0.0.1:8100".
+GOOGLE_LOCATIONS = [r.strip() for r in os.getenv("GOOGLE_LOCATIONS", "").split(",") if r.strip()] or [GOOGLE_LOCATION]
+VERTEX_REGION_ENDPOINTS = dict(
+    (k.strip(), v.strip().rstrip("/"))
+    for k, _, v in (item.partition("=") for item in os.getenv("VERTEX_REGION_ENDPOINTS", "").split(","))
+    if k.strip() and v.strip()
+)
+REGION_COOLDOWN_SECONDS = float(os.getenv("REGION_COOLDOWN_SECONDS", "30"))
+
+# Model routing (services/model_routing.py). Disabled: every call uses MODEL_FAST with
+# the API's default generation config. Enabled: inputs at or above the large-input
+# threshold go to MODEL_LARGE, and output/thinking budgets are set per operation.
+MODEL_ROUTING_ENABLED = os.getenv("MODEL_ROUTING_ENABLED", "false").lower() in ("1", "true", "yes")
+MODEL_FAST = os.getenv("MODEL_FAST", "gemini-2.5-flash-lite").strip()
+MODEL_LARGE = os.getenv("MODEL_LARGE", "gemini-2.5-flash").strip()
+MODEL_LARGE_INPUT_TOKENS = int(os.getenv("MODEL_LARGE_INPUT_TOKENS", "6000"))
+MODEL_THINKING_BUDGET = int(os.getenv("MODEL_THINKING_BUDGET", "1024"))
+
 # Database configuration
 def _running_in_docker() -> bool:
     # /.dockerenv is present in most Docker containers. Keep this lightweight.
@@ -175,8 +193,125 @@ else:
     )
 SQL_ECHO = os.getenv("SQL_ECHO", "false").lower() in ("1", "true", "yes")
 
+# Optional streaming replica for read-only handlers (GET /session/{id}). Reads for a
+# session go to the primary for READ_YOUR_WRITES_SECONDS after that session's last write.
+DATABASE_READ_URL = (os.getenv("DATABASE_READ_URL") or "").strip()
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+
+# Per-worker cache of serialized GET /session/{id} responses (0 disables it).
+SESSION_CACHE_TTL_SECONDS = float(os.getenv("SESSION_CACHE_TTL_SECONDS", "3"))
+SESSION_CACHE_MAX_ENTRIES = int(os.getenv("SESSION_CACHE_MAX_ENTRIES", "1024"))
+
+# Content-addressed blob storage: "zlib" or "none"; payloads smaller than the
+# threshold are stored raw since compression would not pay for itself.
+BLOB_COMPRESSION = os.getenv("BLOB_COMPRESSION", "zlib").strip().lower() or "zlib"
+BLOB_COMPRESSION_MIN_BYTES = int(os.getenv("BLOB_COMPRESSION_MIN_BYTES", "512"))
+
 # CORS (comma-separated origins; default localhost:3000)
 _cors_raw = os.getenv("CORS_ORIGINS", "http://localhost:3000").strip()
 CORS_ORIGINS = [o.strip() for o in _cors_raw.split(",") if o.strip()] or ["http://localhost:3000"]
 
 ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
+
+# Gemini context caching for large static system instructions. Instructions under
+# the minimum are sent inline (Vertex rejects caches below its token floor).
+CONTEXT_CACHE_ENABLED = os.getenv("CONTEXT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CONTEXT_CACHE_TTL_SECONDS = int(os.getenv("CONTEXT_CACHE_TTL_SECONDS", "3600"))
+CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("CONTEXT_CACHE_MIN_TOKENS", "1024"))
+
+# Transcript compaction: recent text kept verbatim for intent extraction, the
+# unsummarized size that triggers folding older text into the rolling summary,
+# and the target summary length (all in estimated tokens).
+TRANSCRIPT_TAIL_TOKENS = int(os.getenv("TRANSCRIPT_TAIL_TOKENS", "1500"))
+TRANSCRIPT_COMPACT_TRIGGER_TOKENS = int(os.getenv("TRANSCRIPT_COMPACT_TRIGGER_TOKENS", "3000"))
+TRANSCRIPT_SUMMARY_TOKENS = int(os.getenv("TRANSCRIPT_SUMMARY_TOKENS", "500"))
+
+# Semantic intent cache (optional; needs numpy + fastembed, see requirements-semantic.txt)
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+SEMANTIC_CACHE_MODEL = os.getenv("SEMANTIC_CACHE_MODEL", "BAAI/bge-small-en-v1.5").strip()
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.93"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "5000"))
+SEMANTIC_CACHE_PATH = os.getenv("SEMANTIC_CACHE_PATH", os.path.join(tempfile.gettempdir(), "intentify-semantic-cache"))
+SEMANTIC_CACHE_VERIFY_RATE = float(os.getenv("SEMANTIC_CACHE_VERIFY_RATE", "0.02"))
+
+# Cache shared by all workers of a deployment (context cache handles). Empty keeps it
+# in-process per worker; redis://host:6379/0 shares it (needs the `redis` package).
+CACHE_BACKEND_URL = os.getenv("CACHE_BACKEND_URL", "").strip()
+
+# Build the Speech client (and import its gRPC stack) during startup instead of on
+# the first audio request. Off by default so cold starts stay fast.
+WARMUP_ON_START = os.getenv("WARMUP_ON_START", "false").lower() in ("1", "true", "yes")
+
+# Event-loop lag monitor: scheduling delay histogram, plus a stack snapshot of the
+# loop thread (from a watchdog thread) when the loop stalls past the threshold. Off by default.
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "false").lower() in ("1", "true", "yes")
+LOOP_MONITOR_INTERVAL_MS = float(os.getenv("LOOP_MONITOR_INTERVAL_MS", "250"))
+LOOP_LAG_THRESHOLD_MS = float(os.getenv("LOOP_LAG_THRESHOLD_MS", "200"))
+
+# On-demand sampling profiler at POST /admin/profile. Off unless enabled and an
+# ADMIN_TOKEN is set; callers send "Authorization: Bearer <ADMIN_TOKEN>".
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "false").lower() in ("1", "true", "yes")
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "").strip()
+
+# Upstream scheduler (services/scheduler.py): concurrent Gemini / Speech calls per
+# worker, and how many calls may queue per priority class and per user before
+# requests are refused with 429. Concurrency 0 disables scheduling for that upstream.
+GEMINI_CONCURRENCY = int(os.getenv("GEMINI_CONCURRENCY", "32"))
+SPEECH_CONCURRENCY = int(os.getenv("SPEECH_CONCURRENCY", "16"))
+UPSTREAM_QUEUE_LIMIT = int(os.getenv("UPSTREAM_QUEUE_LIMIT", "128"))
+UPSTREAM_USER_QUEUE_LIMIT = int(os.getenv("UPSTREAM_USER_QUEUE_LIMIT", "16"))
+
+# Multi-frame screen capture (services/keyframes.py): at most SCREEN_MAX_FRAMES
+# uploads (or sampled video frames at SCREEN_VIDEO_SAMPLE_FPS) per capture, reduced
+# to SCREEN_MAX_KEYFRAMES that differ by at least KEYFRAME_MIN_DIFF (fraction of
+# perceptual-hash bits) and analyzed in one vision call.
+SCREEN_MAX_FRAMES = int(os.getenv("SCREEN_MAX_FRAMES", "30"))
+SCREEN_MAX_KEYFRAMES = int(os.getenv("SCREEN_MAX_KEYFRAMES", "4"))
+SCREEN_VIDEO_SAMPLE_FPS = float(os.getenv("SCREEN_VIDEO_SAMPLE_FPS", "1"))
+KEYFRAME_MIN_DIFF = float(os.getenv("KEYFRAME_MIN_DIFF", "0.06"))
+
+# Offline re-processing via batch prediction (services/batch.py, CLI: batch.py).
+# BATCH_BACKEND "local" runs exported files through generateContent in-process
+# (a file-based stand-in); "vertex" submits Vertex batch prediction jobs, staging
+# files under BATCH_GCS_URI (gs://bucket/prefix). A positive BATCH_POLL_INTERVAL_SECONDS
+# lets API workers poll submitted jobs and ingest their results.
+BATCH_BACKEND = os.getenv("BATCH_BACKEND", "local").strip().lower()
+BATCH_DIR = os.getenv("BATCH_DIR", os.path.join(tempfile.gettempdir(), "intentify-batch"))
+BATCH_GCS_URI = os.getenv("BATCH_GCS_URI", "").strip().rstrip("/")
+BATCH_MODEL = os.getenv("BATCH_MODEL", MODEL_FAST).strip()
+BATCH_POLL_INTERVAL_SECONDS = float(os.getenv("BATCH_POLL_INTERVAL_SECONDS", "0"))
+BATCH_INGEST_CHUNK = int(os.getenv("BATCH_INGEST_CHUNK", "500"))
+BATCH_LOCAL_CONCURRENCY = int(os.getenv("BATCH_LOCAL_CONCURRENCY", "4"))
+
+# Graceful shutdown: how long to wait for in-flight requests and background jobs.
+# Keep it below the orchestrator's termination grace period.
+DRAIN_TIMEOUT_SECONDS = float(os.getenv("DRAIN_TIMEOUT_SECONDS", "25"))
+
+# Speculative intent: extract in the background as soon as a capture completes, and
+# let /intent and /generate reuse the result while their inputs are unchanged.
+SPECULATIVE_INTENT_ENABLED = os.getenv("SPECULATIVE_INTENT_ENABLED", "false").lower() in ("1", "true", "yes")
+
+# Incremental intent refinement (services/intent_refinement.py): when the transcript
+# only grew since the stored intent, send the previous intent plus the new text (and
+# the screen summary only if it changed) instead of re-extracting from everything.
+# Full extraction after INTENT_REFINE_MAX_STEPS refinements in a row, for deltas over
+# INTENT_REFINE_MAX_DELTA_TOKENS, or when a refinement shares less than
+# INTENT_REFINE_MIN_SIMILARITY of its terms with the previous intent (drift).
+INTENT_REFINE_ENABLED = os.getenv("INTENT_REFINE_ENABLED", "false").lower() in ("1", "true", "yes")
+INTENT_REFINE_MAX_STEPS = int(os.getenv("INTENT_REFINE_MAX_STEPS", "5"))
+INTENT_REFINE_MAX_DELTA_TOKENS = int(os.getenv("INTENT_REFINE_MAX_DELTA_TOKENS", "1500"))
+INTENT_REFINE_MIN_SIMILARITY = float(os.getenv("INTENT_REFINE_MIN_SIMILARITY", "0.3"))
+
+# Idempotency-Key support for mutating POSTs: how long outcomes are kept, and how
+# long a retry waits on an original request that is still in progress.
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "120"))
+
+# Health: background prober interval (seconds) feeding /health/ready and /health/models.
+HEALTH_PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", "60"))
+READY_REQUIRE_UPSTREAM = os.getenv("READY_REQUIRE_UPSTREAM", "false").lower() in ("1", "true", "yes")
+
+# Tracing (Server-Timing header always; OTLP export only when an endpoint is set)
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() in ("1", "true", "yes")
+OTEL_EXPORTER_OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "").strip()
+OTEL_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "intentify-backend").strip() or "intentify-backend"
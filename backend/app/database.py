@@ -3,10 +3,32 @@ import logging
 
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
-from app.config import DATABASE_URL, SQL_ECHO
+from app.config import DATABASE_READ_URL, DATABASE_URL, SQL_ECHO
+from app import tracing
 
 logger = logging.getLogger(__name__)
 
+
+class TracedAsyncSession(AsyncSession):
+    """AsyncSession that records a "db" span around each round-trip."""
+
+    async def execute(self, *args, **kwargs):
+        with tracing.span("db", op="execute"):
+            return await super().execute(*args, **kwargs)
+
+    async def commit(self):
+        with tracing.span("db", op="commit"):
+            return await super().commit()
+
+    async def refresh(self, *args, **kwargs):
+        with tracing.span("db", op="refresh"):
+            return await super().refresh(*args, **kwargs)
+
+    async def rollback(self):
+        with tracing.span("db", op="rollback"):
+            return await super().rollback()
+
+
 engine = create_async_engine(
     DATABASE_URL,
     echo=SQL_ECHO,
@@ -15,13 +37,33 @@ engine = create_async_engine(
 
 AsyncSessionLocal = async_sessionmaker(
     engine,
-    class_=AsyncSession,
+    class_=TracedAsyncSession,
     expire_on_commit=False
 )
 
+# Replica for read-only handlers; the primary when DATABASE_READ_URL is unset.
+read_engine = create_async_engine(
+    DATABASE_READ_URL,
+    echo=SQL_ECHO,
+    future=True,
+) if DATABASE_READ_URL else engine
+
+AsyncReadSessionLocal = async_sessionmaker(
+    read_engine,
+    class_=TracedAsyncSession,
+    expire_on_commit=False
+) if DATABASE_READ_URL else AsyncSessionLocal
+
 Base = declarative_base()
 
 
+async def dispose_engines() -> None:
+    """Close pooled connections (primary and replica). Call last on shutdown."""
+    await engine.dispose()
+    if read_engine is not engine:
+        await read_engine.dispose()
+
+
 async def get_db():
     async with AsyncSessionLocal() as session:
         try:
@@ -30,9 +72,32 @@ async def get_db():
             await session.close()
 
 
+# Columns added after the initial schema. create_all() never alters existing tables,
+# so these are applied idempotently on startup.
+_COLUMN_PATCHES = [
+    "ALTER TABLE sessions ADD COLUMN IF NOT EXISTS screen_summary_hash VARCHAR(64) REFERENCES blobs(hash)",
+    "ALTER TABLE sessions ADD COLUMN IF NOT EXISTS structured_intent_hash VARCHAR(64) REFERENCES blobs(hash)",
+    "ALTER TABLE sessions ADD COLUMN IF NOT EXISTS transcript_summary TEXT",
+    "ALTER TABLE sessions ADD COLUMN IF NOT EXISTS transcript_summarized_chars INTEGER NOT NULL DEFAULT 0",
+    "ALTER TABLE sessions ADD COLUMN IF NOT EXISTS structured_intent_fingerprint VARCHAR(64)",
+    "ALTER TABLE sessions ADD COLUMN IF NOT EXISTS structured_intent_template VARCHAR(16)",
+    "ALTER TABLE sessions ADD COLUMN IF NOT EXISTS intent_transcript_chars INTEGER",
+    "ALTER TABLE sessions ADD COLUMN IF NOT EXISTS intent_transcript_hash VARCHAR(64)",
+    "ALTER TABLE sessions ADD COLUMN IF NOT EXISTS intent_screen_hash VARCHAR(64)",
+    "ALTER TABLE sessions ADD COLUMN IF NOT EXISTS intent_increments INTEGER NOT NULL DEFAULT 0",
+    "ALTER TABLE prompts ADD COLUMN IF NOT EXISTS raw_text_hash VARCHAR(64) REFERENCES blobs(hash)",
+    "ALTER TABLE prompts ADD COLUMN IF NOT EXISTS screenshot_summary_hash VARCHAR(64) REFERENCES blobs(hash)",
+    "ALTER TABLE prompts ADD COLUMN IF NOT EXISTS structured_intent_hash VARCHAR(64) REFERENCES blobs(hash)",
+    "ALTER TABLE prompts ADD COLUMN IF NOT EXISTS template_version VARCHAR(16)",
+    "ALTER TABLE idempotency_keys ADD COLUMN IF NOT EXISTS request_hash VARCHAR(64)",
+]
+
+
 async def _init_db_once():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        for statement in _COLUMN_PATCHES:
+            await conn.exec_driver_sql(statement)
 
 
 async def init_db(
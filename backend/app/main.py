@@ -1,17 +1,55 @@
+import asyncio
+import logging
+import time
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.config import CORS_ORIGINS, cleanup_google_credentials
-from app.database import init_db
-from app.routers import health, prompts, sessions
+from app import metrics, tracing
+from app.config import CORS_ORIGINS, WARMUP_ON_START, cleanup_google_credentials
+from app.database import dispose_engines, init_db
+from app.routers import admin, health, prompts, sessions
+from app.services import idempotency, shared_cache
+from app.services.batch import batch_poller
+from app.services.drain import drainer
+from app.services.loop_monitor import loop_monitor
+from app.services.probes import prober
+from app.services.scheduler import UpstreamBusy, set_tenant
+from app.services.semantic_cache import semantic_cache
+
+logger = logging.getLogger(__name__)
+
+
+async def warm_up() -> None:
+    try:
+        await asyncio.to_thread(sessions.speech_service.warm_up)
+    except Exception as e:
+        # The client is built again on first use; a failed warm-up must not block startup.
+        logger.warning("Speech client warm-up failed: %s", e)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
+    semantic_cache.load()
+    if WARMUP_ON_START:
+        await warm_up()
+    prober.start()
+    loop_monitor.start()
+    batch_poller.start()
     yield
+    # Let in-flight requests, upstream calls and background jobs finish before
+    # anything they depend on is torn down.
+    await drainer.drain()
+    await batch_poller.stop()
+    await loop_monitor.stop()
+    await prober.stop()
+    semantic_cache.snapshot()
+    await shared_cache.close_backend()
+    sessions.speech_service.close()
+    await dispose_engines()
     cleanup_google_credentials()
 
 
@@ -21,22 +59,90 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+@app.exception_handler(UpstreamBusy)
+async def upstream_busy(request: Request, exc: UpstreamBusy):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+@app.middleware("http")
+async def schedule_as_client(request: Request, call_next):
+    # Fair-scheduling tenant until a handler knows the session's user (scheduler.set_tenant_for).
+    set_tenant(f"client:{request.client.host}" if request.client else "anonymous")
+    return await call_next(request)
+
+
+@app.middleware("http")
+async def idempotent_requests(request: Request, call_next):
+    return await idempotency.handle(request, call_next)
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    with tracing.start_trace(f"{request.method} {request.url.path}") as root:
+        response = await call_next(request)
+    if root is not None:
+        response.headers["Server-Timing"] = tracing.server_timing(root)
+    return response
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template, not raw path, to keep cardinality bounded.
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        metrics.observe_request(request.method, route, status, time.perf_counter() - start)
+
+
+@app.middleware("http")
+async def drain_guard(request: Request, call_next):
+    # While draining, new work is refused so clients retry on another instance.
+    if drainer.draining and request.method == "POST" and not request.url.path.startswith("/admin/"):
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Server is shutting down"},
+            headers={"Retry-After": "1", "Connection": "close"},
+        )
+    drainer.request_started()
+    try:
+        return await call_next(request)
+    finally:
+        drainer.request_finished()
+
+# Added last so it is the outermost middleware: responses produced by the
+# middlewares above (idempotent replays, drain 503s) carry CORS headers too.
 app.add_middleware(
     CORSMiddleware,
     allow_origins=CORS_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Retry-After", idempotency.REPLAYED_HEADER],
 )
 
 app.include_router(sessions.router, prefix="/session", tags=["sessions"])
 app.include_router(prompts.router, prefix="/prompts", tags=["prompts"])
 app.include_router(health.router, prefix="/health", tags=["health"])
+app.include_router(admin.router, prefix="/admin", tags=["admin"], include_in_schema=False)
 
 @app.get("/")
 async def root():
     return {"message": "Intentify API"}
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
 @app.get("/health")
 async def health():
     return {"status": "healthy"}
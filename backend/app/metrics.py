@@ -0,0 +1,246 @@
+"""
+Prometheus metrics, exposed at GET /metrics.
+Collectors are plain prometheus_client counters/histograms (a lock and an add
+per observation), cheap enough to stay on in production. Under multiple workers
+(PROMETHEUS_MULTIPROC_DIR set, see gunicorn.conf.py) /metrics aggregates all of them.
+"""
+from __future__ import annotations
+
+import os
+import time
+import urllib.error
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "intentify_http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=_LATENCY_BUCKETS,
+)
+UPSTREAM_SECONDS = Histogram(
+    "intentify_upstream_duration_seconds",
+    "Outbound call latency by upstream (text, vision, speech)",
+    ["upstream"],
+    buckets=_LATENCY_BUCKETS,
+)
+UPSTREAM_ERRORS = Counter(
+    "intentify_upstream_errors_total",
+    "Outbound call failures by upstream and reason",
+    ["upstream", "reason"],
+)
+GEMINI_TOKENS = Counter(
+    "intentify_gemini_tokens_total",
+    "Gemini token usage reported in usageMetadata",
+    ["upstream", "kind"],
+)
+PROMPT_TOKENS = Histogram(
+    "intentify_gemini_prompt_tokens",
+    "Uncached prompt tokens per Gemini call (promptTokenCount - cachedContentTokenCount); "
+    "mode=cached when a cachedContent handle was used",
+    ["upstream", "mode"],
+    buckets=(64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768),
+)
+UPLOAD_BYTES = Counter(
+    "intentify_upload_bytes_total",
+    "Bytes received from clients and sent upstream, by kind (audio, screen)",
+    ["kind"],
+)
+CACHE_REQUESTS = Counter(
+    "intentify_cache_requests_total",
+    "Cache lookups by cache name and result (hit/miss)",
+    ["cache", "result"],
+)
+SEMANTIC_SIMILARITY = Histogram(
+    "intentify_semantic_cache_similarity",
+    "Best-match cosine similarity per semantic cache lookup",
+    buckets=(0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.92, 0.94, 0.96, 0.98, 1.0),
+)
+SEMANTIC_AGREEMENT = Histogram(
+    "intentify_semantic_cache_agreement",
+    "Similarity between a cached intent and a sampled fresh extraction for the same request",
+    buckets=(0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.92, 0.94, 0.96, 0.98, 1.0),
+)
+LOOP_LAG_SECONDS = Histogram(
+    "intentify_event_loop_lag_seconds",
+    "How late the event loop ran a timer scheduled by the lag monitor",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+MODEL_ROUTES = Counter(
+    "intentify_model_route_total",
+    "Gemini calls by operation, routing tier and model",
+    ["operation", "tier", "model"],
+)
+REGION_CALLS = Counter(
+    "intentify_vertex_region_calls_total",
+    "Vertex calls per region by outcome (ok, http_429, http_5xx, network)",
+    ["region", "outcome"],
+)
+DB_READS = Counter(
+    "intentify_db_reads_total",
+    "Read-only handler sessions by target (replica, or primary for read-your-writes)",
+    ["target"],
+)
+REPLICA_LAG_SECONDS = Gauge(
+    "intentify_db_replica_lag_seconds",
+    "Replay lag of the read replica as of the last health probe",
+    multiprocess_mode="livemax",
+)
+SINGLEFLIGHT_COALESCED = Counter(
+    "intentify_singleflight_coalesced_total",
+    "Calls that joined an identical in-flight upstream request instead of issuing their own",
+    ["group"],
+)
+UPSTREAM_QUEUE_DEPTH = Gauge(
+    "intentify_upstream_queue_depth",
+    "Calls waiting for an upstream slot, by upstream and priority class",
+    ["upstream", "priority"],
+    multiprocess_mode="livesum",
+)
+UPSTREAM_QUEUE_WAIT_SECONDS = Histogram(
+    "intentify_upstream_queue_wait_seconds",
+    "Time spent waiting for an upstream slot, by upstream and priority class",
+    ["upstream", "priority"],
+    buckets=_LATENCY_BUCKETS,
+)
+UPSTREAM_REJECTED = Counter(
+    "intentify_upstream_rejected_total",
+    "Calls refused with 429 because the upstream queue was full",
+    ["upstream", "priority"],
+)
+BATCH_ITEMS = Counter(
+    "intentify_batch_items_total",
+    "Batch re-processing results by stage and outcome (ingested, skipped as changed since export, failed)",
+    ["stage", "outcome"],
+)
+
+INTENT_EXTRACTIONS = Counter(
+    "intentify_intent_extractions_total",
+    "Intent extractions by mode (full, incremental, unchanged) and why a refinement fell back to full",
+    ["mode", "reason"],
+)
+
+# usageMetadata field -> kind label
+_USAGE_FIELDS = {
+    "promptTokenCount": "prompt",
+    "candidatesTokenCount": "output",
+    "thoughtsTokenCount": "thoughts",
+    "cachedContentTokenCount": "cached",
+    "totalTokenCount": "total",
+}
+
+
+def render() -> tuple[bytes, str]:
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import CollectorRegistry, multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def observe_request(method: str, route: str, status: int, seconds: float) -> None:
+    HTTP_REQUEST_SECONDS.labels(method, route, str(status)).observe(seconds)
+
+
+def record_usage(upstream: str, usage: Optional[dict], mode: str = "inline") -> None:
+    if not usage:
+        return
+    prompt_tokens = usage.get("promptTokenCount")
+    if prompt_tokens:
+        PROMPT_TOKENS.labels(upstream, mode).observe(prompt_tokens - usage.get("cachedContentTokenCount", 0))
+    for field, kind in _USAGE_FIELDS.items():
+        value = usage.get(field)
+        if value:
+            GEMINI_TOKENS.labels(upstream, kind).inc(value)
+
+
+def record_upload(kind: str, size: int) -> None:
+    UPLOAD_BYTES.labels(kind).inc(size)
+
+
+def cache_hit(cache: str) -> None:
+    CACHE_REQUESTS.labels(cache, "hit").inc()
+
+
+def cache_miss(cache: str) -> None:
+    CACHE_REQUESTS.labels(cache, "miss").inc()
+
+
+def observe_semantic_similarity(similarity: float) -> None:
+    SEMANTIC_SIMILARITY.observe(similarity)
+
+
+def observe_semantic_agreement(agreement: float) -> None:
+    SEMANTIC_AGREEMENT.observe(agreement)
+
+
+def observe_loop_lag(seconds: float) -> None:
+    LOOP_LAG_SECONDS.observe(seconds)
+
+
+def record_model_route(operation: str, tier: str, model: str) -> None:
+    MODEL_ROUTES.labels(operation, tier, model).inc()
+
+
+def record_region(region: str, outcome: str) -> None:
+    REGION_CALLS.labels(region, outcome).inc()
+
+
+def record_read_route(target: str) -> None:
+    DB_READS.labels(target).inc()
+
+
+def set_replica_lag(seconds: float) -> None:
+    REPLICA_LAG_SECONDS.set(seconds)
+
+
+def record_coalesced(group: str) -> None:
+    SINGLEFLIGHT_COALESCED.labels(group).inc()
+
+
+def set_queue_depth(upstream: str, priority: str, depth: int) -> None:
+    UPSTREAM_QUEUE_DEPTH.labels(upstream, priority).set(depth)
+
+
+def observe_queue_wait(upstream: str, priority: str, seconds: float) -> None:
+    UPSTREAM_QUEUE_WAIT_SECONDS.labels(upstream, priority).observe(seconds)
+
+
+def record_upstream_rejected(upstream: str, priority: str) -> None:
+    UPSTREAM_REJECTED.labels(upstream, priority).inc()
+
+
+def record_batch_items(stage: str, outcome: str, count: int) -> None:
+    if count:
+        BATCH_ITEMS.labels(stage, outcome).inc(count)
+
+
+def record_intent_extraction(mode: str, reason: str = "") -> None:
+    INTENT_EXTRACTIONS.labels(mode, reason).inc()
+
+
+def _error_reason(e: BaseException) -> str:
+    if isinstance(e, urllib.error.HTTPError):
+        return f"http_{e.code}"
+    if isinstance(e, TimeoutError):
+        return "timeout"
+    return type(e).__name__
+
+
+@contextmanager
+def track_upstream(upstream: str) -> Iterator[None]:
+    """Observe latency of an outbound call and count its failures."""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        UPSTREAM_ERRORS.labels(upstream, _error_reason(e)).inc()
+        raise
+    finally:
+        UPSTREAM_SECONDS.labels(upstream).observe(time.perf_counter() - start)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Text, DateTime, Integer, JSON, ForeignKey
+from sqlalchemy import Column, String, Text, DateTime, Integer, JSON, ForeignKey, LargeBinary, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 from datetime import datetime
@@ -22,6 +22,23 @@ class Session(Base):
     transcript = Column(Text, nullable=True)
     screen_summary = Column(Text, nullable=True)
     structured_intent = Column(JSON, nullable=True)
+    # Content-addressed references into blobs; the inline columns above are legacy.
+    screen_summary_hash = Column(String(64), ForeignKey("blobs.hash"), nullable=True)
+    structured_intent_hash = Column(String(64), ForeignKey("blobs.hash"), nullable=True)
+    # Rolling summary of transcript[:transcript_summarized_chars]; see services/transcript.py.
+    transcript_summary = Column(Text, nullable=True)
+    transcript_summarized_chars = Column(Integer, nullable=False, default=0, server_default="0")
+    # Fingerprint of the (transcript, screen summary) the stored intent was extracted from.
+    structured_intent_fingerprint = Column(String(64), nullable=True)
+    # intent.TEMPLATE_VERSION the stored intent was extracted with; see services/batch.py.
+    structured_intent_template = Column(String(16), nullable=True)
+    # What the stored intent covers, for incremental refinement (services/intent_refinement.py):
+    # transcript[:intent_transcript_chars] and its hash, the screen summary hash, and
+    # refinements applied since the last full extraction.
+    intent_transcript_chars = Column(Integer, nullable=True)
+    intent_transcript_hash = Column(String(64), nullable=True)
+    intent_screen_hash = Column(String(64), nullable=True)
+    intent_increments = Column(Integer, nullable=False, default=0, server_default="0")
 
 class Prompt(Base):
     __tablename__ = "prompts"
@@ -35,3 +52,57 @@ class Prompt(Base):
     detailed_prompt = Column(Text, nullable=True)
     expert_prompt = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    raw_text_hash = Column(String(64), ForeignKey("blobs.hash"), nullable=True)
+    screenshot_summary_hash = Column(String(64), ForeignKey("blobs.hash"), nullable=True)
+    structured_intent_hash = Column(String(64), ForeignKey("blobs.hash"), nullable=True)
+    # prompt.TEMPLATE_VERSION the prompts were generated with.
+    template_version = Column(String(16), nullable=True)
+
+class Blob(Base):
+    """Content-addressed storage for large, frequently repeated text (sha256 of the raw bytes)."""
+    __tablename__ = "blobs"
+    
+    hash = Column(String(64), primary_key=True)
+    encoding = Column(String(16), nullable=False, default="raw")
+    size = Column(Integer, nullable=False)
+    data = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class IdempotencyKey(Base):
+    """Stored outcome of a mutating request sent with an Idempotency-Key header."""
+    __tablename__ = "idempotency_keys"
+    
+    key = Column(String(255), primary_key=True)
+    path = Column(String(512), primary_key=True)
+    # sha256 of method + body; a retry with a different hash is refused (422).
+    request_hash = Column(String(64), nullable=True)
+    status = Column(String(16), nullable=False, default="in_progress")
+    response_status = Column(Integer, nullable=True)
+    response_body = Column(LargeBinary, nullable=True)
+    content_type = Column(String(128), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (Index("ix_idempotency_keys_expires_at", "expires_at"),)
+
+class BatchJob(Base):
+    """Offline re-processing job (services/batch.py): one exported JSONL file and its backend job."""
+    __tablename__ = "batch_jobs"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    stage = Column(String(16), nullable=False)  # intent | prompt
+    backend = Column(String(16), nullable=False)
+    template_version = Column(String(16), nullable=False)
+    # exported -> submitted -> succeeded -> ingesting -> ingested, or failed
+    status = Column(String(16), nullable=False, default="exported")
+    external_id = Column(String(512), nullable=True)
+    input_path = Column(Text, nullable=False)
+    request_count = Column(Integer, nullable=False, default=0)
+    ingested_count = Column(Integer, nullable=False, default=0)
+    skipped_count = Column(Integer, nullable=False, default=0)
+    failed_count = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (Index("ix_batch_jobs_status", "status"),)
@@ -0,0 +1,53 @@
+import asyncio
+import hmac
+
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from app.config import ADMIN_TOKEN, PROFILER_ENABLED
+from app.services import profiler
+from app.services.drain import drainer
+
+router = APIRouter()
+
+MAX_PROFILE_SECONDS = 60.0
+
+
+def _require_admin(authorization: str | None, enabled: bool = True) -> None:
+    if not enabled or not ADMIN_TOKEN:
+        # Indistinguishable from a missing route while disabled.
+        raise HTTPException(status_code=404, detail="Not Found")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.strip(), ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+@router.post("/profile", response_class=PlainTextResponse)
+async def profile(
+    seconds: float = Query(10.0, gt=0, le=MAX_PROFILE_SECONDS),
+    interval_ms: float = Query(10.0, ge=1, le=1000),
+    idle: bool = Query(False, description="Include threads parked in waits"),
+    authorization: str | None = Header(None),
+):
+    """
+    Sample this worker's Python stacks for `seconds` and return folded stacks
+    (flamegraph.pl / speedscope / inferno input). Admin only; one profile at a time.
+    """
+    _require_admin(authorization, PROFILER_ENABLED)
+    if profiler.busy():
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    folded = await asyncio.to_thread(profiler.sample, seconds, interval_ms / 1000.0, idle)
+    if folded is None:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    return PlainTextResponse(folded)
+
+
+@router.post("/drain")
+async def drain(authorization: str | None = Header(None)):
+    """
+    Enter drain mode ahead of SIGTERM: readiness turns 503 and new POSTs are refused
+    while in-flight work finishes. Poll /health/ready (or the returned counters).
+    """
+    _require_admin(authorization)
+    drainer.start()
+    return drainer.status()
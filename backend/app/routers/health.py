@@ -1,19 +1,43 @@
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
 
 from app.config import GOOGLE_LOCATION, GOOGLE_PROJECT_ID
-from app.services import gemini_rest
+from app.services.probes import prober
+from app.services.regions import router as regions
 
 router = APIRouter()
 
 
+@router.get("/live")
+async def liveness():
+    """Process is up and serving. No I/O."""
+    return {"status": "alive"}
+
+
+@router.get("/ready")
+async def readiness():
+    """
+    Ready when the last background DB probe succeeded (and, with
+    READY_REQUIRE_UPSTREAM, the last Gemini probe). Answers from cached state.
+    """
+    ready, details = prober.readiness()
+    return JSONResponse(status_code=200 if ready else 503, content=details)
+
+
 @router.get("/models")
 async def check_available_models():
     """
-    Check Gemini REST (gemini-2.5-flash-lite) availability via API key.
+    Last-known Gemini REST (gemini-2.5-flash-lite) status from the background prober.
+    Does not make an outbound call.
     """
-    result = await gemini_rest.check_model()
     return {
         "project_id": GOOGLE_PROJECT_ID,
         "location": GOOGLE_LOCATION,
-        "gemini": result,
+        "gemini": prober.gemini,
     }
+
+
+@router.get("/regions")
+async def region_stats():
+    """Per-region routing state for Vertex calls: health, latency EWMA, errors, failovers."""
+    return {"regions": regions.stats()}
@@ -6,8 +6,14 @@ import logging
 from app.database import get_db
 from app.models import Session as SessionModel, Prompt as PromptModel
 from app.schemas import GenerateRequest, PromptGenerateResponse, IntentExtractResponse
-from app.services.intent import IntentService
-from app.services.prompt import PromptService
+from app.services import blobstore, session_cache
+from app.services.intent import TEMPLATE_VERSION as INTENT_TEMPLATE_VERSION, IntentService
+from app.services.intent_refinement import coverage, intent_refiner
+from app.services.prompt import TEMPLATE_VERSION as PROMPT_TEMPLATE_VERSION, PromptService
+from app.services.scheduler import UpstreamBusy, set_tenant_for
+from app.services.semantic_cache import semantic_cache
+from app.services.speculation import fingerprint, speculative_intent
+from app.services.transcript import transcript_compactor
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
@@ -16,6 +22,29 @@ router = APIRouter()
 intent_service = IntentService()
 prompt_service = PromptService()
 
+
+async def _resolve_intent(db: AsyncSession, session, previous_intent, transcript: str, screen_summary: str):
+    """
+    Structured intent for the inputs: refined from the previous intent when only new
+    transcript text arrived, else from the semantic cache when a close enough match
+    exists, else extracted by Gemini. Returns (structured_intent, semantic query,
+    intent coverage columns).
+    """
+    refinement = await intent_refiner.refine(session, previous_intent, transcript, screen_summary)
+    if refinement is not None:
+        return refinement.structured_intent, None, refinement.state
+    transcript_context = await transcript_compactor.prepare(db, session, transcript)
+    state = coverage(transcript, screen_summary)
+    query = await semantic_cache.query(transcript_context, screen_summary)
+    if query is not None and query.hit is not None:
+        semantic_cache.maybe_verify(
+            query, lambda: intent_service.extract_intent(transcript_context, screen_summary)
+        )
+        return query.hit.structured_intent, query, state
+    structured_intent = await intent_service.extract_intent(transcript_context, screen_summary)
+    semantic_cache.store(query, structured_intent)
+    return structured_intent, query, state
+
 @router.post("/{session_id}/intent", response_model=IntentExtractResponse)
 async def extract_intent(
     session_id: str,
@@ -39,34 +68,47 @@ async def extract_intent(
 
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
+        set_tenant_for(session)
 
+        stored_summary, stored_intent = await blobstore.load_session_fields(db, session)
         transcript = (body.transcript if body and body.transcript is not None else None) or (session.transcript or "")
-        screen_summary = (body.screen_summary if body and body.screen_summary is not None else None) or (session.screen_summary or "")
+        screen_summary = (body.screen_summary if body and body.screen_summary is not None else None) or (stored_summary or "")
 
         if not transcript.strip() and not screen_summary.strip():
             raise HTTPException(status_code=400, detail="Session needs transcript or screen summary")
 
-        try:
-            structured_intent = await intent_service.extract_intent(transcript, screen_summary)
-        except Exception as e:
-            logger.exception(f"Intent extraction failed: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Intent extraction failed: {str(e)}")
+        structured_intent = await speculative_intent.lookup(db, session, transcript, screen_summary)
+        if structured_intent is None:
+            try:
+                structured_intent, _, intent_state = await _resolve_intent(
+                    db, session, stored_intent, transcript, screen_summary
+                )
+            except UpstreamBusy:
+                raise
+            except Exception as e:
+                logger.exception(f"Intent extraction failed: {str(e)}")
+                raise HTTPException(status_code=500, detail=f"Intent extraction failed: {str(e)}")
 
-        await db.execute(
-            update(SessionModel)
-            .where(SessionModel.id == session_uuid)
-            .values(
-                structured_intent=structured_intent,
-                updated_at=datetime.utcnow()
+            await db.execute(
+                update(SessionModel)
+                .where(SessionModel.id == session_uuid)
+                .values(
+                    structured_intent=None,
+                    structured_intent_hash=await blobstore.put_json(db, structured_intent),
+                    structured_intent_fingerprint=fingerprint(transcript, screen_summary),
+                    structured_intent_template=INTENT_TEMPLATE_VERSION,
+                    **intent_state,
+                    updated_at=datetime.utcnow()
+                )
             )
-        )
-        await db.commit()
+            await db.commit()
+            await session_cache.note_write(session_uuid)
 
         return IntentExtractResponse(
             session_id=session_uuid,
             structured_intent=structured_intent
         )
-    except HTTPException:
+    except (HTTPException, UpstreamBusy):
         raise
     except Exception as e:
         await db.rollback()
@@ -96,26 +138,39 @@ async def generate_prompts(
         
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
+        set_tenant_for(session)
         
+        stored_summary, stored_intent = await blobstore.load_session_fields(db, session)
         transcript = (body.transcript if body and body.transcript is not None else None) or (session.transcript or "")
-        screen_summary = (body.screen_summary if body and body.screen_summary is not None else None) or (session.screen_summary or "")
+        screen_summary = (body.screen_summary if body and body.screen_summary is not None else None) or (stored_summary or "")
         
         if not transcript.strip() and not screen_summary.strip():
             raise HTTPException(status_code=400, detail="Session needs transcript or screen summary")
         
-        structured_intent = None
-        if transcript.strip() or screen_summary.strip():
+        structured_intent = await speculative_intent.lookup(db, session, transcript, screen_summary)
+        semantic_query = None
+        if structured_intent is None:
             try:
-                structured_intent = await intent_service.extract_intent(transcript, screen_summary)
+                structured_intent, semantic_query, intent_state = await _resolve_intent(
+                    db, session, stored_intent, transcript, screen_summary
+                )
                 await db.execute(
                     update(SessionModel)
                     .where(SessionModel.id == session_uuid)
                     .values(
-                        structured_intent=structured_intent,
+                        structured_intent=None,
+                        structured_intent_hash=await blobstore.put_json(db, structured_intent),
+                        structured_intent_fingerprint=fingerprint(transcript, screen_summary),
+                        structured_intent_template=INTENT_TEMPLATE_VERSION,
+                        **intent_state,
                         updated_at=datetime.utcnow()
                     )
                 )
                 await db.commit()
+                await session_cache.note_write(session_uuid)
+            except UpstreamBusy:
+                await db.rollback()
+                raise
             except Exception as e:
                 await db.rollback()
                 logger.exception(f"Intent extraction failed: {str(e)}")
@@ -124,17 +179,27 @@ async def generate_prompts(
         if not structured_intent:
             raise HTTPException(status_code=400, detail="Failed to extract structured intent")
         
+        cached_prompts = semantic_query.hit.prompts if semantic_query and semantic_query.hit else None
         try:
-            prompts = await prompt_service.generate_prompts(structured_intent)
+            if cached_prompts:
+                prompts = cached_prompts
+            else:
+                prompts = await prompt_service.generate_prompts(structured_intent)
+                if semantic_query is not None:
+                    entry_id = semantic_query.hit.entry_id if semantic_query.hit else semantic_query.entry_id
+                    semantic_cache.attach_prompts(entry_id, prompts)
+        except UpstreamBusy:
+            raise
         except Exception as e:
             logger.exception(f"Prompt generation failed: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Prompt generation failed: {str(e)}")
         
         prompt_record = PromptModel(
             session_id=session_uuid,
-            raw_text=transcript,
-            screenshot_summary=screen_summary,
-            structured_intent=structured_intent,
+            raw_text_hash=await blobstore.put_text(db, transcript),
+            screenshot_summary_hash=await blobstore.put_text(db, screen_summary),
+            structured_intent_hash=await blobstore.put_json(db, structured_intent),
+            template_version=PROMPT_TEMPLATE_VERSION,
             short_prompt=prompts.get("short_prompt"),
             detailed_prompt=prompts.get("detailed_prompt"),
             expert_prompt=prompts.get("expert_prompt")
@@ -151,7 +216,7 @@ async def generate_prompts(
             expert_prompt=prompts.get("expert_prompt", ""),
             structured_intent=structured_intent
         )
-    except HTTPException:
+    except (HTTPException, UpstreamBusy):
         raise
     except Exception as e:
         await db.rollback()
@@ -1,12 +1,17 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Depends
+from fastapi import APIRouter, HTTPException, UploadFile, File, Depends, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update
 from uuid import UUID
 import logging
+from app.config import SCREEN_MAX_FRAMES
 from app.database import get_db
 from app.models import Session as SessionModel
 from app.schemas import SessionCreate, SessionResponse
+from app.services import blobstore, keyframes, read_routing, session_cache
+from app.services.scheduler import UpstreamBusy, set_tenant_for
+from app.services.speculation import speculative_intent
 from app.services.speech import SpeechService
+from app.services.transcript import transcript_compactor
 from app.services.vision import VisionService
 from datetime import datetime
 
@@ -31,6 +36,7 @@ async def start_session(
         db.add(new_session)
         await db.commit()
         await db.refresh(new_session)
+        await session_cache.note_write(new_session.id)
         
         return SessionResponse(
             id=new_session.id,
@@ -67,6 +73,7 @@ async def upload_audio(
         
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
+        set_tenant_for(session)
         
         audio_bytes = await file.read()
         transcript = await speech_service.transcribe_audio(audio_bytes)
@@ -83,9 +90,14 @@ async def upload_audio(
             )
         )
         await db.commit()
+        await session_cache.note_write(session_uuid)
+        speculative_intent.cancel(session_uuid)
+        transcript_compactor.schedule(
+            session_uuid, updated_transcript.strip(), session.transcript_summarized_chars or 0
+        )
         
         return {"transcript": updated_transcript.strip(), "session_id": session_id}
-    except HTTPException:
+    except (HTTPException, UpstreamBusy):
         raise
     except Exception as e:
         await db.rollback()
@@ -97,10 +109,14 @@ async def capture_audio_and_screen(
     session_id: str,
     audio: UploadFile = File(None),
     screen: UploadFile = File(None),
+    frames: list[UploadFile] = File(None),
     db: AsyncSession = Depends(get_db)
 ):
     """
-    Upload both audio and screen together in a single request
+    Upload both audio and screen together in a single request.
+    The screen may be one screenshot, earlier frames (frames, in order) followed by
+    the final screenshot (screen), or a short screen video; distinct keyframes are
+    analyzed together in one vision call.
     """
     try:
         session_uuid = UUID(session_id)
@@ -115,12 +131,29 @@ async def capture_audio_and_screen(
         
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
+        set_tenant_for(session)
         
-        if not audio and not screen:
+        screen_uploads = [*(frames or []), *([screen] if screen else [])]
+        if not audio and not screen_uploads:
             raise HTTPException(status_code=400, detail="At least one of audio or screen must be provided")
+        if len(screen_uploads) > SCREEN_MAX_FRAMES:
+            # Before any upload is read or Speech is called.
+            raise HTTPException(status_code=413, detail=f"At most {SCREEN_MAX_FRAMES} screen frames per capture")
         
         transcript = None
         screen_summary = None
+        selection = None
+        
+        # Validate screen uploads before paying for Speech
+        if screen_uploads:
+            try:
+                selection = await keyframes.select([(await f.read(), f.content_type) for f in screen_uploads])
+            except keyframes.MediaTooLarge as e:
+                raise HTTPException(status_code=413, detail=str(e))
+            except ValueError as e:
+                raise HTTPException(status_code=415, detail=str(e))
+            if not selection.frames:
+                raise HTTPException(status_code=400, detail="Screen upload contained no frames")
         
         # Process audio if provided
         if audio:
@@ -130,16 +163,18 @@ async def capture_audio_and_screen(
             transcript = (existing_transcript + " " + transcript_text).strip() if existing_transcript else transcript_text
         
         # Process screen if provided
-        if screen:
-            screenshot_bytes = await screen.read()
-            screen_summary = await vision_service.analyze_screenshot_bytes(screenshot_bytes)
+        if selection is not None:
+            screen_summary = await vision_service.analyze_frames(selection.frames)
         
         # Update session with both transcript and screen summary
         update_values = {"updated_at": datetime.utcnow()}
         if transcript is not None:
             update_values["transcript"] = transcript
         if screen_summary is not None:
-            update_values["screen_summary"] = screen_summary
+            update_values["screen_summary_hash"] = await blobstore.put_text(db, screen_summary)
+            update_values["screen_summary"] = None
+        else:
+            screen_summary, _ = await blobstore.load_session_fields(db, session)
         
         await db.execute(
             update(SessionModel)
@@ -147,13 +182,19 @@ async def capture_audio_and_screen(
             .values(**update_values)
         )
         await db.commit()
+        await session_cache.note_write(session_uuid)
+        if transcript is not None:
+            transcript_compactor.schedule(session_uuid, transcript, session.transcript_summarized_chars or 0)
+        speculative_intent.schedule(session_uuid, transcript or session.transcript or "", screen_summary or "")
         
         return {
             "transcript": transcript or session.transcript,
-            "screen_summary": screen_summary or session.screen_summary,
+            "screen_summary": screen_summary,
+            "frames_received": selection.received if selection else 0,
+            "frames_analyzed": len(selection.frames) if selection else 0,
             "session_id": session_id
         }
-    except HTTPException:
+    except (HTTPException, UpstreamBusy):
         raise
     except Exception as e:
         await db.rollback()
@@ -182,22 +223,27 @@ async def upload_screen(
         
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
+        set_tenant_for(session)
         
         screenshot_bytes = await file.read()
         screen_summary = await vision_service.analyze_screenshot_bytes(screenshot_bytes)
+        screen_summary_hash = await blobstore.put_text(db, screen_summary)
         
         await db.execute(
             update(SessionModel)
             .where(SessionModel.id == session_uuid)
             .values(
-                screen_summary=screen_summary,
+                screen_summary=None,
+                screen_summary_hash=screen_summary_hash,
                 updated_at=datetime.utcnow()
             )
         )
         await db.commit()
+        await session_cache.note_write(session_uuid)
+        speculative_intent.cancel(session_uuid)
         
         return {"screen_summary": screen_summary, "session_id": session_id}
-    except HTTPException:
+    except (HTTPException, UpstreamBusy):
         raise
     except Exception as e:
         await db.rollback()
@@ -207,10 +253,11 @@ async def upload_screen(
 @router.get("/{session_id}", response_model=SessionResponse)
 async def get_session(
     session_id: str,
-    db: AsyncSession = Depends(get_db)
+    request: Request,
+    db: AsyncSession = Depends(read_routing.get_read_db)
 ):
     """
-    Get session details
+    Get session details. Returns an ETag (from updated_at) and 304 for a matching If-None-Match.
     """
     try:
         session_uuid = UUID(session_id)
@@ -218,24 +265,38 @@ async def get_session(
         raise HTTPException(status_code=400, detail="Invalid session ID")
     
     try:
-        result = await db.execute(
-            select(SessionModel).where(SessionModel.id == session_uuid)
-        )
-        session = result.scalar_one_or_none()
-        
-        if not session:
-            raise HTTPException(status_code=404, detail="Session not found")
+        cached = session_cache.get(session_uuid)
+        if cached is None:
+            result = await db.execute(
+                select(SessionModel).where(SessionModel.id == session_uuid)
+            )
+            session = result.scalar_one_or_none()
+            
+            if not session:
+                raise HTTPException(status_code=404, detail="Session not found")
+            
+            screen_summary, structured_intent = await blobstore.load_session_fields(db, session)
+            
+            # pydantic-core serializes straight to JSON bytes, skipping jsonable_encoder.
+            body = SessionResponse(
+                id=session.id,
+                user_id=session.user_id,
+                created_at=session.created_at,
+                updated_at=session.updated_at,
+                transcript=session.transcript,
+                screen_summary=screen_summary,
+                structured_intent=structured_intent
+            ).model_dump_json().encode("utf-8")
+            etag = session_cache.etag_for(session)
+            session_cache.put(session_uuid, etag, body)
+        else:
+            etag, body = cached
         
-        return SessionResponse(
-            id=session.id,
-            user_id=session.user_id,
-            created_at=session.created_at,
-            updated_at=session.updated_at,
-            transcript=session.transcript,
-            screen_summary=session.screen_summary,
-            structured_intent=session.structured_intent
-        )
-    except HTTPException:
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if session_cache.etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+    except (HTTPException, UpstreamBusy):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
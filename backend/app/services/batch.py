@@ -0,0 +1,418 @@
+"""
+Offline bulk re-processing through batch prediction.
+
+After a template change (intent.TEMPLATE_VERSION / prompt.TEMPLATE_VERSION), the
+archive is regenerated in stages instead of through online generateContent:
+
+  export   write one generateContent request per pending session to
+           BATCH_DIR/<job>/input.jsonl and record a batch_jobs row
+             intent  sessions with an intent extracted with another template
+             prompt  sessions with prompts, none of which were generated from the
+                     current intent with the current template
+  submit   hand the file to a backend (services/batch_backends.py)
+  refresh  poll the backend; finished jobs are claimed and ingested in chunks of
+           BATCH_INGEST_CHUNK rows per transaction
+
+Sessions changed after the export started are skipped at ingest, so online writes
+always win. Ingest is idempotent and a job stuck in "ingesting" is reclaimed, so
+a crash mid-ingest can simply be retried. Driven by the batch.py CLI, or by API
+workers when BATCH_POLL_INTERVAL_SECONDS is set.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, Optional
+from uuid import UUID
+
+from sqlalchemy import and_, bindparam, exists, func, or_, select, update
+
+from app import metrics
+from app.config import BATCH_BACKEND, BATCH_DIR, BATCH_INGEST_CHUNK, BATCH_MODEL, BATCH_POLL_INTERVAL_SECONDS
+from app.database import AsyncSessionLocal
+from app.models import BatchJob, Prompt as PromptModel, Session as SessionModel
+from app.services import blobstore, intent, prompt, session_cache
+from app.services.batch_backends import get_backend
+from app.services.gemini_rest import response_text
+from app.services.intent_refinement import coverage
+from app.services.speculation import fingerprint
+from app.services.transcript import build_context
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("intent", "prompt")
+ACTIVE_STATUSES = ("exporting", "exported", "submitted", "succeeded", "ingesting")
+_KEY_LABEL = "intentify_key"
+_EXPORT_PAGE = 500
+_INGEST_STALE = timedelta(minutes=15)
+
+
+def _job_dir(job_id: UUID) -> str:
+    return os.path.join(BATCH_DIR, str(job_id))
+
+
+def _template_version(stage: str) -> str:
+    return intent.TEMPLATE_VERSION if stage == "intent" else prompt.TEMPLATE_VERSION
+
+
+def _request_line(session_id: UUID, text: str, system_instruction: Optional[str] = None) -> str:
+    request: dict = {
+        "contents": [{"role": "user", "parts": [{"text": text}]}],
+        "labels": {_KEY_LABEL: str(session_id)},
+    }
+    if system_instruction:
+        request["systemInstruction"] = {"parts": [{"text": system_instruction}]}
+    return json.dumps({"request": request}) + "\n"
+
+
+def _pending(stage: str):
+    if stage == "intent":
+        has_input = or_(
+            and_(SessionModel.transcript.isnot(None), SessionModel.transcript != ""),
+            SessionModel.screen_summary_hash.isnot(None),
+            SessionModel.screen_summary.isnot(None),
+        )
+        # Re-processing only: sessions that never had an intent are left to /intent.
+        has_intent = or_(
+            SessionModel.structured_intent_hash.isnot(None),
+            SessionModel.structured_intent.isnot(None),
+        )
+        stale = or_(
+            SessionModel.structured_intent_template.is_(None),
+            SessionModel.structured_intent_template != intent.TEMPLATE_VERSION,
+        )
+        return and_(has_input, has_intent, stale)
+    has_prompts = exists().where(PromptModel.session_id == SessionModel.id)
+    current = exists().where(
+        PromptModel.session_id == SessionModel.id,
+        PromptModel.template_version == prompt.TEMPLATE_VERSION,
+        PromptModel.structured_intent_hash == SessionModel.structured_intent_hash,
+    )
+    return and_(SessionModel.structured_intent_hash.isnot(None), has_prompts, ~current)
+
+
+async def export(stage: str, limit: Optional[int] = None, force: bool = False) -> BatchJob:
+    """Write pending work for stage to a JSONL file and record the job."""
+    if stage not in STAGES:
+        raise Exception(f"Unknown batch stage: {stage} (expected one of {', '.join(STAGES)})")
+    async with AsyncSessionLocal() as db:
+        if not force:
+            active = (await db.execute(
+                select(BatchJob.id).where(BatchJob.stage == stage, BatchJob.status.in_(ACTIVE_STATUSES)).limit(1)
+            )).scalar_one_or_none()
+            if active is not None:
+                raise Exception(f"Batch job {active} for stage {stage} is still active; finish it or pass --force")
+        job_id = uuid.uuid4()
+        os.makedirs(_job_dir(job_id), exist_ok=True)
+        job = BatchJob(
+            id=job_id,
+            stage=stage,
+            backend=BATCH_BACKEND,
+            template_version=_template_version(stage),
+            status="exporting",
+            input_path=os.path.join(_job_dir(job_id), "input.jsonl"),
+        )
+        db.add(job)
+        await db.commit()  # created_at is the cutoff for "changed since export"
+
+        count = 0
+        last_id: Optional[UUID] = None
+        with open(job.input_path, "w") as f:
+            while limit is None or count < limit:
+                page = select(SessionModel).where(_pending(stage)).order_by(SessionModel.id).limit(_EXPORT_PAGE)
+                if last_id is not None:
+                    page = page.where(SessionModel.id > last_id)
+                rows = (await db.execute(page)).scalars().all()
+                if not rows:
+                    break
+                last_id = rows[-1].id
+                blobs = await blobstore.get_many(
+                    db, [h for row in rows for h in (row.screen_summary_hash, row.structured_intent_hash)]
+                )
+                for row in rows[: None if limit is None else limit - count]:
+                    f.write(_export_line(stage, row, blobs))
+                    count += 1
+        job.request_count = count
+        job.status = "exported"
+        await db.commit()
+        await db.refresh(job)
+    logger.info("Exported %d %s requests to batch job %s", count, stage, job.id)
+    return job
+
+
+def _session_inputs(row, blobs: dict) -> tuple[str, str]:
+    summary = row.screen_summary
+    if row.screen_summary_hash in blobs:
+        summary = blobs[row.screen_summary_hash].decode("utf-8")
+    return row.transcript or "", summary or ""
+
+
+def _export_line(stage: str, row, blobs: dict) -> str:
+    if stage == "intent":
+        transcript, summary = _session_inputs(row, blobs)
+        offset = row.transcript_summarized_chars or 0
+        if row.transcript_summary and offset:
+            transcript = build_context(row.transcript_summary, transcript[offset:].strip())
+        return _request_line(row.id, intent.build_prompt(transcript, summary), intent.INTENT_INSTRUCTION)
+    structured_intent = json.loads(blobs[row.structured_intent_hash])
+    return _request_line(row.id, prompt.build_prompt(structured_intent))
+
+
+async def submit(job_id: UUID) -> BatchJob:
+    async with AsyncSessionLocal() as db:
+        job = await db.get(BatchJob, job_id)
+        if job is None:
+            raise Exception(f"Batch job {job_id} not found")
+        if job.status != "exported":
+            raise Exception(f"Batch job {job_id} is {job.status}, not exported")
+        if job.request_count == 0:
+            job.status = "ingested"
+        else:
+            job.external_id = await get_backend(job.backend).submit(str(job.id), job.input_path, BATCH_MODEL)
+            job.status = "submitted"
+        await db.commit()
+        await db.refresh(job)
+    logger.info("Submitted batch job %s to %s as %s", job.id, job.backend, job.external_id)
+    return job
+
+
+async def refresh(job_id: UUID) -> BatchJob:
+    """Poll a submitted job and ingest its results once it has finished."""
+    async with AsyncSessionLocal() as db:
+        job = await db.get(BatchJob, job_id)
+        if job is None:
+            raise Exception(f"Batch job {job_id} not found")
+        if job.status == "submitted":
+            state = await get_backend(job.backend).poll(job.external_id)
+            if state.state == "succeeded":
+                job.status = "succeeded"
+            elif state.state == "failed":
+                job.status, job.error = "failed", state.error
+                logger.warning("Batch job %s failed: %s", job.id, state.error)
+            await db.commit()
+    if await _claim(job_id):
+        await ingest(job_id)
+    async with AsyncSessionLocal() as db:
+        return await db.get(BatchJob, job_id)
+
+
+async def _claim(job_id: UUID) -> bool:
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            update(BatchJob)
+            .where(
+                BatchJob.id == job_id,
+                or_(
+                    BatchJob.status == "succeeded",
+                    and_(
+                        BatchJob.status == "ingesting",
+                        BatchJob.updated_at < datetime.now(timezone.utc) - _INGEST_STALE,
+                    ),
+                ),
+            )
+            .values(status="ingesting", updated_at=func.now())
+        )
+        await db.commit()
+        return result.rowcount == 1
+
+
+def _read_results(paths: list[str]) -> Iterator[tuple[Optional[UUID], Optional[dict]]]:
+    """(session id, generateContent response or None on failure) per result line."""
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    item = json.loads(line)
+                    session_id = UUID(item["request"]["labels"][_KEY_LABEL])
+                except (ValueError, KeyError, TypeError):
+                    yield None, None
+                    continue
+                if item.get("status") or not item.get("response"):
+                    yield session_id, None
+                    continue
+                yield session_id, item["response"]
+
+
+async def ingest(job_id: UUID) -> None:
+    async with AsyncSessionLocal() as db:
+        job = await db.get(BatchJob, job_id)
+        stage, cutoff, version = job.stage, job.created_at, job.template_version
+        paths = await get_backend(job.backend).fetch_results(job.external_id, os.path.join(_job_dir(job.id), "output"))
+    parse = intent.parse_intent if stage == "intent" else prompt.parse_prompts
+
+    chunk: dict[UUID, dict] = {}
+    failed = 0
+
+    async def flush() -> None:
+        nonlocal failed
+        ingested, skipped = 0, 0
+        if chunk:
+            write = _ingest_intents if stage == "intent" else _ingest_prompts
+            ingested, skipped = await write(chunk, cutoff, version)
+        metrics.record_batch_items(stage, "ingested", ingested)
+        metrics.record_batch_items(stage, "skipped", skipped)
+        metrics.record_batch_items(stage, "failed", failed)
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(BatchJob)
+                .where(BatchJob.id == job_id)
+                .values(
+                    ingested_count=BatchJob.ingested_count + ingested,
+                    skipped_count=BatchJob.skipped_count + skipped,
+                    failed_count=BatchJob.failed_count + failed,
+                )
+            )
+            await db.commit()
+        chunk.clear()
+        failed = 0
+
+    try:
+        for session_id, response in _read_results(paths):
+            parsed = None
+            if session_id is not None and response:
+                try:
+                    parsed = parse(response_text(response))
+                except Exception:
+                    pass
+            if not isinstance(parsed, dict):
+                failed += 1
+                continue
+            chunk[session_id] = parsed
+            if len(chunk) >= BATCH_INGEST_CHUNK:
+                await flush()
+        await flush()
+    except Exception as e:
+        logger.exception("Ingesting batch job %s failed", job_id)
+        await _set_status(job_id, "failed", str(e))
+        raise
+    await _set_status(job_id, "ingested")
+    logger.info("Ingested batch job %s", job_id)
+
+
+async def _set_status(job_id: UUID, status: str, error: Optional[str] = None) -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(BatchJob).where(BatchJob.id == job_id).values(status=status, error=error))
+        await db.commit()
+
+
+async def _ingest_intents(results: dict[UUID, dict], cutoff: datetime, version: str) -> tuple[int, int]:
+    sessions = SessionModel.__table__
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(
+            select(SessionModel).where(SessionModel.id.in_(list(results)), SessionModel.updated_at <= cutoff)
+        )).scalars().all()
+        blobs = await blobstore.get_many(db, [row.screen_summary_hash for row in rows])
+        params = []
+        for row in rows:
+            transcript, summary = _session_inputs(row, blobs)
+            params.append({
+                "b_id": row.id,
+                "b_hash": await blobstore.put_json(db, results[row.id]),
+                "b_fingerprint": fingerprint(transcript, summary),
+                **{f"b_{key}": value for key, value in coverage(transcript, summary).items()},
+            })
+        if params:
+            await db.execute(
+                update(sessions)
+                .where(sessions.c.id == bindparam("b_id"), sessions.c.updated_at <= cutoff)
+                .values(
+                    structured_intent=None,
+                    structured_intent_hash=bindparam("b_hash"),
+                    structured_intent_fingerprint=bindparam("b_fingerprint"),
+                    structured_intent_template=version,
+                    intent_transcript_chars=bindparam("b_intent_transcript_chars"),
+                    intent_transcript_hash=bindparam("b_intent_transcript_hash"),
+                    intent_screen_hash=bindparam("b_intent_screen_hash"),
+                    intent_increments=bindparam("b_intent_increments"),
+                    updated_at=func.now(),
+                ),
+                params,
+            )
+        await db.commit()
+    for row in rows:
+        await session_cache.note_write(row.id)
+    return len(params), len(results) - len(params)
+
+
+async def _ingest_prompts(results: dict[UUID, dict], cutoff: datetime, version: str) -> tuple[int, int]:
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(
+            select(SessionModel).where(
+                SessionModel.id.in_(list(results)),
+                SessionModel.updated_at <= cutoff,
+                SessionModel.structured_intent_hash.isnot(None),
+            )
+        )).scalars().all()
+        # Already ingested (a retried ingest) or regenerated online since the export.
+        done = set((await db.execute(
+            select(PromptModel.session_id, PromptModel.structured_intent_hash).where(
+                PromptModel.session_id.in_([row.id for row in rows]),
+                PromptModel.template_version == version,
+            )
+        )).all())
+        records = []
+        for row in rows:
+            if (row.id, row.structured_intent_hash) in done:
+                continue
+            prompts = results[row.id]
+            records.append(PromptModel(
+                session_id=row.id,
+                raw_text_hash=await blobstore.put_text(db, row.transcript or ""),
+                screenshot_summary_hash=row.screen_summary_hash or await blobstore.put_text(db, row.screen_summary),
+                structured_intent_hash=row.structured_intent_hash,
+                template_version=version,
+                short_prompt=prompts.get("short_prompt"),
+                detailed_prompt=prompts.get("detailed_prompt"),
+                expert_prompt=prompts.get("expert_prompt"),
+            ))
+        db.add_all(records)
+        await db.commit()
+    return len(records), len(results) - len(records)
+
+
+async def active_jobs() -> list[BatchJob]:
+    async with AsyncSessionLocal() as db:
+        return list((await db.execute(
+            select(BatchJob).where(BatchJob.status.in_(("submitted", "succeeded", "ingesting"))).order_by(BatchJob.created_at)
+        )).scalars().all())
+
+
+async def refresh_all() -> None:
+    for job in await active_jobs():
+        try:
+            await refresh(job.id)
+        except Exception:
+            logger.exception("Refreshing batch job %s failed", job.id)
+
+
+class BatchPoller:
+    def __init__(self, interval: float = BATCH_POLL_INTERVAL_SECONDS) -> None:
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        while True:
+            await refresh_all()
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+batch_poller = BatchPoller()
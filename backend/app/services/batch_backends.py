@@ -0,0 +1,322 @@
+"""
+Batch prediction backends for services/batch.py.
+
+A backend takes an exported JSONL file of generateContent requests (one
+{"request": {...}} per line), runs it as a job and hands back JSONL results in
+the Vertex batch output format ({"request": ..., "response": ..., "status": ""}).
+
+  local   file-based stand-in: job directories under BATCH_DIR/local, requests run
+          through the configured generateContent endpoint (e.g. bench/mock_upstream.py)
+          at batch priority. Dropping a predictions.jsonl into the job directory
+          completes the job without any calls. Every process that polls may pick up
+          an unfinished job; an owner file (O_EXCL, heartbeated) lets only one run it.
+  vertex  Vertex AI batchPredictionJobs, input and output staged in BATCH_GCS_URI.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import shutil
+import socket
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Optional
+
+from app import tracing
+from app.config import (
+    BATCH_BACKEND,
+    BATCH_DIR,
+    BATCH_GCS_URI,
+    BATCH_LOCAL_CONCURRENCY,
+    init_google_credentials,
+)
+from app.services import gemini_rest
+from app.services.drain import drainer
+from app.services.regions import router as regions
+from app.services.scheduler import gemini_scheduler, set_tenant
+
+logger = logging.getLogger(__name__)
+
+_PREDICTIONS = "predictions.jsonl"
+_OWNER = "owner"
+# The owner touches its file this often; a file older than the stale limit belongs to
+# a process that died, and another poller may take the job over.
+_HEARTBEAT_SECONDS = 10
+_OWNER_STALE_SECONDS = 60
+
+
+@dataclass
+class JobState:
+    state: str  # running | succeeded | failed
+    error: Optional[str] = None
+
+
+class BatchBackend(ABC):
+    name = "base"
+
+    @abstractmethod
+    async def submit(self, job_id: str, input_path: str, model: str) -> str:
+        """Start a job for input_path; returns the backend's job id."""
+
+    @abstractmethod
+    async def poll(self, external_id: str) -> JobState:
+        """Current state of the job."""
+
+    @abstractmethod
+    async def fetch_results(self, external_id: str, dest_dir: str) -> list[str]:
+        """Local paths of the job's result files, downloaded into dest_dir if needed."""
+
+
+class LocalFileBackend(BatchBackend):
+    name = "local"
+
+    def __init__(self, root: str = os.path.join(BATCH_DIR, "local")) -> None:
+        self.root = root
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    def _dir(self, external_id: str) -> str:
+        return os.path.join(self.root, external_id)
+
+    async def submit(self, job_id: str, input_path: str, model: str) -> str:
+        job_dir = self._dir(job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        shutil.copyfile(input_path, os.path.join(job_dir, "input.jsonl"))
+        with open(os.path.join(job_dir, "model"), "w") as f:
+            f.write(model)
+        self._start(job_id)
+        return job_id
+
+    def _start(self, external_id: str) -> None:
+        if os.path.exists(os.path.join(self._dir(external_id), _PREDICTIONS)):
+            return
+        if external_id not in self._tasks and self._claim(external_id):
+            self._tasks[external_id] = drainer.track(asyncio.create_task(self._process(external_id)))
+
+    def _claim(self, external_id: str) -> bool:
+        """Become the job's only runner (across processes), unless a live owner exists."""
+        path = os.path.join(self._dir(external_id), _OWNER)
+        for _ in range(2):
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                if not self._owner_stale(path):
+                    return False
+                # The owner stopped heartbeating. rename is atomic, so only one poller
+                # takes the stale file away; if it was refreshed meanwhile, put it back.
+                stale = f"{path}.{socket.gethostname()}.{os.getpid()}"
+                try:
+                    os.rename(path, stale)
+                except FileNotFoundError:
+                    continue
+                if not self._owner_stale(stale):
+                    try:
+                        os.link(stale, path)
+                    except FileExistsError:
+                        pass
+                    os.unlink(stale)
+                    return False
+                os.unlink(stale)
+                logger.warning("Taking over local batch job %s from a stale owner", external_id)
+                continue
+            with os.fdopen(fd, "w") as f:
+                f.write(f"{socket.gethostname()}:{os.getpid()}\n")
+            return True
+        return False
+
+    @staticmethod
+    def _owner_stale(path: str) -> bool:
+        try:
+            return time.time() - os.path.getmtime(path) > _OWNER_STALE_SECONDS
+        except FileNotFoundError:
+            return True
+
+    async def _heartbeat(self, external_id: str) -> None:
+        path = os.path.join(self._dir(external_id), _OWNER)
+        while True:
+            await asyncio.sleep(_HEARTBEAT_SECONDS)
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                return
+
+    async def poll(self, external_id: str) -> JobState:
+        job_dir = self._dir(external_id)
+        if os.path.exists(os.path.join(job_dir, _PREDICTIONS)):
+            return JobState("succeeded")
+        if os.path.exists(os.path.join(job_dir, "error")):
+            with open(os.path.join(job_dir, "error")) as f:
+                return JobState("failed", f.read())
+        if not os.path.exists(os.path.join(job_dir, "input.jsonl")):
+            return JobState("failed", f"Local batch job {external_id} not found under {self.root}")
+        # Not finished: run it here unless another process owns it (or the owner died).
+        self._start(external_id)
+        return JobState("running")
+
+    async def fetch_results(self, external_id: str, dest_dir: str) -> list[str]:
+        return [os.path.join(self._dir(external_id), _PREDICTIONS)]
+
+    async def _process(self, external_id: str) -> None:
+        job_dir = self._dir(external_id)
+        set_tenant(f"batch:{external_id}")
+        heartbeat = asyncio.create_task(self._heartbeat(external_id))
+        try:
+            with open(os.path.join(job_dir, "model")) as f:
+                model = f.read().strip()
+            with open(os.path.join(job_dir, "input.jsonl")) as f:
+                lines = [json.loads(line) for line in f if line.strip()]
+            semaphore = asyncio.Semaphore(BATCH_LOCAL_CONCURRENCY)
+
+            async def run(line: dict) -> dict:
+                async with semaphore, gemini_scheduler.slot("batch"):
+                    try:
+                        response = await regions.call(
+                            "batch",
+                            lambda region, timeout: gemini_rest.post_generate(
+                                gemini_rest.model_url("generateContent", gemini_rest.get_api_key(), region, model),
+                                line["request"], timeout, "batch",
+                            ),
+                            deadline=120,
+                        )
+                        return {**line, "response": response, "status": ""}
+                    except urllib.error.HTTPError as e:
+                        return {**line, "status": f"HTTP {e.code}: {e.read().decode('utf-8', 'replace')[:500]}"}
+                    except Exception as e:
+                        return {**line, "status": str(e) or type(e).__name__}
+
+            results = await asyncio.gather(*(run(line) for line in lines))
+            tmp = os.path.join(job_dir, f"{_PREDICTIONS}.{socket.gethostname()}.{os.getpid()}.tmp")
+            with open(tmp, "w") as f:
+                for result in results:
+                    f.write(json.dumps(result) + "\n")
+            os.replace(tmp, os.path.join(job_dir, _PREDICTIONS))
+            logger.info("Local batch job %s finished %d requests", external_id, len(results))
+        except Exception as e:
+            logger.exception("Local batch job %s failed", external_id)
+            with open(os.path.join(job_dir, "error"), "w") as f:
+                f.write(str(e))
+        finally:
+            heartbeat.cancel()
+            self._tasks.pop(external_id, None)
+
+
+def _split_gcs(uri: str) -> tuple[str, str]:
+    bucket, _, prefix = uri.removeprefix("gs://").partition("/")
+    return bucket, prefix
+
+
+class VertexBatchBackend(BatchBackend):
+    name = "vertex"
+
+    _TERMINAL_OK = ("JOB_STATE_SUCCEEDED", "JOB_STATE_PARTIALLY_SUCCEEDED")
+    _TERMINAL_FAILED = ("JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED")
+
+    def __init__(self, gcs_uri: str = BATCH_GCS_URI) -> None:
+        self.gcs_uri = gcs_uri
+        self._credentials = None
+
+    def _token(self) -> str:
+        # Batch jobs and GCS need OAuth (the service account), not the Gemini API key.
+        import google.auth
+        import google.auth.transport.requests
+
+        if self._credentials is None:
+            init_google_credentials()
+            self._credentials, _ = google.auth.default(scopes=["https://www.googleapis.com/auth/cloud-platform"])
+        if not self._credentials.valid:
+            self._credentials.refresh(google.auth.transport.requests.Request())
+        return self._credentials.token
+
+    def _request(self, method: str, url: str, body: Optional[bytes] = None, content_type: str = "application/json") -> bytes:
+        req = urllib.request.Request(
+            url,
+            data=body,
+            headers={"Authorization": f"Bearer {self._token()}", "Content-Type": content_type},
+            method=method,
+        )
+        with urllib.request.urlopen(req, timeout=120) as r:
+            return r.read()
+
+    def _submit_sync(self, job_id: str, input_path: str, model: str) -> str:
+        if not self.gcs_uri.startswith("gs://"):
+            raise Exception("BATCH_GCS_URI (gs://bucket/prefix) is required for the vertex batch backend")
+        bucket, prefix = _split_gcs(self.gcs_uri)
+        object_name = f"{prefix}/{job_id}/input.jsonl".lstrip("/")
+        with open(input_path, "rb") as f:
+            self._request(
+                "POST",
+                f"https://storage.googleapis.com/upload/storage/v1/b/{bucket}/o"
+                f"?uploadType=media&name={urllib.parse.quote(object_name, safe='')}",
+                f.read(),
+                "application/jsonl",
+            )
+        host, location = gemini_rest.vertex_location()
+        data = json.loads(self._request("POST", f"{host}/v1/{location}/batchPredictionJobs", json.dumps({
+            "displayName": f"intentify-{job_id}",
+            "model": f"publishers/google/models/{model}",
+            "inputConfig": {"instancesFormat": "jsonl", "gcsSource": {"uris": [f"gs://{bucket}/{object_name}"]}},
+            "outputConfig": {
+                "predictionsFormat": "jsonl",
+                "gcsDestination": {"outputUriPrefix": f"{self.gcs_uri}/{job_id}/output"},
+            },
+        }).encode("utf-8")))
+        return data["name"]
+
+    def _get_job(self, external_id: str) -> dict:
+        host, _ = gemini_rest.vertex_location()
+        return json.loads(self._request("GET", f"{host}/v1/{external_id}"))
+
+    async def submit(self, job_id: str, input_path: str, model: str) -> str:
+        return await tracing.to_thread("batch.submit", self._submit_sync, job_id, input_path, model)
+
+    async def poll(self, external_id: str) -> JobState:
+        job = await tracing.to_thread("batch.poll", self._get_job, external_id)
+        state = job.get("state", "")
+        if state in self._TERMINAL_OK:
+            return JobState("succeeded")
+        if state in self._TERMINAL_FAILED:
+            return JobState("failed", (job.get("error") or {}).get("message") or state)
+        return JobState("running")
+
+    def _fetch_sync(self, external_id: str, dest_dir: str) -> list[str]:
+        output_dir = self._get_job(external_id).get("outputInfo", {}).get("gcsOutputDirectory", "")
+        bucket, prefix = _split_gcs(output_dir)
+        listing = json.loads(self._request(
+            "GET",
+            f"https://storage.googleapis.com/storage/v1/b/{bucket}/o?prefix={urllib.parse.quote(prefix + '/', safe='')}",
+        ))
+        os.makedirs(dest_dir, exist_ok=True)
+        paths = []
+        for item in listing.get("items", []):
+            if not item["name"].endswith(".jsonl"):
+                continue
+            path = os.path.join(dest_dir, f"{len(paths)}-{os.path.basename(item['name'])}")
+            with open(path, "wb") as f:
+                f.write(self._request(
+                    "GET",
+                    f"https://storage.googleapis.com/storage/v1/b/{bucket}/o/{urllib.parse.quote(item['name'], safe='')}?alt=media",
+                ))
+            paths.append(path)
+        return paths
+
+    async def fetch_results(self, external_id: str, dest_dir: str) -> list[str]:
+        return await tracing.to_thread("batch.fetch", self._fetch_sync, external_id, dest_dir)
+
+
+_backends: dict[str, BatchBackend] = {}
+
+
+def get_backend(name: str = BATCH_BACKEND) -> BatchBackend:
+    if name not in _backends:
+        if name == "local":
+            _backends[name] = LocalFileBackend()
+        elif name == "vertex":
+            _backends[name] = VertexBatchBackend()
+        else:
+            raise Exception(f"Unknown batch backend: {name} (expected local or vertex)")
+    return _backends[name]
@@ -0,0 +1,156 @@
+"""
+Content-addressed blob storage for large text columns.
+Sessions and prompts reference blobs by sha256, so a screen summary or intent
+that was already stored costs a primary-key lookup instead of another insert.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import zlib
+from typing import Any, Iterable, Optional
+
+from sqlalchemy import event, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app import metrics
+from app.config import BLOB_COMPRESSION, BLOB_COMPRESSION_MIN_BYTES
+from app.models import Blob
+
+# Hashes confirmed committed to the table. Blobs are immutable and never deleted, so
+# only committed rows may be remembered: a row this transaction inserted (and can
+# still see) disappears again if the transaction rolls back.
+_KNOWN_MAX = 4096
+_known: dict[str, None] = {}
+# db.info key for digests inserted through a session (possibly not yet committed);
+# remembered once that session commits, dropped if it rolls back.
+_PENDING = "blobstore_pending"
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _encode(data: bytes) -> tuple[str, bytes]:
+    if BLOB_COMPRESSION == "zlib" and len(data) >= BLOB_COMPRESSION_MIN_BYTES:
+        packed = zlib.compress(data, 6)
+        if len(packed) < len(data):
+            return "zlib", packed
+    return "raw", data
+
+
+def _decode(encoding: str, data: bytes) -> bytes:
+    if encoding == "zlib":
+        return zlib.decompress(data)
+    return data
+
+
+def _remember(digest: str) -> None:
+    _known[digest] = None
+    if len(_known) > _KNOWN_MAX:
+        _known.pop(next(iter(_known)))
+
+
+@event.listens_for(Session, "after_commit")
+def _remember_committed(session: Session) -> None:
+    for digest in session.info.pop(_PENDING, ()):
+        _remember(digest)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _forget_pending(session: Session, transaction) -> None:
+    # Runs after after_commit; anything still pending was rolled back or discarded.
+    if transaction.parent is None:
+        session.info.pop(_PENDING, None)
+
+
+def _dump_json(value: Any) -> bytes:
+    # Canonical form so equal intents hash equally regardless of key order.
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+async def put_bytes(db: AsyncSession, data: bytes) -> str:
+    """
+    Store data if not already present and return its hash.
+    Does not commit; the blob is written in the caller's transaction.
+    """
+    digest = content_hash(data)
+    if digest in _known:
+        metrics.cache_hit("blob")
+        return digest
+    existing = await db.execute(select(Blob.hash).where(Blob.hash == digest))
+    if existing.scalar_one_or_none() is not None:
+        # A pending digest may be this transaction's own insert; it is remembered on commit.
+        if digest not in db.info.get(_PENDING, ()):
+            _remember(digest)
+        metrics.cache_hit("blob")
+        return digest
+    metrics.cache_miss("blob")
+    encoding, payload = _encode(data)
+    await db.execute(
+        insert(Blob)
+        .values(hash=digest, encoding=encoding, size=len(data), data=payload)
+        .on_conflict_do_nothing(index_elements=[Blob.hash])
+    )
+    db.info.setdefault(_PENDING, set()).add(digest)
+    return digest
+
+
+async def put_text(db: AsyncSession, text: Optional[str]) -> Optional[str]:
+    if text is None:
+        return None
+    return await put_bytes(db, text.encode("utf-8"))
+
+
+async def put_json(db: AsyncSession, value: Optional[Any]) -> Optional[str]:
+    if value is None:
+        return None
+    return await put_bytes(db, _dump_json(value))
+
+
+async def get_many(db: AsyncSession, digests: Iterable[Optional[str]]) -> dict[str, bytes]:
+    """Fetch several blobs in one round-trip. Missing hashes are omitted."""
+    wanted = {d for d in digests if d}
+    if not wanted:
+        return {}
+    result = await db.execute(
+        select(Blob.hash, Blob.encoding, Blob.data).where(Blob.hash.in_(wanted))
+    )
+    out = {}
+    pending = db.info.get(_PENDING, ())
+    for digest, encoding, data in result.all():
+        out[digest] = _decode(encoding, data)
+        if digest not in pending:
+            _remember(digest)
+    return out
+
+
+async def get_text(db: AsyncSession, digest: Optional[str]) -> Optional[str]:
+    if not digest:
+        return None
+    raw = (await get_many(db, [digest])).get(digest)
+    return raw.decode("utf-8") if raw is not None else None
+
+
+async def get_json(db: AsyncSession, digest: Optional[str]) -> Optional[Any]:
+    if not digest:
+        return None
+    raw = (await get_many(db, [digest])).get(digest)
+    return json.loads(raw) if raw is not None else None
+
+
+async def load_session_fields(db: AsyncSession, session) -> tuple[Optional[str], Optional[dict]]:
+    """
+    Resolve (screen_summary, structured_intent) for a session row, preferring the
+    blob references and falling back to the legacy inline columns.
+    """
+    blobs = await get_many(db, [session.screen_summary_hash, session.structured_intent_hash])
+    screen_summary = session.screen_summary
+    structured_intent = session.structured_intent
+    if session.screen_summary_hash in blobs:
+        screen_summary = blobs[session.screen_summary_hash].decode("utf-8")
+    if session.structured_intent_hash in blobs:
+        structured_intent = json.loads(blobs[session.structured_intent_hash])
+    return screen_summary, structured_intent
@@ -0,0 +1,146 @@
+"""
+Managed Vertex cachedContent handle for a static system instruction.
+The handle is created on first use, its TTL is extended shortly before expiry,
+and it is recreated after the server reports it missing (invalidate()). Handles
+are published to the shared cache backend so workers reuse one handle.
+If caching is unavailable (instruction below the token floor, API rejects it),
+callers get None and send the instruction inline as systemInstruction.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import urllib.error
+import urllib.request
+from typing import Optional
+
+from app.config import (
+    CONTEXT_CACHE_ENABLED,
+    CONTEXT_CACHE_MIN_TOKENS,
+    CONTEXT_CACHE_TTL_SECONDS,
+)
+from app.services import gemini_rest
+from app.services.shared_cache import get_backend
+from app.services.tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+_REFRESH_MARGIN = 300.0
+_RETRY_AFTER_FAILURE = 600.0
+
+
+def _request(method: str, url: str, payload: dict) -> dict:
+    req = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method=method,
+    )
+    with urllib.request.urlopen(req, timeout=30) as r:
+        return json.loads(r.read().decode("utf-8"))
+
+
+def _create_sync(instruction: str, api_key: str, ttl: int, display_name: str) -> str:
+    host, location = gemini_rest.vertex_location()
+    data = _request("POST", f"{host}/v1/{location}/cachedContents?key={api_key}", {
+        "model": gemini_rest.model_resource(),
+        "displayName": display_name,
+        "systemInstruction": {"parts": [{"text": instruction}]},
+        "ttl": f"{ttl}s",
+    })
+    return data["name"]
+
+
+def _extend_sync(name: str, api_key: str, ttl: int) -> None:
+    host, _ = gemini_rest.vertex_location()
+    _request("PATCH", f"{host}/v1/{name}?key={api_key}&updateMask=ttl", {"ttl": f"{ttl}s"})
+
+
+class ContextCache:
+    def __init__(self, label: str, instruction: str, ttl: int = CONTEXT_CACHE_TTL_SECONDS) -> None:
+        self.label = label
+        self.instruction = instruction
+        self.ttl = ttl
+        self.supported = CONTEXT_CACHE_ENABLED and estimate_tokens(instruction) >= CONTEXT_CACHE_MIN_TOKENS
+        self._name: Optional[str] = None
+        self._expires_at = 0.0
+        self._disabled_until = 0.0
+        self._invalid_name: Optional[str] = None
+        self._lock = asyncio.Lock()
+        digest = hashlib.sha256(instruction.encode("utf-8")).hexdigest()[:16]
+        self._shared_key = f"context_cache:{label}:{digest}"
+
+    def invalidate(self) -> None:
+        logger.info("Context cache %s invalidated; will recreate on next use", self.label)
+        self._invalid_name = self._name
+        self._name = None
+        self._expires_at = 0.0
+
+    async def _adopt_shared(self, now: float) -> bool:
+        """Pick up a handle another worker created or extended."""
+        try:
+            shared = await get_backend().get(self._shared_key)
+        except Exception as e:
+            logger.warning("Shared cache lookup for context cache %s failed: %s", self.label, e)
+            return False
+        if not shared or shared.get("name") == self._invalid_name:
+            return False
+        if now >= shared.get("expires_at", 0) - _REFRESH_MARGIN:
+            return False
+        self._name, self._expires_at = shared["name"], shared["expires_at"]
+        return True
+
+    async def _publish(self) -> None:
+        try:
+            await get_backend().set(
+                self._shared_key,
+                {"name": self._name, "expires_at": self._expires_at},
+                ttl=max(1.0, self._expires_at - time.time()),
+            )
+        except Exception as e:
+            logger.warning("Publishing context cache %s failed: %s", self.label, e)
+
+    async def handle(self, api_key: str) -> Optional[str]:
+        """Return a live cachedContent name, or None to send the instruction inline."""
+        if not self.supported:
+            return None
+        now = time.time()
+        if self._name and now < self._expires_at - _REFRESH_MARGIN:
+            return self._name
+        if now < self._disabled_until:
+            return None
+        async with self._lock:
+            now = time.time()
+            if self._name and now < self._expires_at - _REFRESH_MARGIN:
+                return self._name
+            if await self._adopt_shared(now):
+                return self._name
+            if self._name and now < self._expires_at:
+                try:
+                    await asyncio.to_thread(_extend_sync, self._name, api_key, self.ttl)
+                    self._expires_at = now + self.ttl
+                    await self._publish()
+                    return self._name
+                except Exception as e:
+                    logger.warning("Extending context cache %s failed (%s); recreating", self.label, e)
+                    self._name = None
+            try:
+                self._name = await asyncio.to_thread(
+                    _create_sync, self.instruction, api_key, self.ttl, f"intentify-{self.label}"
+                )
+                self._expires_at = now + self.ttl
+                logger.info("Created context cache %s: %s", self.label, self._name)
+                await self._publish()
+            except urllib.error.HTTPError as e:
+                raw = e.read().decode("utf-8", "replace")
+                logger.warning("Context cache %s unavailable (HTTP %s): %s", self.label, e.code, raw[:300])
+                self._name = None
+                self._disabled_until = now + _RETRY_AFTER_FAILURE
+            except Exception as e:
+                logger.warning("Context cache %s unavailable: %s", self.label, e)
+                self._name = None
+                self._disabled_until = now + _RETRY_AFTER_FAILURE
+            return self._name
@@ -0,0 +1,86 @@
+"""
+Graceful drain.
+
+While draining, readiness reports not-ready and new POSTs get 503 + Retry-After so
+the load balancer moves traffic away; requests already running, upstream calls and
+background jobs (compaction, speculative intent, cache verification) are allowed
+to finish up to DRAIN_TIMEOUT_SECONDS. Draining starts on shutdown, or earlier via
+POST /admin/drain so a deploy can wait for readiness to drop before sending SIGTERM.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+
+from app.config import DRAIN_TIMEOUT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class Drainer:
+    def __init__(self) -> None:
+        self.draining = False
+        self.draining_since: float | None = None
+        self.inflight_requests = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._tasks: set[asyncio.Future] = set()
+
+    def start(self) -> None:
+        if not self.draining:
+            self.draining = True
+            self.draining_since = time.time()
+            logger.info(
+                "Draining: %d request(s) and %d background job(s) in flight",
+                self.inflight_requests, len(self._tasks),
+            )
+
+    def request_started(self) -> None:
+        self.inflight_requests += 1
+        self._idle.clear()
+
+    def request_finished(self) -> None:
+        self.inflight_requests -= 1
+        if self.inflight_requests <= 0:
+            self.inflight_requests = 0
+            self._idle.set()
+
+    def track(self, task: asyncio.Future) -> asyncio.Future:
+        """Register a background task/future so shutdown waits for it."""
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def status(self) -> dict:
+        return {
+            "draining": self.draining,
+            "draining_since": self.draining_since,
+            "inflight_requests": self.inflight_requests,
+            "background_jobs": len(self._tasks),
+        }
+
+    async def drain(self, timeout: float = DRAIN_TIMEOUT_SECONDS) -> bool:
+        """Stop taking work and wait for in-flight work. Returns False on timeout."""
+        self.start()
+        deadline = time.monotonic() + timeout
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=timeout)
+            remaining = max(0.0, deadline - time.monotonic())
+            while self._tasks and remaining > 0:
+                # Jobs may spawn follow-ups (e.g. cache verification), so loop until none remain.
+                await asyncio.wait(set(self._tasks), timeout=remaining)
+                remaining = max(0.0, deadline - time.monotonic())
+        except asyncio.TimeoutError:
+            pass
+        if self.inflight_requests or self._tasks:
+            logger.warning(
+                "Drain timed out after %.0fs: %d request(s), %d background job(s) abandoned",
+                timeout, self.inflight_requests, len(self._tasks),
+            )
+            return False
+        logger.info("Drained in %.1fs", time.time() - (self.draining_since or time.time()))
+        return True
+
+
+drainer = Drainer()
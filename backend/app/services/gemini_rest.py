@@ -1,37 +1,68 @@
 """
-Shared Gemini REST client (text-only).
-Uses Vertex generateContent + API key + gemini-2.5-flash-lite.
+Shared Gemini REST client.
+Uses Vertex generateContent + API key + gemini-2.5-flash-lite. URLs are built here
+for every caller (text, vision, context caches); calls are routed across regions
+by services/regions.py.
 """
 from __future__ import annotations
 
 import asyncio
+import hashlib
 import json
 import os
+import time
 import urllib.error
 import urllib.request
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
+from app import metrics, tracing
+from app.services import model_routing
+from app.services.model_routing import ModelChoice
+from app.services.regions import Region, router as regions
+from app.services.scheduler import gemini_scheduler
+from app.services.singleflight import SingleFlight
 from app.config import (
     GOOGLE_API_KEY,
-    GOOGLE_LOCATION,
-    GOOGLE_PROJECT_ID,
+    MODEL_FAST,
     VERTEX_AI_API_KEY,
 )
+from app.services.tokens import estimate_tokens
 
-MODEL = "gemini-2.5-flash-lite"
+if TYPE_CHECKING:
+    from app.services.context_cache import ContextCache
 
+# Default model; context caches are created for it. Per-call choice: model_routing.
+MODEL = MODEL_FAST
 
-def _generate_text_sync(prompt: str, api_key: str) -> str:
-    project = os.getenv("GOOGLE_PROJECT_ID", GOOGLE_PROJECT_ID)
-    region = os.getenv("GOOGLE_LOCATION", GOOGLE_LOCATION)
-    base_url = (
-        f"https://{region}-aiplatform.googleapis.com/v1/projects/{project}"
-        f"/locations/{region}/publishers/google/models"
-    )
-    url = f"{base_url}/{MODEL}:generateContent?key={api_key}"
-    payload = {
-        "contents": [{"role": "user", "parts": [{"text": prompt}]}]
-    }
+# Identical prompts in flight at the same moment (double-clicks, strict-mode
+# double effects, /intent racing /generate) share one upstream call.
+_text_flight = SingleFlight("text")
+
+
+def vertex_location() -> tuple[str, str]:
+    """(host, "projects/{project}/locations/{region}") of the home region."""
+    return regions.primary.host, regions.primary.location
+
+
+def model_resource() -> str:
+    _, location = vertex_location()
+    return f"{location}/publishers/google/models/{MODEL}"
+
+
+def model_url(method: str, api_key: str, region: Optional[Region] = None, model: str = MODEL) -> str:
+    region = region or regions.primary
+    return f"{region.host}/v1/{region.location}/publishers/google/models/{model}:{method}?key={api_key}"
+
+
+def usable_cache(cached_content: Optional[str], region: Region, choice: ModelChoice) -> Optional[str]:
+    """cachedContent is tied to the home region and MODEL; elsewhere the instruction goes inline."""
+    if cached_content and region is regions.primary and choice.model == MODEL:
+        return cached_content
+    return None
+
+
+def post_generate(url: str, payload: dict, timeout: float, label: str) -> dict:
+    """POST a generateContent payload; network and parse time are traced as <label>.network/.parse."""
     body = json.dumps(payload).encode("utf-8")
     req = urllib.request.Request(
         url,
@@ -39,15 +70,56 @@ def _generate_text_sync(prompt: str, api_key: str) -> str:
         headers={"Content-Type": "application/json"},
         method="POST",
     )
-    with urllib.request.urlopen(req, timeout=90) as r:
-        raw = r.read().decode("utf-8")
-    data = json.loads(raw)
+    with tracing.span(f"{label}.network", bytes_out=len(body)):
+        with urllib.request.urlopen(req, timeout=timeout) as r:
+            raw = r.read().decode("utf-8")
+    with tracing.span(f"{label}.parse"):
+        return json.loads(raw)
+
+
+def response_text(data: dict) -> str:
     text_parts = []
     for c in data.get("candidates", []):
         for p in c.get("content", {}).get("parts", []):
             if "text" in p:
                 text_parts.append(p["text"])
-    result = "".join(text_parts).strip()
+    return "".join(text_parts).strip()
+
+
+def is_cache_error(code: int, raw: str) -> bool:
+    """True if an HTTP error says the referenced cachedContent is gone or invalid."""
+    normalized = raw.lower().replace(" ", "").replace("_", "")
+    return code in (400, 403, 404) and "cachedcontent" in normalized
+
+
+def _generate_text_sync(
+    region: Region,
+    timeout: float,
+    prompt: str,
+    api_key: str,
+    system_instruction: Optional[str] = None,
+    cached_content: Optional[str] = None,
+    choice: ModelChoice = ModelChoice(model=MODEL, tier="default"),
+) -> str:
+    payload = {
+        "contents": [{"role": "user", "parts": [{"text": prompt}]}]
+    }
+    cached_content = usable_cache(cached_content, region, choice)
+    # A cachedContent handle already carries the system instruction.
+    if cached_content:
+        payload["cachedContent"] = cached_content
+    elif system_instruction:
+        payload["systemInstruction"] = {"parts": [{"text": system_instruction}]}
+    generation_config = choice.generation_config()
+    if generation_config:
+        payload["generationConfig"] = generation_config
+    data = post_generate(
+        model_url("generateContent", api_key, region, choice.model), payload, timeout, "gemini"
+    )
+    metrics.record_usage(
+        "text", data.get("usageMetadata"), mode="cached" if cached_content else "inline"
+    )
+    result = response_text(data)
     if not result:
         raise Exception("Empty or invalid response from Gemini")
     return result
@@ -63,33 +135,128 @@ def get_api_key() -> str:
     )
 
 
-async def generate_text(prompt: str, api_key: Optional[str] = None) -> str:
+async def generate_text(
+    prompt: str,
+    api_key: Optional[str] = None,
+    system_instruction: Optional[str] = None,
+    context_cache: Optional["ContextCache"] = None,
+    operation: str = "text",
+    slo: str = "interactive",
+) -> str:
+    """
+    Generate text for prompt. Static instructions go in system_instruction; pass
+    a ContextCache holding the same instruction to reuse a cachedContent handle.
+    operation and slo feed the model routing policy (services/model_routing.py).
+    """
     key = api_key or get_api_key()
     if not key:
         raise Exception(
             "VERTEX_AI_API_KEY or GOOGLE_API_KEY required for Gemini REST"
         )
+    input_tokens = estimate_tokens(prompt) + estimate_tokens(system_instruction or "")
+    choice = model_routing.choose(operation, input_tokens, slo)
+    flight_key = hashlib.sha256(
+        f"{choice}\0{key}\0{system_instruction or ''}\0{prompt}".encode("utf-8")
+    ).hexdigest()
+    return await _text_flight.do(
+        flight_key,
+        lambda: _routed_generate_text(prompt, key, system_instruction, context_cache, operation, slo, input_tokens, choice),
+    )
+
+
+async def _routed_generate_text(
+    prompt: str,
+    key: str,
+    system_instruction: Optional[str],
+    context_cache: Optional["ContextCache"],
+    operation: str,
+    slo: str,
+    input_tokens: int,
+    choice: ModelChoice,
+) -> str:
+    start = time.perf_counter()
+    ok = False
+    try:
+        async with gemini_scheduler.slot(slo, cost=input_tokens / 1000):
+            result = await _generate_text(prompt, key, system_instruction, context_cache, choice)
+        ok = True
+        return result
+    finally:
+        model_routing.log_decision(operation, slo, input_tokens, choice, time.perf_counter() - start, ok)
+
+
+async def _generate_text(
+    prompt: str,
+    key: str,
+    system_instruction: Optional[str],
+    context_cache: Optional["ContextCache"],
+    choice: ModelChoice,
+) -> str:
+    handle = await context_cache.handle(key) if context_cache and choice.model == MODEL else None
     try:
-        return await asyncio.to_thread(_generate_text_sync, prompt, key)
+        with tracing.span("gemini.text", model=choice.model, tier=choice.tier, cached=bool(handle)), metrics.track_upstream("text"):
+            return await regions.call(
+                "gemini",
+                lambda region, timeout: _generate_text_sync(
+                    region, timeout, prompt, key, system_instruction, handle, choice
+                ),
+                deadline=90,
+            )
     except urllib.error.HTTPError as e:
         raw = e.read().decode("utf-8")
+        if handle and is_cache_error(e.code, raw):
+            context_cache.invalidate()
+            return await _generate_text(prompt, key, system_instruction, None, choice)
         raise Exception(f"Gemini REST HTTP {e.code}: {raw}")
 
 
-async def check_model() -> dict:
+def _count_tokens_sync(api_key: str, region: Region) -> int:
+    body = json.dumps(
+        {"contents": [{"role": "user", "parts": [{"text": "ping"}]}]}
+    ).encode("utf-8")
+    req = urllib.request.Request(
+        model_url("countTokens", api_key, region),
+        data=body,
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    with urllib.request.urlopen(req, timeout=10) as r:
+        data = json.loads(r.read().decode("utf-8"))
+    return int(data.get("totalTokens", 0))
+
+
+async def _probe_region(key: str, region: Region) -> dict:
+    start = time.perf_counter()
+    try:
+        await asyncio.to_thread(_count_tokens_sync, key, region)
+    except urllib.error.HTTPError as e:
+        return {"region": region.name, "status": "error", "error": f"HTTP {e.code}"}
+    except Exception as e:
+        return {"region": region.name, "status": "error", "error": str(e)}
+    # A region in cooldown that answers again is put back in rotation.
+    regions.mark_healthy(region)
+    return {
+        "region": region.name,
+        "status": "ok",
+        "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+
+
+async def probe_model() -> dict:
     """
-    Lightweight check that Gemini REST (gemini-2.5-flash-lite) is reachable.
-    Returns {"status": "ok", "model": "..."} or {"status": "error", "error": "..."}.
+    Unbilled reachability probe (countTokens) of every region, used by the background
+    health prober. "ok" if any region answers; per-region results under "regions".
     """
     key = get_api_key()
     if not key:
         return {"status": "error", "error": "VERTEX_AI_API_KEY or GOOGLE_API_KEY not set"}
-    try:
-        out = await generate_text("Reply with exactly: OK", key)
-        return {
-            "status": "ok",
-            "model": MODEL,
-            "reply": (out.strip()[:80] + "…") if len(out.strip()) > 80 else out.strip(),
-        }
-    except Exception as e:
-        return {"status": "error", "error": str(e)}
+    results = await asyncio.gather(*(_probe_region(key, r) for r in regions.regions))
+    ok = [r for r in results if r["status"] == "ok"]
+    if not ok:
+        return {"status": "error", "error": results[0].get("error"), "regions": results}
+    return {
+        "status": "ok",
+        "model": MODEL,
+        "latency_ms": min(r["latency_ms"] for r in ok),
+        "regions": results,
+    }
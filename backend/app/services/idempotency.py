@@ -0,0 +1,204 @@
+"""
+Idempotency-Key handling for mutating POST endpoints.
+
+The first request with a given (key, path) claims a row in idempotency_keys and
+runs normally; its response is stored once it completes. A retry with a
+completed key replays the stored response without touching Speech or Gemini.
+A retry while the original is still running waits for it. Failed or shed
+originals (5xx, 429 or exceptions) release the key so the client can retry for real.
+
+The claim stores a hash of the method and body (multipart boundaries normalized,
+since clients pick a new one per attempt); reusing a key for a different request
+is answered with 422 instead of replaying the first request's response. The body
+is buffered to hash it, then handed on to the endpoint unchanged.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from fastapi import Request
+from starlette.types import Message
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.postgresql import insert
+
+from app.config import IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_WAIT_SECONDS
+from app.database import AsyncSessionLocal
+from app.models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+_POLL_INTERVAL = 0.25
+_PURGE_EVERY = 100
+
+# Same-worker waiters are woken immediately; other workers fall back to polling.
+_local_done: dict[tuple[str, str], asyncio.Event] = {}
+_claims = 0
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+async def _fingerprint(request: Request) -> tuple[str, Request]:
+    """Hash of the request's method and body, and a request that can still read the body."""
+    body = await request.body()
+    content_type = request.headers.get("content-type", "")
+    normalized = body
+    if content_type.startswith("multipart/"):
+        boundary = content_type.partition("boundary=")[2].split(";")[0].strip().strip('"')
+        if boundary:
+            normalized = body.replace(boundary.encode("latin-1"), b"")
+    digest = hashlib.sha256(f"{request.method}\n{content_type.partition(';')[0]}\n".encode("utf-8"))
+    digest.update(normalized)
+
+    replayed = False
+    upstream_receive = request.receive
+
+    async def receive() -> Message:
+        nonlocal replayed
+        if not replayed:
+            replayed = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await upstream_receive()
+
+    return digest.hexdigest(), Request(request.scope, receive)
+
+
+async def _claim(key: str, path: str, request_hash: str) -> bool:
+    global _claims
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            insert(IdempotencyKey)
+            .values(
+                key=key,
+                path=path,
+                request_hash=request_hash,
+                status="in_progress",
+                expires_at=_now() + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+            )
+            .on_conflict_do_nothing(index_elements=[IdempotencyKey.key, IdempotencyKey.path])
+            .returning(IdempotencyKey.key)
+        )
+        claimed = result.scalar_one_or_none() is not None
+        _claims += 1
+        if _claims % _PURGE_EVERY == 0:
+            await db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at < _now()))
+        await db.commit()
+        return claimed
+
+
+async def _load(key: str, path: str) -> Optional[IdempotencyKey]:
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(IdempotencyKey).where(IdempotencyKey.key == key, IdempotencyKey.path == path)
+        )
+        return result.scalar_one_or_none()
+
+
+async def _release(key: str, path: str) -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            delete(IdempotencyKey).where(IdempotencyKey.key == key, IdempotencyKey.path == path)
+        )
+        await db.commit()
+
+
+async def _complete(key: str, path: str, status: int, body: bytes, content_type: Optional[str]) -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.key == key, IdempotencyKey.path == path)
+            .values(
+                status="completed",
+                response_status=status,
+                response_body=body,
+                content_type=content_type,
+            )
+        )
+        await db.commit()
+
+
+def _replay(row: IdempotencyKey) -> Response:
+    return Response(
+        content=row.response_body or b"",
+        status_code=row.response_status or 200,
+        media_type=row.content_type,
+        headers={REPLAYED_HEADER: "true"},
+    )
+
+
+async def _run_as_owner(request: Request, call_next, key: str, path: str) -> Response:
+    done = _local_done.setdefault((key, path), asyncio.Event())
+    try:
+        response = await call_next(request)
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        if response.status_code >= 500 or response.status_code == 429:
+            await _release(key, path)
+        else:
+            await _complete(key, path, response.status_code, body, response.headers.get("content-type"))
+        headers = {k: v for k, v in response.headers.items() if k.lower() != "content-length"}
+        return Response(content=body, status_code=response.status_code, headers=headers)
+    except BaseException:
+        await asyncio.shield(_release(key, path))
+        raise
+    finally:
+        done.set()
+        _local_done.pop((key, path), None)
+
+
+async def handle(request: Request, call_next) -> Response:
+    key = request.headers.get(HEADER)
+    if request.method != "POST" or not key:
+        return await call_next(request)
+    if len(key) > 255:
+        return JSONResponse(status_code=400, content={"detail": f"{HEADER} must be at most 255 characters"})
+    path = request.url.path
+    request_hash, request = await _fingerprint(request)
+
+    deadline = asyncio.get_running_loop().time() + IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        if await _claim(key, path, request_hash):
+            return await _run_as_owner(request, call_next, key, path)
+
+        row = await _load(key, path)
+        if row is None:
+            # Original failed and released the key between our claim and load.
+            continue
+        if row.request_hash is not None and row.request_hash != request_hash:
+            return JSONResponse(
+                status_code=422,
+                content={"detail": f"{HEADER} was already used for a different request"},
+            )
+        if row.expires_at is not None and row.expires_at < _now():
+            await _release(key, path)
+            continue
+        if row.status == "completed":
+            return _replay(row)
+        if row.created_at is not None and row.created_at < _now() - timedelta(seconds=IDEMPOTENCY_WAIT_SECONDS * 2):
+            # The worker that claimed it died mid-request; let this retry take over.
+            logger.warning("Reclaiming abandoned idempotency key for %s", path)
+            await _release(key, path)
+            continue
+
+        remaining = deadline - asyncio.get_running_loop().time()
+        if remaining <= 0:
+            return JSONResponse(
+                status_code=409,
+                content={"detail": "A request with this Idempotency-Key is still in progress"},
+                headers={"Retry-After": "5"},
+            )
+        local = _local_done.get((key, path))
+        if local is not None:
+            try:
+                await asyncio.wait_for(local.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                pass
+        else:
+            await asyncio.sleep(min(_POLL_INTERVAL, remaining))
@@ -1,50 +1,133 @@
+import hashlib
 import json
+from typing import Optional
 
+from app import tracing
+from app.services.context_cache import ContextCache
 from app.services.gemini_rest import generate_text
+from app.services.scheduler import UpstreamBusy
 
+# Static extraction instructions; only the transcript and screen summary vary per call.
+INTENT_INSTRUCTION = """Based on the user transcript and screen analysis you are given, extract the user's intent and structure it as JSON.
 
-class IntentService:
-    def __init__(self) -> None:
-        pass
+Extract and return a JSON object with the following structure:
+{
+  "goal": "clear description of what the user wants to achieve",
+  "current_state": "description of current situation based on screen and context",
+  "constraints": ["list", "of", "constraints", "or", "limitations"],
+  "tools": ["list", "of", "tools", "or", "technologies", "mentioned"],
+  "skill_level": "beginner/intermediate/expert",
+  "desired_output": "what the user expects as output"
+}
 
-    async def extract_intent(self, transcript: str, screen_summary: str) -> dict:
-        """
-        Extract structured intent from transcript and screen summary.
-        Uses Gemini REST (gemini-2.5-flash-lite + API key).
-        """
-        prompt = f"""Based on the following user transcript and screen analysis, extract the user's intent and structure it as JSON.
+Return ONLY valid JSON, no additional text."""
 
-Transcript: {transcript}
+# Below the cache token floor today, so this sends systemInstruction inline; it
+# switches to a cachedContent handle automatically if the instruction grows.
+_intent_cache = ContextCache("intent", INTENT_INSTRUCTION)
 
-Screen Summary: {screen_summary}
+# Incremental refinement (services/intent_refinement.py): previous intent + new transcript text.
+REFINE_INSTRUCTION = """You maintain a structured JSON intent for a user's spoken request to an AI assistant.
+You are given the current intent, the transcript text spoken since it was extracted and,
+if the screen changed, the new screen analysis.
 
-Extract and return a JSON object with the following structure:
-{{
+Return the updated intent with exactly the same structure:
+{
   "goal": "clear description of what the user wants to achieve",
   "current_state": "description of current situation based on screen and context",
   "constraints": ["list", "of", "constraints", "or", "limitations"],
   "tools": ["list", "of", "tools", "or", "technologies", "mentioned"],
   "skill_level": "beginner/intermediate/expert",
   "desired_output": "what the user expects as output"
-}}
+}
 
+Keep everything the new text does not change; add what it adds; later statements override earlier ones.
 Return ONLY valid JSON, no additional text."""
 
+_refine_cache = ContextCache("intent_refine", REFINE_INSTRUCTION)
+
+# Stored with each intent (sessions.structured_intent_template) so the batch
+# re-processor (services/batch.py) can find intents made with an older instruction.
+TEMPLATE_VERSION = hashlib.sha256(INTENT_INSTRUCTION.encode("utf-8")).hexdigest()[:12]
+
+
+class IntentService:
+    def __init__(self) -> None:
+        pass
+
+    async def extract_intent(self, transcript: str, screen_summary: str, slo: str = "interactive") -> dict:
+        """
+        Extract structured intent from transcript and screen summary.
+        Uses Gemini REST (model chosen by services/model_routing.py + API key).
+        """
         try:
-            response_text = await generate_text(prompt)
+            response_text = await generate_text(
+                build_prompt(transcript, screen_summary),
+                system_instruction=INTENT_INSTRUCTION,
+                context_cache=_intent_cache,
+                operation="intent",
+                slo=slo,
+            )
+        except UpstreamBusy:
+            raise
         except Exception as e:
             raise Exception(f"Intent extraction error: {str(e)}")
 
-        response_text = response_text.strip()
-        if response_text.startswith("```json"):
-            response_text = response_text[7:]
-        if response_text.startswith("```"):
-            response_text = response_text[3:]
-        if response_text.endswith("```"):
-            response_text = response_text[:-3]
-        response_text = response_text.strip()
+        return parse_intent(response_text)
 
+    async def refine_intent(
+        self,
+        previous: dict,
+        transcript_delta: str,
+        screen_summary: Optional[str],
+        slo: str = "interactive",
+    ) -> dict:
+        """Update a previous intent with new transcript text (and a changed screen summary, if any)."""
         try:
+            response_text = await generate_text(
+                build_refine_prompt(previous, transcript_delta, screen_summary),
+                system_instruction=REFINE_INSTRUCTION,
+                context_cache=_refine_cache,
+                operation="intent",
+                slo=slo,
+            )
+        except UpstreamBusy:
+            raise
+        except Exception as e:
+            raise Exception(f"Intent refinement error: {str(e)}")
+
+        return parse_intent(response_text)
+
+
+def build_prompt(transcript: str, screen_summary: str) -> str:
+    return f"""Transcript: {transcript}
+
+Screen Summary: {screen_summary}"""
+
+
+def build_refine_prompt(previous: dict, transcript_delta: str, screen_summary: Optional[str]) -> str:
+    prompt = f"""Current intent: {json.dumps(previous)}
+
+New transcript: {transcript_delta or "(none)"}"""
+    if screen_summary is not None:
+        prompt += f"""
+
+New Screen Summary: {screen_summary}"""
+    return prompt
+
+
+def parse_intent(response_text: str) -> dict:
+    response_text = response_text.strip()
+    if response_text.startswith("```json"):
+        response_text = response_text[7:]
+    if response_text.startswith("```"):
+        response_text = response_text[3:]
+    if response_text.endswith("```"):
+        response_text = response_text[:-3]
+    response_text = response_text.strip()
+
+    try:
+        with tracing.span("intent.parse"):
             return json.loads(response_text)
-        except json.JSONDecodeError as e:
-            raise Exception(f"Failed to parse intent JSON: {str(e)}")
+    except json.JSONDecodeError as e:
+        raise Exception(f"Failed to parse intent JSON: {str(e)}")
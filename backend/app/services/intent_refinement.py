@@ -0,0 +1,158 @@
+"""
+Incremental intent refinement.
+
+Sessions record what their stored intent covers: the transcript prefix
+(sessions.intent_transcript_chars and a hash of that text), the screen summary hash,
+and how many refinements were applied since the last full extraction. When a new
+/intent or /generate transcript still starts with the covered prefix, Gemini gets the
+previous intent plus only the new text (and the screen summary only if it changed),
+so per-call input stays roughly constant as the session grows.
+
+Falls back to full extraction (refine() returns None) when there is no usable previous
+intent, the covered text was edited, INTENT_REFINE_MAX_STEPS refinements ran in a row,
+the delta exceeds INTENT_REFINE_MAX_DELTA_TOKENS, or the refined intent drifts: it
+breaks the intent structure or shares too few terms with the previous one.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+from app import metrics
+from app.config import (
+    INTENT_REFINE_ENABLED,
+    INTENT_REFINE_MAX_DELTA_TOKENS,
+    INTENT_REFINE_MAX_STEPS,
+    INTENT_REFINE_MIN_SIMILARITY,
+)
+from app.services.intent import TEMPLATE_VERSION, IntentService
+from app.services.scheduler import UpstreamBusy
+from app.services.tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+_FIELDS = {
+    "goal": str,
+    "current_state": str,
+    "constraints": list,
+    "tools": list,
+    "skill_level": str,
+    "desired_output": str,
+}
+_WORD = re.compile(r"[a-z0-9][a-z0-9+#.\-]{2,}")
+
+
+@dataclass
+class Refinement:
+    structured_intent: dict
+    state: dict  # session column values to store with the intent
+
+
+def _hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _screen_hash(screen_summary: str) -> Optional[str]:
+    return _hash(screen_summary.strip()) if screen_summary.strip() else None
+
+
+def coverage(transcript: str, screen_summary: str, increments: int = 0) -> dict:
+    """Session column values recording that the stored intent covers these inputs."""
+    return {
+        "intent_transcript_chars": len(transcript),
+        "intent_transcript_hash": _hash(transcript),
+        "intent_screen_hash": _screen_hash(screen_summary),
+        "intent_increments": increments,
+    }
+
+
+def is_valid(structured_intent) -> bool:
+    return isinstance(structured_intent, dict) and all(
+        isinstance(structured_intent.get(key), kind) for key, kind in _FIELDS.items()
+    )
+
+
+def _terms(structured_intent: dict) -> set[str]:
+    values = json.dumps([structured_intent.get(key) for key in _FIELDS])
+    return set(_WORD.findall(values.lower()))
+
+
+def similarity(a: dict, b: dict) -> float:
+    """Jaccard similarity of the terms in two intents (1.0 when both are empty)."""
+    ta, tb = _terms(a), _terms(b)
+    if not ta and not tb:
+        return 1.0
+    return len(ta & tb) / len(ta | tb)
+
+
+class IntentRefiner:
+    def __init__(self, enabled: bool = INTENT_REFINE_ENABLED) -> None:
+        self.enabled = enabled
+        self._intent = IntentService()
+
+    def _fallback(self, session, reason: str) -> None:
+        metrics.record_intent_extraction("full", reason)
+        logger.info("Full intent extraction for session %s: %s", session.id, reason)
+
+    async def refine(
+        self,
+        session,
+        previous: Optional[dict],
+        transcript: str,
+        screen_summary: str,
+        slo: str = "interactive",
+    ) -> Optional[Refinement]:
+        """
+        Refined intent for the new inputs, or None when a full extraction is needed.
+        previous is the session's stored intent (blobstore.load_session_fields).
+        """
+        if not self.enabled:
+            return None
+        covered = session.intent_transcript_chars
+        if not previous or covered is None or session.structured_intent_template != TEMPLATE_VERSION:
+            self._fallback(session, "no_previous")
+            return None
+        increments = session.intent_increments or 0
+        if increments >= INTENT_REFINE_MAX_STEPS:
+            self._fallback(session, "max_steps")
+            return None
+        if covered > len(transcript) or _hash(transcript[:covered]) != session.intent_transcript_hash:
+            self._fallback(session, "edited")
+            return None
+        delta = transcript[covered:].strip()
+        screen_changed = _screen_hash(screen_summary) != session.intent_screen_hash
+        if not delta and not screen_changed:
+            # Only whitespace changed since the stored intent.
+            metrics.record_intent_extraction("unchanged")
+            return Refinement(previous, coverage(transcript, screen_summary, increments))
+        if estimate_tokens(delta) > INTENT_REFINE_MAX_DELTA_TOKENS:
+            self._fallback(session, "large_delta")
+            return None
+
+        try:
+            refined = await self._intent.refine_intent(
+                previous, delta, screen_summary if screen_changed else None, slo=slo
+            )
+        except UpstreamBusy:
+            raise
+        except Exception:
+            logger.exception("Intent refinement failed for session %s", session.id)
+            self._fallback(session, "error")
+            return None
+        if not is_valid(refined):
+            self._fallback(session, "invalid")
+            return None
+        score = similarity(previous, refined)
+        if score < INTENT_REFINE_MIN_SIMILARITY:
+            self._fallback(session, "drift")
+            logger.info("Refined intent for session %s drifted (similarity %.2f)", session.id, score)
+            return None
+        metrics.record_intent_extraction("incremental")
+        return Refinement(refined, coverage(transcript, screen_summary, increments + 1))
+
+
+intent_refiner = IntentRefiner()
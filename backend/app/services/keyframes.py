@@ -0,0 +1,204 @@
+"""
+Keyframe selection for multi-frame screen captures.
+
+A capture may carry several screenshots or one short screen video. Frames are
+reduced to a few visually distinct keyframes before the single vision call:
+identical uploads are dropped by content hash, the rest are compared by a 16x16
+difference hash (dHash) and a frame is kept only when it differs from the last
+kept one by at least KEYFRAME_MIN_DIFF of the bits. Above SCREEN_MAX_KEYFRAMES,
+the first and last frames are kept plus the biggest changes in between, in order.
+
+Decoding uses Pillow; videos additionally need PyAV (requirements-video.txt).
+A lone screenshot is passed through without being decoded.
+"""
+from __future__ import annotations
+
+import hashlib
+import io
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+from app import tracing
+from app.config import (
+    KEYFRAME_MIN_DIFF,
+    SCREEN_MAX_FRAMES,
+    SCREEN_MAX_KEYFRAMES,
+    SCREEN_VIDEO_SAMPLE_FPS,
+)
+
+logger = logging.getLogger(__name__)
+
+_HASH_SIZE = 16
+_HASH_BITS = _HASH_SIZE * _HASH_SIZE
+_IMAGE_MIME_TYPES = {"PNG": "image/png", "JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+
+@dataclass
+class Frame:
+    data: bytes
+    mime_type: str
+
+
+@dataclass
+class KeyframeSelection:
+    frames: list[Frame]
+    received: int
+
+
+def is_video(content_type: Optional[str]) -> bool:
+    return bool(content_type) and content_type.startswith("video/")
+
+
+def _dhash(image) -> int:
+    from PIL import Image
+
+    small = image.convert("L").resize((_HASH_SIZE + 1, _HASH_SIZE), Image.Resampling.BILINEAR)
+    px = small.load()
+    bits = 0
+    for y in range(_HASH_SIZE):
+        for x in range(_HASH_SIZE):
+            bits = (bits << 1) | (px[x, y] > px[x + 1, y])
+    return bits
+
+
+class MediaTooLarge(ValueError):
+    """Screen media exceeds a size limit rather than being malformed."""
+
+
+def _open_image(data: bytes):
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except Image.DecompressionBombError as e:
+        raise MediaTooLarge(f"Screen frame is too large: {e}")
+    except (UnidentifiedImageError, OSError) as e:
+        raise ValueError(f"Screen frame is not a readable image: {e}")
+    if image.format not in _IMAGE_MIME_TYPES:
+        raise ValueError(f"Unsupported screen frame format: {image.format}")
+    return image
+
+
+def _video_frames(data: bytes) -> list:
+    """
+    Sample at most SCREEN_MAX_FRAMES frames (PIL images) from a screen video, at
+    SCREEN_VIDEO_SAMPLE_FPS or spread evenly over longer videos. The whole video is
+    decoded so the final frame is always the last sample.
+    """
+    try:
+        import av
+    except ImportError:
+        raise ValueError("Screen video needs PyAV on the server (pip install -r requirements-video.txt)")
+    images = []
+
+    def add(image) -> None:
+        if len(images) >= SCREEN_MAX_FRAMES:
+            # Duration unknown or understated: the last slot tracks the latest state.
+            images[-1] = image
+        else:
+            images.append(image)
+
+    next_at = 0.0
+    last, last_kept = None, False
+    try:
+        with av.open(io.BytesIO(data)) as container:
+            stream = container.streams.video[0]
+            interval = 1.0 / SCREEN_VIDEO_SAMPLE_FPS
+            if stream.duration is not None and stream.time_base is not None:
+                duration = float(stream.duration * stream.time_base)
+            elif container.duration is not None:
+                duration = container.duration / av.time_base
+            else:
+                duration = 0.0
+            if SCREEN_MAX_FRAMES > 1 and duration > 0:
+                interval = max(interval, duration / (SCREEN_MAX_FRAMES - 1))
+            for frame in container.decode(stream):
+                last, last_kept = frame, False
+                t = float(frame.time) if frame.time is not None else next_at
+                if t + 1e-6 < next_at:
+                    continue
+                add(frame.to_image())
+                last_kept = True
+                next_at = t + interval
+            if last is not None and not last_kept:
+                # Keep the final state of the recording even between sample points.
+                add(last.to_image())
+    except (av.AVError, IndexError) as e:
+        raise ValueError(f"Screen video could not be decoded: {e}")
+    return images
+
+
+def _encode_png(image) -> bytes:
+    out = io.BytesIO()
+    image.save(out, format="PNG", optimize=False)
+    return out.getvalue()
+
+
+def _pick(hashes: list[int]) -> list[int]:
+    """Indices of the frames to keep, in order."""
+    threshold = KEYFRAME_MIN_DIFF * _HASH_BITS
+    kept = [0]
+    scores = {0: _HASH_BITS}
+    for i in range(1, len(hashes)):
+        diff = bin(hashes[i] ^ hashes[kept[-1]]).count("1")
+        if diff >= threshold:
+            kept.append(i)
+            scores[i] = diff
+    last = len(hashes) - 1
+    if kept[-1] != last:
+        # The tail is near-identical to the last keyframe; prefer its latest state.
+        scores[last] = scores.pop(kept[-1])
+        kept[-1] = last
+    if len(kept) <= SCREEN_MAX_KEYFRAMES:
+        return kept
+    if SCREEN_MAX_KEYFRAMES <= 1:
+        return [last]
+    middle = sorted(kept[1:-1], key=scores.get, reverse=True)[: SCREEN_MAX_KEYFRAMES - 2]
+    return sorted([kept[0], *middle, last])
+
+
+def _select_sync(uploads: list[tuple[bytes, Optional[str]]]) -> KeyframeSelection:
+    images, frames = [], []
+    seen: set[str] = set()
+    received = 0
+    for data, content_type in uploads:
+        if is_video(content_type):
+            sampled = _video_frames(data)
+            received += len(sampled)
+            for image in sampled:
+                images.append(image)
+                frames.append(None)  # encoded only if kept
+            continue
+        received += 1
+        digest = hashlib.sha256(data).hexdigest()
+        if digest in seen:
+            continue
+        seen.add(digest)
+        image = _open_image(data)
+        images.append(image)
+        frames.append(Frame(data, _IMAGE_MIME_TYPES[image.format]))
+    if not images:
+        return KeyframeSelection([], received)
+    keep = _pick([_dhash(image) for image in images]) if len(images) > 1 else [0]
+    selected = [frames[i] or Frame(_encode_png(images[i]), "image/png") for i in keep]
+    return KeyframeSelection(selected, received)
+
+
+async def select(uploads: list[tuple[bytes, Optional[str]]]) -> KeyframeSelection:
+    """
+    Keyframes to analyze from the uploaded (bytes, content type) pairs, in order.
+    Raises ValueError for unreadable or unsupported media, and MediaTooLarge (a
+    ValueError) for too many frames or an image past PIL's decompression-bomb limit.
+    """
+    if len(uploads) > SCREEN_MAX_FRAMES:
+        raise MediaTooLarge(f"At most {SCREEN_MAX_FRAMES} screen frames per capture")
+    if len(uploads) == 1 and not is_video(uploads[0][1]):
+        data, content_type = uploads[0]
+        mime_type = content_type if content_type in _IMAGE_MIME_TYPES.values() else "image/png"
+        return KeyframeSelection([Frame(data, mime_type)], 1)
+    with tracing.span("keyframes", uploads=len(uploads)):
+        selection = await tracing.to_thread("keyframes", _select_sync, uploads)
+    logger.info("Selected %d of %d screen frames", len(selection.frames), selection.received)
+    return selection
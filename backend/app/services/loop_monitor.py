@@ -0,0 +1,85 @@
+"""
+Event-loop lag monitor.
+
+A coroutine wakes every LOOP_MONITOR_INTERVAL_MS and records how late it was
+scheduled (intentify_event_loop_lag_seconds). A watchdog thread checks that
+coroutine's heartbeat; when the loop has not run for LOOP_LAG_THRESHOLD_MS it logs
+the loop thread's current stack, i.e. the code that is blocking it, once per stall.
+Idle cost is one timer on the loop and one sleeping thread.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from app import metrics
+from app.config import LOOP_LAG_THRESHOLD_MS, LOOP_MONITOR_ENABLED, LOOP_MONITOR_INTERVAL_MS
+
+logger = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+    def __init__(
+        self,
+        interval: float = LOOP_MONITOR_INTERVAL_MS / 1000.0,
+        threshold: float = LOOP_LAG_THRESHOLD_MS / 1000.0,
+    ) -> None:
+        self.interval = interval
+        self.threshold = threshold
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    async def _tick(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            metrics.observe_loop_lag(max(0.0, now - expected))
+
+    def _watch(self) -> None:
+        reported = 0.0
+        while not self._stopped.wait(self.interval):
+            heartbeat = self._heartbeat
+            stalled = time.monotonic() - heartbeat - self.interval
+            if stalled < self.threshold or heartbeat == reported:
+                continue
+            reported = heartbeat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "(unavailable)\n"
+            logger.warning(
+                "Event loop blocked for %.0f ms so far; loop thread stack:\n%s", stalled * 1000, stack
+            )
+
+    def start(self) -> None:
+        if not LOOP_MONITOR_ENABLED or self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._tick())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._stopped.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._watchdog = None
+
+
+loop_monitor = LoopLagMonitor()
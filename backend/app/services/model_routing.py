@@ -0,0 +1,92 @@
+"""
+Per-call model and generation-config policy.
+
+choose() picks a model, max output tokens and thinking budget from the operation
+(intent, prompt, vision, summary), an input token estimate and an SLO class:
+  interactive  user is waiting: no thinking, large model only for large inputs
+  speculative  background work the user will probably wait on (speculative intent)
+  batch        nobody is waiting (background compaction): thinking allowed
+With MODEL_ROUTING_ENABLED off every call gets MODEL_FAST and no generationConfig,
+i.e. the behaviour before routing existed. Each decision is logged with its latency
+by the caller (see log_decision).
+"""
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+from app import metrics
+from app.config import (
+    MODEL_FAST,
+    MODEL_LARGE,
+    MODEL_LARGE_INPUT_TOKENS,
+    MODEL_ROUTING_ENABLED,
+    MODEL_THINKING_BUDGET,
+    TRANSCRIPT_SUMMARY_TOKENS,
+)
+
+logger = logging.getLogger(__name__)
+
+SLO_CLASSES = ("interactive", "speculative", "batch")
+
+# Output ceilings per operation: generous enough that valid JSON is never truncated.
+_MAX_OUTPUT_TOKENS = {
+    "intent": 1024,
+    "prompt": 2048,
+    "vision": 2048,
+    "summary": TRANSCRIPT_SUMMARY_TOKENS * 2,
+}
+
+# Gemini bills an image as 258-token tiles; without decoding dimensions, assume
+# roughly one tile per 150 KB of PNG.
+_IMAGE_TILE_TOKENS = 258
+_IMAGE_BYTES_PER_TILE = 150_000
+
+
+@dataclass(frozen=True)
+class ModelChoice:
+    model: str
+    tier: str
+    max_output_tokens: Optional[int] = None
+    thinking_budget: Optional[int] = None
+
+    def generation_config(self) -> Optional[dict]:
+        config: dict = {}
+        if self.max_output_tokens is not None:
+            config["maxOutputTokens"] = self.max_output_tokens
+        if self.thinking_budget is not None:
+            config["thinkingConfig"] = {"thinkingBudget": self.thinking_budget}
+        return config or None
+
+
+def estimate_image_tokens(num_bytes: int) -> int:
+    return _IMAGE_TILE_TOKENS * max(1, -(-num_bytes // _IMAGE_BYTES_PER_TILE))
+
+
+def choose(operation: str, input_tokens: int, slo: str = "interactive") -> ModelChoice:
+    if not MODEL_ROUTING_ENABLED:
+        return ModelChoice(model=MODEL_FAST, tier="default")
+    if slo not in SLO_CLASSES:
+        slo = "interactive"
+    max_output = _MAX_OUTPUT_TOKENS.get(operation)
+    large = input_tokens >= MODEL_LARGE_INPUT_TOKENS
+    if not large:
+        return ModelChoice(model=MODEL_FAST, tier="fast", max_output_tokens=max_output, thinking_budget=0)
+    # Large inputs get the bigger model; it only thinks when nobody is waiting on it.
+    thinking = 0 if slo == "interactive" else MODEL_THINKING_BUDGET
+    if thinking and max_output is not None:
+        # Thinking tokens count against maxOutputTokens.
+        max_output += thinking
+    return ModelChoice(model=MODEL_LARGE, tier="large", max_output_tokens=max_output, thinking_budget=thinking)
+
+
+def log_decision(
+    operation: str, slo: str, input_tokens: int, choice: ModelChoice, seconds: float, ok: bool
+) -> None:
+    metrics.record_model_route(operation, choice.tier, choice.model)
+    logger.info(
+        "model_route op=%s slo=%s input_tokens=%d tier=%s model=%s max_output=%s thinking=%s latency_ms=%.0f ok=%s",
+        operation, slo, input_tokens, choice.tier, choice.model,
+        choice.max_output_tokens, choice.thinking_budget, seconds * 1000, ok,
+    )
@@ -0,0 +1,111 @@
+"""
+Background health prober.
+Refreshes DB (and replica lag), and Gemini status on an interval so readiness checks answer from
+memory without any outbound traffic.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from sqlalchemy import text
+
+from app import metrics
+from app.config import DATABASE_READ_URL, HEALTH_PROBE_INTERVAL, READY_REQUIRE_UPSTREAM
+from app.database import engine, read_engine
+from app.services.drain import drainer
+from app.services import gemini_rest
+
+logger = logging.getLogger(__name__)
+
+
+class HealthProber:
+    def __init__(self, interval: float = HEALTH_PROBE_INTERVAL) -> None:
+        self.interval = interval
+        self.db: dict = {"status": "unknown"}
+        self.gemini: dict = {"status": "unknown"}
+        self.replica: dict = {"status": "disabled"}
+        self._task: Optional[asyncio.Task] = None
+
+    async def probe_db(self) -> None:
+        start = time.perf_counter()
+        try:
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+            self.db = {"status": "ok", "latency_ms": round((time.perf_counter() - start) * 1000, 1)}
+        except Exception as e:
+            self.db = {"status": "error", "error": str(e)}
+        self.db["checked_at"] = time.time()
+
+    async def probe_replica(self) -> None:
+        if not DATABASE_READ_URL:
+            return
+        try:
+            async with read_engine.connect() as conn:
+                # Zero when fully replayed; otherwise age of the last replayed transaction.
+                lag = (await conn.execute(text(
+                    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+                ))).scalar_one()
+            lag = float(lag or 0.0)
+            metrics.set_replica_lag(lag)
+            self.replica = {"status": "ok", "lag_seconds": round(lag, 3)}
+        except Exception as e:
+            self.replica = {"status": "error", "error": str(e)}
+        self.replica["checked_at"] = time.time()
+
+    async def probe_gemini(self) -> None:
+        result = await gemini_rest.probe_model()
+        result["checked_at"] = time.time()
+        self.gemini = result
+
+    async def probe_once(self) -> None:
+        await asyncio.gather(self.probe_db(), self.probe_replica(), self.probe_gemini())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.probe_once()
+            except Exception:
+                logger.exception("Health probe failed")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _stale(self, status: dict) -> bool:
+        checked_at = status.get("checked_at")
+        return checked_at is None or time.time() - checked_at > self.interval * 3
+
+    def readiness(self) -> tuple[bool, dict]:
+        """Return (ready, details) from cached state only."""
+        pool = engine.pool
+        pool_info = {
+            "size": pool.size() if hasattr(pool, "size") else None,
+            "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None,
+        }
+        db_ok = self.db.get("status") == "ok" and not self._stale(self.db)
+        gemini_ok = self.gemini.get("status") == "ok" and not self._stale(self.gemini)
+        ready = db_ok and (gemini_ok or not READY_REQUIRE_UPSTREAM) and not drainer.draining
+        return ready, {
+            "status": "draining" if drainer.draining else ("ready" if ready else "not_ready"),
+            "drain": drainer.status(),
+            "db": {**self.db, "pool": pool_info},
+            "replica": self.replica,
+            "gemini": self.gemini,
+        }
+
+
+prober = HealthProber()
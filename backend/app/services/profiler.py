@@ -0,0 +1,63 @@
+"""
+On-demand sampling profiler for a live worker.
+
+Samples every thread's Python stack with sys._current_frames() at a fixed interval
+from a background thread and aggregates them in folded-stack format
+("thread;outer;...;inner count" per line), which flamegraph.pl, speedscope and
+inferno read directly. Nothing runs until a profile is requested.
+"""
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+_lock = threading.Lock()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename}:{frame.f_lineno})"
+
+
+def _fold(frame) -> list[str]:
+    stack = []
+    while frame is not None:
+        stack.append(_frame_label(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def busy() -> bool:
+    return _lock.locked()
+
+
+def sample(seconds: float, interval: float = 0.01, idle_frames: bool = False) -> Optional[str]:
+    """
+    Profile for `seconds`; returns folded stacks, or None if a profile is already
+    running. Threads parked in a wait (the sampler itself, idle pool workers) are
+    skipped unless idle_frames is set.
+    """
+    if not _lock.acquire(blocking=False):
+        return None
+    try:
+        me = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        counts: Counter[str] = Counter()
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = _fold(frame)
+                if not idle_frames and stack and stack[-1].startswith(("wait ", "select ", "_worker ")):
+                    continue
+                thread = names.get(ident) or f"thread-{ident}"
+                counts[";".join([thread, *stack])] += 1
+            time.sleep(interval)
+        return "".join(f"{stack} {n}\n" for stack, n in counts.most_common())
+    finally:
+        _lock.release()
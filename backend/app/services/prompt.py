@@ -1,19 +1,11 @@
+import hashlib
 import json
 
+from app import tracing
 from app.services.gemini_rest import generate_text
+from app.services.scheduler import UpstreamBusy
 
-
-class PromptService:
-    def __init__(self) -> None:
-        pass
-
-    async def generate_prompts(self, structured_intent: dict) -> dict:
-        """
-        Generate three prompt variants (short, detailed, expert).
-        Uses Gemini REST (gemini-2.5-flash-lite + API key).
-        """
-        intent_json = json.dumps(structured_intent, indent=2)
-        prompt = f"""Based on this structured intent, generate three AI prompts:
+PROMPT_TEMPLATE = """Based on this structured intent, generate three AI prompts:
 
 Structured Intent:
 {intent_json}
@@ -32,21 +24,45 @@ Return ONLY a JSON object with this exact structure:
 
 Return ONLY valid JSON, no additional text."""
 
+# Stored with each prompt record (prompts.template_version); see services/batch.py.
+TEMPLATE_VERSION = hashlib.sha256(PROMPT_TEMPLATE.encode("utf-8")).hexdigest()[:12]
+
+
+class PromptService:
+    def __init__(self) -> None:
+        pass
+
+    async def generate_prompts(self, structured_intent: dict) -> dict:
+        """
+        Generate three prompt variants (short, detailed, expert).
+        Uses Gemini REST (model chosen by services/model_routing.py + API key).
+        """
         try:
-            response_text = await generate_text(prompt)
+            response_text = await generate_text(build_prompt(structured_intent), operation="prompt")
+        except UpstreamBusy:
+            raise
         except Exception as e:
             raise Exception(f"Prompt generation error: {str(e)}")
 
-        response_text = response_text.strip()
-        if response_text.startswith("```json"):
-            response_text = response_text[7:]
-        if response_text.startswith("```"):
-            response_text = response_text[3:]
-        if response_text.endswith("```"):
-            response_text = response_text[:-3]
-        response_text = response_text.strip()
+        return parse_prompts(response_text)
 
-        try:
+
+def build_prompt(structured_intent: dict) -> str:
+    return PROMPT_TEMPLATE.format(intent_json=json.dumps(structured_intent, indent=2))
+
+
+def parse_prompts(response_text: str) -> dict:
+    response_text = response_text.strip()
+    if response_text.startswith("```json"):
+        response_text = response_text[7:]
+    if response_text.startswith("```"):
+        response_text = response_text[3:]
+    if response_text.endswith("```"):
+        response_text = response_text[:-3]
+    response_text = response_text.strip()
+
+    try:
+        with tracing.span("prompt.parse"):
             return json.loads(response_text)
-        except json.JSONDecodeError as e:
-            raise Exception(f"Failed to parse prompts JSON: {str(e)}")
+    except json.JSONDecodeError as e:
+        raise Exception(f"Failed to parse prompts JSON: {str(e)}")
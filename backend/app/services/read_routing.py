@@ -0,0 +1,71 @@
+"""
+Primary/replica routing for read-only handlers.
+
+Reads go to the replica (DATABASE_READ_URL) unless the session was written within
+READ_YOUR_WRITES_SECONDS, in which case they go to the primary so the user never
+sees their own change disappear. Write handlers call note_write() after commit;
+the marker lives in the shared cache backend, so it only holds across workers
+when CACHE_BACKEND_URL is set. A replica that failed its last probe, or lags by
+more than the window, is skipped.
+"""
+from __future__ import annotations
+
+import logging
+from typing import AsyncIterator
+from uuid import UUID
+
+from app import metrics
+from app.config import DATABASE_READ_URL, READ_YOUR_WRITES_SECONDS
+from app.database import AsyncReadSessionLocal, AsyncSessionLocal
+from app.services.probes import prober
+from app.services.shared_cache import get_backend
+
+logger = logging.getLogger(__name__)
+
+
+def _key(session_id) -> str:
+    return f"recent_write:{session_id}"
+
+
+async def note_write(session_id: UUID) -> None:
+    """Pin reads of this session to the primary for the read-your-writes window."""
+    if not DATABASE_READ_URL:
+        return
+    try:
+        await get_backend().set(_key(session_id), 1, ttl=READ_YOUR_WRITES_SECONDS)
+    except Exception as e:
+        logger.warning("Could not record write for session %s: %s", session_id, e)
+
+
+async def _recently_written(session_id: str) -> bool:
+    try:
+        # Writers key by UUID; the path may differ in case or hyphenation.
+        session_id = str(UUID(session_id))
+    except ValueError:
+        return True
+    try:
+        return bool(await get_backend().get(_key(session_id)))
+    except Exception:
+        # Unknown: the primary is always correct.
+        return True
+
+
+def _replica_usable() -> bool:
+    status = prober.replica
+    if status.get("status") == "error":
+        return False
+    return status.get("lag_seconds", 0.0) <= READ_YOUR_WRITES_SECONDS
+
+
+async def get_read_db(session_id: str) -> AsyncIterator:
+    """FastAPI dependency: a read-only DB session for the {session_id} path parameter."""
+    if DATABASE_READ_URL and _replica_usable() and not await _recently_written(session_id):
+        factory, target = AsyncReadSessionLocal, "replica"
+    else:
+        factory, target = AsyncSessionLocal, "primary"
+    metrics.record_read_route(target)
+    async with factory() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
@@ -0,0 +1,153 @@
+"""
+Latency-aware routing of Vertex calls across regions.
+
+Each region in GOOGLE_LOCATIONS keeps a latency EWMA and a health state. Calls go to
+the fastest healthy region; a 429, 5xx, timeout or connection error puts the region
+in cooldown (doubling on repeated failures) and the call moves on to the next region
+while the overall deadline allows. Regions without a recent sample are tried first
+so a recovered region gets traffic again. All bookkeeping happens on the event loop.
+"""
+from __future__ import annotations
+
+import logging
+import socket
+import time
+import urllib.error
+from dataclasses import dataclass
+from typing import Callable, Optional, TypeVar
+
+from app import metrics, tracing
+from app.config import (
+    GOOGLE_LOCATIONS,
+    GOOGLE_PROJECT_ID,
+    REGION_COOLDOWN_SECONDS,
+    VERTEX_API_ENDPOINT,
+    VERTEX_REGION_ENDPOINTS,
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_ALPHA = 0.2
+_EXPLORE_AFTER = 60.0
+_MAX_COOLDOWN = 600.0
+
+
+@dataclass
+class Region:
+    name: str
+    host: str
+    location: str  # "projects/{project}/locations/{region}"
+    ewma_ms: Optional[float] = None
+    last_sample_at: float = 0.0
+    consecutive_failures: int = 0
+    cooldown_until: float = 0.0
+    requests: int = 0
+    errors: int = 0
+    failovers: int = 0
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.cooldown_until
+
+    def stats(self) -> dict:
+        now = time.time()
+        return {
+            "region": self.name,
+            "healthy": self.healthy(now),
+            "ewma_ms": round(self.ewma_ms, 1) if self.ewma_ms is not None else None,
+            "cooldown_s": round(max(0.0, self.cooldown_until - now), 1),
+            "requests": self.requests,
+            "errors": self.errors,
+            "failovers": self.failovers,
+        }
+
+
+def _host_for(region: str) -> str:
+    # VERTEX_API_ENDPOINT points every region at one local stand-in (bench/mock_upstream.py).
+    return VERTEX_REGION_ENDPOINTS.get(region) or VERTEX_API_ENDPOINT or f"https://{region}-aiplatform.googleapis.com"
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, urllib.error.HTTPError):
+        return exc.code == 429 or exc.code >= 500
+    return isinstance(exc, (urllib.error.URLError, socket.timeout, TimeoutError, ConnectionError))
+
+
+class RegionRouter:
+    def __init__(self, names: list[str], project: str = GOOGLE_PROJECT_ID) -> None:
+        self.regions = [
+            Region(name=n, host=_host_for(n), location=f"projects/{project}/locations/{n}") for n in names
+        ]
+
+    @property
+    def primary(self) -> Region:
+        """Home region: context caches live here."""
+        return self.regions[0]
+
+    def ordered(self) -> list[Region]:
+        """Healthy regions, unexplored then fastest first; regions in cooldown last."""
+        now = time.time()
+
+        def key(r: Region) -> tuple:
+            stale = r.ewma_ms is None or now - r.last_sample_at > _EXPLORE_AFTER
+            return (not r.healthy(now), not stale, r.ewma_ms or 0.0, r.cooldown_until)
+
+        return sorted(self.regions, key=key)
+
+    def record_success(self, region: Region, seconds: float) -> None:
+        ms = seconds * 1000.0
+        region.ewma_ms = ms if region.ewma_ms is None else _ALPHA * ms + (1 - _ALPHA) * region.ewma_ms
+        region.last_sample_at = time.time()
+        region.consecutive_failures = 0
+        region.cooldown_until = 0.0
+        metrics.record_region(region.name, "ok")
+
+    def record_failure(self, region: Region, reason: str) -> None:
+        region.errors += 1
+        region.consecutive_failures += 1
+        cooldown = min(_MAX_COOLDOWN, REGION_COOLDOWN_SECONDS * 2 ** (region.consecutive_failures - 1))
+        region.cooldown_until = time.time() + cooldown
+        metrics.record_region(region.name, reason)
+        logger.warning("Vertex region %s failed (%s); cooling down for %.0fs", region.name, reason, cooldown)
+
+    def mark_healthy(self, region: Region) -> None:
+        region.consecutive_failures = 0
+        region.cooldown_until = 0.0
+
+    async def call(self, label: str, fn: Callable[[Region, float], T], deadline: float) -> T:
+        """
+        Run fn(region, timeout) in a thread against the best region, failing over on
+        retryable errors until `deadline` seconds have passed. Other errors propagate.
+        """
+        end = time.monotonic() + deadline
+        last_exc: Optional[BaseException] = None
+        for attempt, region in enumerate(self.ordered()):
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                break
+            if attempt:
+                region.failovers += 1
+            region.requests += 1
+            start = time.perf_counter()
+            try:
+                with tracing.span(f"{label}.region", region=region.name, attempt=attempt):
+                    result = await tracing.to_thread(label, fn, region, remaining)
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                reason = f"http_{e.code}" if isinstance(e, urllib.error.HTTPError) else "network"
+                self.record_failure(region, reason)
+                last_exc = e
+                continue
+            self.record_success(region, time.perf_counter() - start)
+            return result
+        if last_exc is not None:
+            raise last_exc
+        raise TimeoutError(f"{label}: no Vertex region answered within {deadline:.0f}s")
+
+    def stats(self) -> list[dict]:
+        return [r.stats() for r in self.regions]
+
+
+router = RegionRouter(GOOGLE_LOCATIONS)
@@ -0,0 +1,174 @@
+"""
+Weighted fair scheduling of outbound Gemini and Speech calls.
+
+Each upstream has a fixed number of concurrent slots per worker. Calls beyond that
+queue per flow, a flow being (priority class, tenant). Flows are served by
+start-time fair queuing: every call gets a virtual start tag
+max(virtual time, flow's last finish tag) and a finish tag start + cost / weight,
+and the smallest start tag runs next. Class weights (interactive 8, speculative 2,
+batch 1) put interactive work ahead without starving background work, and a user
+sending many calls only pushes their own tags forward.
+
+The tenant is sessions.user_id when known (set_tenant_for), else the client
+address set by the request middleware. Background tasks inherit it through the
+copied context. When a class queue or a tenant's queue is full, UpstreamBusy is
+raised and the API answers 429 with Retry-After.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from app import metrics
+from app.config import (
+    GEMINI_CONCURRENCY,
+    SPEECH_CONCURRENCY,
+    UPSTREAM_QUEUE_LIMIT,
+    UPSTREAM_USER_QUEUE_LIMIT,
+)
+
+CLASS_WEIGHTS = {"interactive": 8.0, "speculative": 2.0, "batch": 1.0}
+
+_tenant: contextvars.ContextVar[str] = contextvars.ContextVar("intentify_tenant", default="anonymous")
+
+
+class UpstreamBusy(Exception):
+    def __init__(self, upstream: str, retry_after: int) -> None:
+        super().__init__(f"{upstream} capacity exhausted; retry in {retry_after}s")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+def set_tenant(tenant: str) -> None:
+    _tenant.set(tenant)
+
+
+def set_tenant_for(session) -> None:
+    """Schedule this request's upstream calls under the session's user, if it has one."""
+    if getattr(session, "user_id", None):
+        _tenant.set(f"user:{session.user_id}")
+
+
+class _Waiter:
+    __slots__ = ("future", "priority", "tenant", "cancelled")
+
+    def __init__(self, future: asyncio.Future, priority: str, tenant: str) -> None:
+        self.future = future
+        self.priority = priority
+        self.tenant = tenant
+        self.cancelled = False
+
+
+class FairScheduler:
+    def __init__(self, upstream: str, capacity: int) -> None:
+        self.upstream = upstream
+        self.capacity = capacity
+        self._active = 0
+        self._vtime = 0.0
+        self._last_finish: dict[tuple[str, str], float] = {}
+        self._heap: list[tuple[float, int, _Waiter]] = []
+        self._seq = itertools.count()
+        self._queued_by_class: dict[str, int] = {c: 0 for c in CLASS_WEIGHTS}
+        self._queued_by_tenant: dict[str, int] = {}
+        self._hold_ewma = 1.0  # seconds a call keeps its slot
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def _tag(self, priority: str, tenant: str, cost: float) -> float:
+        flow = (priority, tenant)
+        start = max(self._vtime, self._last_finish.get(flow, 0.0))
+        self._last_finish[flow] = start + cost / CLASS_WEIGHTS[priority]
+        if len(self._last_finish) > 10_000:
+            self._last_finish = {f: t for f, t in self._last_finish.items() if t > self._vtime}
+        return start
+
+    def _retry_after(self) -> int:
+        queued = sum(self._queued_by_class.values())
+        return max(1, math.ceil((queued / self.capacity + 1) * self._hold_ewma))
+
+    def _dequeued(self, waiter: _Waiter) -> None:
+        self._queued_by_class[waiter.priority] -= 1
+        metrics.set_queue_depth(self.upstream, waiter.priority, self._queued_by_class[waiter.priority])
+        left = self._queued_by_tenant.get(waiter.tenant, 1) - 1
+        if left > 0:
+            self._queued_by_tenant[waiter.tenant] = left
+        else:
+            self._queued_by_tenant.pop(waiter.tenant, None)
+
+    async def _acquire(self, priority: str, tenant: str, cost: float) -> None:
+        if self._active < self.capacity and not self._heap:
+            # Served immediately: virtual time moves to this call's start, as it would
+            # on dequeue, so uncontended history does not count against the flow later.
+            self._vtime = max(self._vtime, self._tag(priority, tenant, cost))
+            self._active += 1
+            return
+        if (
+            self._queued_by_class[priority] >= UPSTREAM_QUEUE_LIMIT
+            or self._queued_by_tenant.get(tenant, 0) >= UPSTREAM_USER_QUEUE_LIMIT
+        ):
+            metrics.record_upstream_rejected(self.upstream, priority)
+            raise UpstreamBusy(self.upstream, self._retry_after())
+        start_tag = self._tag(priority, tenant, cost)
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), priority, tenant)
+        heapq.heappush(self._heap, (start_tag, next(self._seq), waiter))
+        self._queued_by_class[priority] += 1
+        self._queued_by_tenant[tenant] = self._queued_by_tenant.get(tenant, 0) + 1
+        metrics.set_queue_depth(self.upstream, priority, self._queued_by_class[priority])
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted a slot just as we were cancelled: hand it on.
+                self._release()
+            elif not waiter.cancelled:
+                waiter.cancelled = True
+                self._dequeued(waiter)
+            raise
+
+    def _release(self) -> None:
+        self._active -= 1
+        if self._active == 0 and not self._heap:
+            # Idle: no flow is behind any other, so start everyone afresh.
+            self._last_finish.clear()
+            self._vtime = 0.0
+        while self._heap and self._active < self.capacity:
+            start_tag, _, waiter = heapq.heappop(self._heap)
+            if waiter.cancelled:
+                continue
+            self._dequeued(waiter)
+            self._vtime = max(self._vtime, start_tag)
+            self._active += 1
+            waiter.future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, priority: str = "interactive", cost: float = 1.0) -> AsyncIterator[None]:
+        """Hold one of this upstream's slots for the duration of the block."""
+        if not self.enabled:
+            yield
+            return
+        if priority not in CLASS_WEIGHTS:
+            priority = "interactive"
+        queued_at = time.perf_counter()
+        await self._acquire(priority, _tenant.get(), max(cost, 0.1))
+        granted_at = time.perf_counter()
+        metrics.observe_queue_wait(self.upstream, priority, granted_at - queued_at)
+        try:
+            yield
+        finally:
+            self._hold_ewma = 0.8 * self._hold_ewma + 0.2 * (time.perf_counter() - granted_at)
+            self._release()
+
+    def depth(self) -> dict[str, int]:
+        return dict(self._queued_by_class)
+
+
+gemini_scheduler = FairScheduler("gemini", GEMINI_CONCURRENCY)
+speech_scheduler = FairScheduler("speech", SPEECH_CONCURRENCY)
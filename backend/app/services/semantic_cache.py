@@ -0,0 +1,303 @@
+"""
+Optional semantic cache for structured intents (and the prompts generated from them).
+
+Transcript + screen summary are embedded with a small local CPU model (fastembed)
+and matched by cosine similarity against an in-memory NumPy index. Above the
+threshold, the stored structured_intent (and prompts, once generated) are reused
+instead of calling Gemini. The index is a fixed-size ring, loaded from and
+snapshotted to disk. Every worker snapshots (periodically and on shutdown), so a
+snapshot is merged into the one on disk under a file lock rather than replacing
+it. Off unless SEMANTIC_CACHE_ENABLED and numpy/fastembed are installed (see
+requirements-semantic.txt).
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Iterator, Optional
+
+from app import metrics
+from app.services.drain import drainer
+from app.config import (
+    SEMANTIC_CACHE_ENABLED,
+    SEMANTIC_CACHE_MAX_ENTRIES,
+    SEMANTIC_CACHE_MODEL,
+    SEMANTIC_CACHE_PATH,
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_VERIFY_RATE,
+)
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; snapshots are then written unlocked
+    fcntl = None
+
+np = None
+if SEMANTIC_CACHE_ENABLED:
+    try:
+        import numpy as np
+    except ImportError:  # optional dependency
+        pass
+
+logger = logging.getLogger(__name__)
+
+# The screen summary is long, structured markdown; its head carries the verdict.
+_SUMMARY_CHARS = 1500
+_SNAPSHOT_EVERY = 50
+
+
+@dataclass
+class SemanticHit:
+    entry_id: int
+    similarity: float
+    structured_intent: dict
+    prompts: Optional[dict]
+
+
+@dataclass
+class SemanticQuery:
+    vector: Any
+    hit: Optional[SemanticHit] = None
+    entry_id: Optional[int] = None  # set by store() on a miss
+
+
+def _embed_text(transcript: str, screen_summary: str) -> str:
+    return f"{transcript.strip()}\n\n{screen_summary.strip()[:_SUMMARY_CHARS]}"
+
+
+class SemanticCache:
+    def __init__(
+        self,
+        path: str = SEMANTIC_CACHE_PATH,
+        max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        enabled: bool = SEMANTIC_CACHE_ENABLED,
+    ) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.enabled = enabled and np is not None
+        if enabled and np is None:
+            logger.warning("SEMANTIC_CACHE_ENABLED is set but numpy is not installed; semantic cache disabled")
+        self._embedder = None
+        self._vectors = None  # (max_entries, dim) float32, rows L2-normalized
+        self._entries: list[Optional[dict]] = [None] * max_entries
+        self._next = 0
+        self._size = 0
+        self._entry_seq = 0
+        self._inserts_since_snapshot = 0
+        self._background: set[asyncio.Task] = set()
+
+    def _get_embedder(self):
+        if self._embedder is None:
+            try:
+                from fastembed import TextEmbedding
+            except ImportError:
+                logger.warning("fastembed is not installed; semantic cache disabled")
+                self.enabled = False
+                return None
+            self._embedder = TextEmbedding(model_name=SEMANTIC_CACHE_MODEL)
+        return self._embedder
+
+    def _embed_sync(self, text: str):
+        embedder = self._get_embedder()
+        if embedder is None:
+            return None
+        vec = np.asarray(next(iter(embedder.embed([text]))), dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    async def query(self, transcript: str, screen_summary: str) -> Optional[SemanticQuery]:
+        """Embed the inputs and look up the nearest stored intent. None when disabled."""
+        if not self.enabled:
+            return None
+        try:
+            vec = await asyncio.to_thread(self._embed_sync, _embed_text(transcript, screen_summary))
+        except Exception:
+            logger.exception("Semantic cache embedding failed")
+            return None
+        if vec is None:
+            return None
+        query = SemanticQuery(vector=vec)
+        if self._vectors is None or self._size == 0:
+            metrics.cache_miss("semantic")
+            return query
+        scores = self._vectors[: self._size] @ vec
+        best = int(np.argmax(scores))
+        similarity = float(scores[best])
+        metrics.observe_semantic_similarity(similarity)
+        entry = self._entries[best]
+        if entry is None or similarity < self.threshold:
+            metrics.cache_miss("semantic")
+            return query
+        metrics.cache_hit("semantic")
+        query.hit = SemanticHit(entry["id"], similarity, entry["structured_intent"], entry.get("prompts"))
+        return query
+
+    def store(self, query: Optional[SemanticQuery], structured_intent: dict) -> Optional[int]:
+        """Insert a freshly extracted intent under the query's vector; returns the entry id."""
+        if query is None or not self.enabled:
+            return None
+        vec = query.vector
+        if self._vectors is None:
+            self._vectors = np.zeros((self.max_entries, vec.shape[0]), dtype=np.float32)
+        elif self._vectors.shape[1] != vec.shape[0]:
+            logger.warning("Semantic cache dimension changed; resetting index")
+            self._vectors = np.zeros((self.max_entries, vec.shape[0]), dtype=np.float32)
+            self._entries = [None] * self.max_entries
+            self._next = self._size = 0
+        self._entry_seq += 1
+        query.entry_id = self._entry_seq
+        slot = self._next
+        self._vectors[slot] = vec
+        self._entries[slot] = {"id": self._entry_seq, "structured_intent": structured_intent, "prompts": None}
+        self._next = (self._next + 1) % self.max_entries
+        self._size = min(self._size + 1, self.max_entries)
+        self._inserts_since_snapshot += 1
+        if self._inserts_since_snapshot >= _SNAPSHOT_EVERY:
+            self._inserts_since_snapshot = 0
+            self._spawn(asyncio.to_thread(self._write_snapshot, self._snapshot_data()))
+        return self._entry_seq
+
+    def attach_prompts(self, entry_id: Optional[int], prompts: dict) -> None:
+        """Remember generated prompts on an entry, unless it has since been evicted."""
+        if entry_id is None or not self.enabled:
+            return
+        for entry in self._entries:
+            if entry is not None and entry["id"] == entry_id:
+                entry["prompts"] = prompts
+                return
+
+    def maybe_verify(self, query: SemanticQuery, extract: Callable[[], Awaitable[dict]]) -> None:
+        """
+        On a sampled fraction of hits, run the real extraction in the background and
+        record how similar its intent is to the cached one (hit-quality telemetry).
+        """
+        if query.hit is None or random.random() >= SEMANTIC_CACHE_VERIFY_RATE:
+            return
+
+        async def verify() -> None:
+            try:
+                fresh = await extract()
+                cached_vec, fresh_vec = await asyncio.gather(
+                    asyncio.to_thread(self._embed_sync, json.dumps(query.hit.structured_intent, sort_keys=True)),
+                    asyncio.to_thread(self._embed_sync, json.dumps(fresh, sort_keys=True)),
+                )
+                agreement = float(cached_vec @ fresh_vec)
+                metrics.observe_semantic_agreement(agreement)
+                logger.info(
+                    "Semantic cache verification: similarity=%.3f agreement=%.3f",
+                    query.hit.similarity, agreement,
+                )
+            except Exception:
+                logger.exception("Semantic cache verification failed")
+
+        self._spawn(verify())
+
+    def _spawn(self, coro) -> None:
+        task = drainer.track(asyncio.ensure_future(coro))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def _snapshot_data(self) -> Optional[tuple]:
+        # Copy on the event loop so a background write never sees a half-updated index.
+        if not self.enabled or self._vectors is None:
+            return None
+        order = [*range(self._next, self._size), *range(0, self._next)]  # oldest first
+        return self._vectors[order].copy(), json.loads(json.dumps([self._entries[i] for i in order]))
+
+    @contextmanager
+    def _locked(self, shared: bool) -> Iterator[None]:
+        """Serialize snapshot writers (and readers) across the deployment's workers."""
+        with open(self.path + ".lock", "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            yield
+
+    def _read_snapshot(self) -> Optional[tuple]:
+        """(vectors, entries) from disk, oldest first; None if missing or from another model."""
+        if not os.path.exists(self.path + ".json"):
+            return None
+        with open(self.path + ".json") as f:
+            meta = json.load(f)
+        if meta.get("model") != SEMANTIC_CACHE_MODEL:
+            return None
+        vectors = np.load(self.path + ".npy")
+        size = min(len(meta["entries"]), vectors.shape[0])
+        next_slot = meta.get("next", size) % max(size, 1)
+        order = [*range(next_slot, size), *range(0, next_slot)]
+        return vectors[order], [meta["entries"][i] for i in order]
+
+    def _merge(self, vectors, entries: list) -> tuple:
+        """Other workers' snapshot entries (oldest first) followed by ours, newest kept."""
+        try:
+            existing = self._read_snapshot()
+        except Exception:
+            logger.exception("Could not read semantic cache snapshot for merging; overwriting it")
+            existing = None
+        if existing is None or existing[0].shape[1:] != vectors.shape[1:]:
+            return vectors, entries
+        ours = {hashlib.sha1(vec.tobytes()).digest() for vec in vectors}
+        keep = [i for i, vec in enumerate(existing[0]) if hashlib.sha1(vec.tobytes()).digest() not in ours]
+        merged = np.concatenate([existing[0][keep], vectors])[-self.max_entries:]
+        return merged, ([existing[1][i] for i in keep] + entries)[-self.max_entries:]
+
+    def _write_snapshot(self, data: Optional[tuple]) -> None:
+        if data is None:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._locked(shared=False):
+            vectors, entries = self._merge(*data)
+            # Entry ids are per worker; renumber so the merged snapshot has unique ids.
+            for seq, entry in enumerate(entries, start=1):
+                entry["id"] = seq
+            meta = {
+                "model": SEMANTIC_CACHE_MODEL,
+                "next": len(entries) % self.max_entries,
+                "entry_seq": len(entries),
+                "entries": entries,
+            }
+            tmp = f"{self.path}.tmp-{os.getpid()}"
+            with open(tmp + ".npy", "wb") as f:
+                np.save(f, vectors)
+            with open(tmp + ".json", "w") as f:
+                json.dump(meta, f)
+            os.replace(tmp + ".npy", self.path + ".npy")
+            os.replace(tmp + ".json", self.path + ".json")
+
+    def snapshot(self) -> None:
+        try:
+            self._write_snapshot(self._snapshot_data())
+        except Exception:
+            logger.exception("Could not write semantic cache snapshot")
+
+    def load(self) -> None:
+        if not self.enabled or not os.path.exists(self.path + ".json"):
+            return
+        try:
+            with self._locked(shared=True):
+                snapshot = self._read_snapshot()
+        except Exception:
+            logger.exception("Could not load semantic cache snapshot")
+            return
+        if snapshot is None:
+            logger.info("No usable semantic cache snapshot (missing or built with another model)")
+            return
+        vectors, entries = snapshot[0][-self.max_entries:], snapshot[1][-self.max_entries:]
+        size = len(entries)
+        self._vectors = np.zeros((self.max_entries, vectors.shape[1]), dtype=np.float32)
+        self._vectors[:size] = vectors
+        self._entries = entries + [None] * (self.max_entries - size)
+        self._size = size
+        self._next = size % self.max_entries
+        self._entry_seq = max((entry["id"] for entry in entries), default=0)
+        logger.info("Loaded %d semantic cache entries", size)
+
+
+semantic_cache = SemanticCache()
@@ -0,0 +1,68 @@
+"""
+Short-lived per-worker cache of serialized GET /session/{id} responses.
+
+Entries are keyed by session id and hold (etag, JSON body). Every write path calls
+note_write(), which drops this worker's entry and pins reads to the primary (see
+read_routing). Other workers may serve their copy until it expires, so the TTL is
+kept to a few seconds. The ETag is derived from sessions.updated_at, which every
+user-visible write bumps.
+"""
+from __future__ import annotations
+
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Optional
+from uuid import UUID
+
+from app import metrics
+from app.config import SESSION_CACHE_MAX_ENTRIES, SESSION_CACHE_TTL_SECONDS
+from app.services import read_routing
+
+_entries: OrderedDict[UUID, tuple[float, str, bytes]] = OrderedDict()
+
+
+def etag_for(session) -> str:
+    stamp = session.updated_at.isoformat() if session.updated_at else ""
+    return '"' + hashlib.sha1(f"{session.id}:{stamp}".encode("utf-8")).hexdigest()[:20] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def get(session_id: UUID) -> Optional[tuple[str, bytes]]:
+    if SESSION_CACHE_TTL_SECONDS <= 0:
+        return None
+    item = _entries.get(session_id)
+    if item is None or item[0] < time.monotonic():
+        _entries.pop(session_id, None)
+        metrics.cache_miss("session_response")
+        return None
+    metrics.cache_hit("session_response")
+    return item[1], item[2]
+
+
+def put(session_id: UUID, etag: str, body: bytes) -> None:
+    if SESSION_CACHE_TTL_SECONDS <= 0:
+        return
+    _entries[session_id] = (time.monotonic() + SESSION_CACHE_TTL_SECONDS, etag, body)
+    _entries.move_to_end(session_id)
+    while len(_entries) > SESSION_CACHE_MAX_ENTRIES:
+        _entries.popitem(last=False)
+
+
+def invalidate(session_id: UUID) -> None:
+    _entries.pop(session_id, None)
+
+
+async def note_write(session_id: UUID) -> None:
+    """Call after committing any change to a session."""
+    invalidate(session_id)
+    await read_routing.note_write(session_id)
@@ -0,0 +1,97 @@
+"""
+Pluggable cache backend shared across worker processes.
+
+CACHE_BACKEND_URL unset keeps values in-process (each worker has its own copy);
+redis://... shares them between workers and replicas. Values are JSON-serialisable.
+The backend is created lazily in each process, never before a fork.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import time
+from typing import Any, Optional
+
+from app.config import CACHE_BACKEND_URL
+
+logger = logging.getLogger(__name__)
+
+
+class LocalBackend:
+    name = "local"
+
+    def __init__(self) -> None:
+        self._data: dict[str, tuple[float, Any]] = {}
+
+    async def get(self, key: str) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at and expires_at < time.time():
+            self._data.pop(key, None)
+            return None
+        return value
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self._data[key] = (time.time() + ttl if ttl else 0.0, value)
+
+    async def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    async def close(self) -> None:
+        self._data.clear()
+
+
+class RedisBackend:
+    name = "redis"
+
+    def __init__(self, url: str) -> None:
+        import redis.asyncio as redis
+
+        self._client = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[Any]:
+        raw = await self._client.get(f"intentify:{key}")
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        await self._client.set(f"intentify:{key}", json.dumps(value), ex=int(ttl) if ttl else None)
+
+    async def delete(self, key: str) -> None:
+        await self._client.delete(f"intentify:{key}")
+
+    async def close(self) -> None:
+        await getattr(self._client, "aclose", self._client.close)()
+
+
+_backend = None
+_backend_pid: Optional[int] = None
+
+
+def get_backend():
+    """Backend for this process, built on first use (after any fork)."""
+    global _backend, _backend_pid
+    if _backend is None or _backend_pid != os.getpid():
+        _backend = _build()
+        _backend_pid = os.getpid()
+    return _backend
+
+
+def _build():
+    if CACHE_BACKEND_URL.startswith(("redis://", "rediss://", "unix://")):
+        try:
+            return RedisBackend(CACHE_BACKEND_URL)
+        except ImportError:
+            logger.warning("CACHE_BACKEND_URL is a Redis URL but redis is not installed; using in-process cache")
+    elif CACHE_BACKEND_URL:
+        logger.warning("Unsupported CACHE_BACKEND_URL %r; using in-process cache", CACHE_BACKEND_URL)
+    return LocalBackend()
+
+
+async def close_backend() -> None:
+    global _backend
+    if _backend is not None and _backend_pid == os.getpid():
+        await _backend.close()
+    _backend = None
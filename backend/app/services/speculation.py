@@ -0,0 +1,157 @@
+"""
+Speculative intent extraction.
+
+After a capture, the user nearly always asks for the intent a few seconds later,
+so with SPECULATIVE_INTENT_ENABLED the capture schedules extraction in the
+background. The result is stored on the session together with a fingerprint of
+its inputs (sessions.structured_intent_fingerprint). /intent and /generate reuse
+the stored or still-running result when their inputs fingerprint the same; edited
+inputs cancel the in-flight task and take the normal path.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import metrics
+from app.config import SPECULATIVE_INTENT_ENABLED
+from app.database import AsyncSessionLocal
+from app.models import Session as SessionModel
+from app.services import blobstore, session_cache
+from app.services.drain import drainer
+from app.services.intent import TEMPLATE_VERSION, IntentService
+from app.services.intent_refinement import coverage, intent_refiner
+from app.services.scheduler import UpstreamBusy
+from app.services.transcript import transcript_compactor
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint(transcript: str, screen_summary: str) -> str:
+    h = hashlib.sha256()
+    for part in (transcript.strip(), screen_summary.strip()):
+        data = part.encode("utf-8")
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+    return h.hexdigest()
+
+
+class SpeculativeIntent:
+    def __init__(self, enabled: bool = SPECULATIVE_INTENT_ENABLED) -> None:
+        self.enabled = enabled
+        self._intent = IntentService()
+        self._tasks: dict[UUID, tuple[str, asyncio.Task]] = {}
+
+    def schedule(self, session_id: UUID, transcript: str, screen_summary: str) -> None:
+        """Start background extraction for freshly captured inputs (replacing older work)."""
+        if not self.enabled or not (transcript.strip() or screen_summary.strip()):
+            return
+        fp = fingerprint(transcript, screen_summary)
+        current = self._tasks.get(session_id)
+        if current is not None and current[0] == fp:
+            return
+        self.cancel(session_id)
+        task = drainer.track(asyncio.create_task(self._run(session_id, fp, transcript, screen_summary)))
+        self._tasks[session_id] = (fp, task)
+        task.add_done_callback(lambda t: self._forget(session_id, t))
+
+    def cancel(self, session_id: UUID) -> None:
+        current = self._tasks.pop(session_id, None)
+        if current is not None and not current[1].done():
+            current[1].cancel()
+            metrics.cache_miss("speculative_intent")
+            logger.info("Cancelled speculative intent for session %s", session_id)
+
+    def _forget(self, session_id: UUID, task: asyncio.Task) -> None:
+        current = self._tasks.get(session_id)
+        if current is not None and current[1] is task:
+            self._tasks.pop(session_id, None)
+
+    async def _run(self, session_id: UUID, fp: str, transcript: str, screen_summary: str) -> Optional[dict]:
+        try:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(select(SessionModel).where(SessionModel.id == session_id))
+                session = result.scalar_one_or_none()
+                if session is None:
+                    return None
+                seen_updated_at = session.updated_at
+                _, previous_intent = await blobstore.load_session_fields(db, session)
+                refinement = await intent_refiner.refine(
+                    session, previous_intent, transcript, screen_summary, slo="speculative"
+                )
+                if refinement is not None:
+                    structured_intent, intent_state = refinement.structured_intent, refinement.state
+                else:
+                    transcript_context = await transcript_compactor.prepare(db, session, transcript)
+                    structured_intent = await self._intent.extract_intent(
+                        transcript_context, screen_summary, slo="speculative"
+                    )
+                    intent_state = coverage(transcript, screen_summary)
+                # Only store if nothing touched the session meanwhile (new audio, an explicit extraction).
+                result = await db.execute(
+                    update(SessionModel)
+                    .where(SessionModel.id == session_id, SessionModel.updated_at == seen_updated_at)
+                    .values(
+                        structured_intent=None,
+                        structured_intent_hash=await blobstore.put_json(db, structured_intent),
+                        structured_intent_fingerprint=fp,
+                        structured_intent_template=TEMPLATE_VERSION,
+                        **intent_state,
+                        updated_at=datetime.utcnow()
+                    )
+                )
+                await db.commit()
+                if result.rowcount == 0:
+                    logger.info("Discarded speculative intent for session %s: session changed", session_id)
+                    return None
+                await session_cache.note_write(session_id)
+                return structured_intent
+        except asyncio.CancelledError:
+            raise
+        except UpstreamBusy:
+            logger.info("Skipped speculative intent for session %s: upstream queue full", session_id)
+            return None
+        except Exception:
+            logger.exception("Speculative intent extraction failed for session %s", session_id)
+            return None
+
+    async def lookup(self, db: AsyncSession, session, transcript: str, screen_summary: str) -> Optional[dict]:
+        """
+        Intent already extracted (or being extracted) for exactly these inputs, else None.
+        A running task for different inputs means the user edited them; it is cancelled.
+        """
+        if not self.enabled:
+            return None
+        fp = fingerprint(transcript, screen_summary)
+        current = self._tasks.get(session.id)
+        if current is not None:
+            if current[0] != fp:
+                self.cancel(session.id)
+            else:
+                task = current[1]
+                try:
+                    structured_intent = await asyncio.shield(task)
+                except asyncio.CancelledError:
+                    if not task.cancelled():
+                        raise
+                    structured_intent = None
+                if structured_intent:
+                    metrics.cache_hit("speculative_intent")
+                    return structured_intent
+        if session.structured_intent_fingerprint == fp and session.structured_intent_hash:
+            structured_intent = await blobstore.get_json(db, session.structured_intent_hash)
+            if structured_intent:
+                metrics.cache_hit("speculative_intent")
+                return structured_intent
+        metrics.cache_miss("speculative_intent")
+        return None
+
+
+speculative_intent = SpeculativeIntent()
@@ -1,21 +1,60 @@
-from google.cloud import speech_v1
-from google.cloud.speech_v1 import types
 import os
 import base64
-from app.config import GOOGLE_PROJECT_ID, init_google_credentials
+from app import metrics, tracing
+from app.config import GOOGLE_PROJECT_ID, SPEECH_API_ENDPOINT, init_google_credentials
+from app.services.scheduler import UpstreamBusy, speech_scheduler
 
+# google.cloud.speech_v1 (and gRPC under it) is imported on first use: it dominates
+# app import time and is only needed once audio arrives.
 class SpeechService:
     def __init__(self):
+        self.project_id = GOOGLE_PROJECT_ID
+        self._client = None
+        self._client_pid = None
+
+    @property
+    def client(self):
+        # Built on first use in each process: gRPC channels must not be shared across a fork.
+        if self._client is None or self._client_pid != os.getpid():
+            self._client = self._build_client()
+            self._client_pid = os.getpid()
+        return self._client
+
+    def close(self) -> None:
+        """Close this process's client channel, if one was built."""
+        if self._client is not None and self._client_pid == os.getpid():
+            try:
+                self._client.transport.close()
+            except Exception:
+                pass
+        self._client = None
+
+    def warm_up(self) -> None:
+        """Import the SDK and build this process's client ahead of the first request."""
+        self.client
+
+    def _build_client(self):
+        from google.cloud import speech_v1
+
+        if SPEECH_API_ENDPOINT:
+            # Local stand-in (bench/mock_upstream.py): plain HTTP REST transport, no credentials.
+            from google.auth.credentials import AnonymousCredentials
+            return speech_v1.SpeechClient(
+                credentials=AnonymousCredentials(),
+                transport="rest",
+                client_options={"api_endpoint": SPEECH_API_ENDPOINT},
+            )
         # Ensure credentials are initialized
         init_google_credentials()
-        self.client = speech_v1.SpeechClient()
-        self.project_id = GOOGLE_PROJECT_ID
+        return speech_v1.SpeechClient()
     
     async def transcribe_audio(self, audio_data: bytes, language_code: str = "en-US") -> str:
         """
         Convert audio bytes to transcript using Google Speech-to-Text API
         """
         try:
+            from google.cloud.speech_v1 import types
+
             audio = types.RecognitionAudio(content=audio_data)
             config = types.RecognitionConfig(
                 encoding=types.RecognitionConfig.AudioEncoding.WEBM_OPUS,
@@ -24,13 +63,21 @@ class SpeechService:
                 enable_automatic_punctuation=True,
             )
             
-            response = self.client.recognize(config=config, audio=audio)
+            metrics.record_upload("audio", len(audio_data))
+            async with speech_scheduler.slot("interactive"):
+                with tracing.span("speech", audio_bytes=len(audio_data)), metrics.track_upstream("speech"):
+                    # recognize() is a blocking RPC; keep it off the event loop.
+                    response = await tracing.to_thread(
+                        "speech", lambda: self.client.recognize(config=config, audio=audio)
+                    )
             
             transcript = ""
             for result in response.results:
                 transcript += result.alternatives[0].transcript + " "
             
             return transcript.strip()
+        except UpstreamBusy:
+            raise
         except Exception as e:
             raise Exception(f"Speech-to-Text error: {str(e)}")
     
@@ -41,5 +88,7 @@ class SpeechService:
         try:
             audio_bytes = base64.b64decode(audio_base64)
             return await self.transcribe_audio(audio_bytes)
+        except UpstreamBusy:
+            raise
         except Exception as e:
             raise Exception(f"Speech-to-Text error: {str(e)}")
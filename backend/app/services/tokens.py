@@ -0,0 +1,8 @@
+"""Cheap token estimates for budgeting (no tokenizer round-trip)."""
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English prose; good enough for budgets and thresholds.
+    return len(text) // CHARS_PER_TOKEN
@@ -0,0 +1,142 @@
+"""
+Token-budget-aware transcript compaction.
+
+Sessions keep a rolling summary of older transcript text (sessions.transcript_summary)
+plus the character offset it covers (sessions.transcript_summarized_chars). When the
+unsummarized tail grows past the trigger, the oldest part of the tail is folded into
+the summary with one small Gemini call; earlier segments are never re-summarized.
+Intent extraction then sees summary + recent tail instead of the whole transcript.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import (
+    TRANSCRIPT_COMPACT_TRIGGER_TOKENS,
+    TRANSCRIPT_SUMMARY_TOKENS,
+    TRANSCRIPT_TAIL_TOKENS,
+)
+from app.database import AsyncSessionLocal
+from app.models import Session as SessionModel
+from app.services.drain import drainer
+from app.services.gemini_rest import generate_text
+from app.services.tokens import CHARS_PER_TOKEN, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_INSTRUCTION = f"""You maintain a running summary of a user's spoken request to an AI assistant.
+You are given the current summary (possibly empty) and the next segment of the transcript.
+Return an updated summary that folds the new segment in.
+
+Keep: goals, requirements, constraints, tools and technologies, error messages, decisions and corrections (later statements override earlier ones).
+Drop: filler, repetition, greetings.
+Write in the first person as the user, plain prose, at most {TRANSCRIPT_SUMMARY_TOKENS * 3 // 4} words.
+Return ONLY the updated summary text."""
+
+
+def _segment_end(transcript: str, start: int) -> int:
+    """
+    Offset up to which the transcript should be summarized so that roughly
+    TRANSCRIPT_TAIL_TOKENS of recent text remain verbatim. Snaps to a word boundary.
+    """
+    cut = len(transcript) - TRANSCRIPT_TAIL_TOKENS * CHARS_PER_TOKEN
+    if cut <= start:
+        return start
+    space = transcript.find(" ", cut)
+    return space if space != -1 else cut
+
+
+def build_context(summary: Optional[str], tail: str) -> str:
+    if not summary:
+        return tail
+    return f"[Summary of earlier transcript]\n{summary}\n\n[Most recent transcript]\n{tail}"
+
+
+class TranscriptCompactor:
+    def __init__(self) -> None:
+        self._tasks: dict[UUID, asyncio.Task] = {}
+
+    def needs_compaction(self, transcript: str, summarized_chars: int) -> bool:
+        return estimate_tokens(transcript[summarized_chars:]) > TRANSCRIPT_COMPACT_TRIGGER_TOKENS
+
+    async def fold(self, summary: Optional[str], segment: str, slo: str = "interactive") -> str:
+        prompt = f"""Current summary:
+{summary or "(none)"}
+
+New transcript segment:
+{segment}"""
+        return (await generate_text(
+            prompt, system_instruction=SUMMARY_INSTRUCTION, operation="summary", slo=slo
+        )).strip()
+
+    async def compact(self, db: AsyncSession, session, slo: str = "interactive") -> tuple[Optional[str], int]:
+        """
+        Fold the oldest unsummarized text into the session's summary if the tail is
+        over budget. Writes in the caller's transaction and returns (summary, offset).
+        """
+        transcript = session.transcript or ""
+        summary = session.transcript_summary
+        offset = session.transcript_summarized_chars or 0
+        if not self.needs_compaction(transcript, offset):
+            return summary, offset
+        end = _segment_end(transcript, offset)
+        if end <= offset:
+            return summary, offset
+        new_summary = await self.fold(summary, transcript[offset:end].strip(), slo)
+        # Guard on the old offset so two concurrent compactions cannot both apply.
+        result = await db.execute(
+            update(SessionModel)
+            .where(SessionModel.id == session.id, SessionModel.transcript_summarized_chars == offset)
+            .values(transcript_summary=new_summary, transcript_summarized_chars=end)
+        )
+        if result.rowcount == 0:
+            return summary, offset
+        logger.info("Compacted transcript for session %s: %d -> %d chars summarized", session.id, offset, end)
+        return new_summary, end
+
+    async def prepare(self, db: AsyncSession, session, transcript: str) -> str:
+        """
+        Transcript text to send for intent extraction. If transcript still starts with
+        the summarized prefix of the stored transcript, use summary + tail; otherwise
+        (e.g. the user rewrote it) send it whole.
+        """
+        summary, offset = session.transcript_summary, session.transcript_summarized_chars or 0
+        if (session.transcript or "") == transcript:
+            try:
+                summary, offset = await self.compact(db, session)
+            except Exception:
+                # A failed fold only costs tokens; carry on with the existing summary.
+                logger.exception("Transcript compaction failed for session %s", session.id)
+        stored = session.transcript or ""
+        if not summary or not offset or not transcript.startswith(stored[:offset]):
+            return transcript
+        return build_context(summary, transcript[offset:].strip())
+
+    async def _compact_in_background(self, session_id: UUID) -> None:
+        try:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(select(SessionModel).where(SessionModel.id == session_id))
+                session = result.scalar_one_or_none()
+                if session is None:
+                    return
+                await self.compact(db, session, slo="batch")
+                await db.commit()
+        except Exception:
+            logger.exception("Background transcript compaction failed for session %s", session_id)
+        finally:
+            self._tasks.pop(session_id, None)
+
+    def schedule(self, session_id: UUID, transcript: str, summarized_chars: int) -> None:
+        """Compact in the background after new audio arrives, at most one task per session."""
+        if session_id in self._tasks or not self.needs_compaction(transcript, summarized_chars):
+            return
+        self._tasks[session_id] = drainer.track(asyncio.create_task(self._compact_in_background(session_id)))
+
+
+transcript_compactor = TranscriptCompactor()
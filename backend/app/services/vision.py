@@ -1,87 +1,34 @@
-import asyncio
 import base64
-import json
+import hashlib
 import os
+import time
 import urllib.error
-import urllib.request
-
+from typing import Optional
+
+from app import metrics, tracing
+from app.services.context_cache import ContextCache
+from app.services import gemini_rest, model_routing
+from app.services.gemini_rest import is_cache_error
+from app.services.keyframes import Frame
+from app.services.model_routing import ModelChoice
+from app.services.regions import Region, router as regions
+from app.services.scheduler import UpstreamBusy, gemini_scheduler
+from app.services.tokens import estimate_tokens
+from app.services.singleflight import SingleFlight
 from app.config import (
     GOOGLE_API_KEY,
-    GOOGLE_LOCATION,
-    GOOGLE_PROJECT_ID,
     VERTEX_AI_API_KEY,
 )
 
 # Use REST + API key. gemini-2.5-flash-lite works (SDK models 1.5-pro/1.5-flash 404).
-MODEL = "gemini-2.5-flash-lite"
-
-
-def _vision_rest(prompt: str, image_b64: str, api_key: str) -> str:
-    project = os.getenv("GOOGLE_PROJECT_ID", GOOGLE_PROJECT_ID)
-    region = os.getenv("GOOGLE_LOCATION", GOOGLE_LOCATION)
-    base_url = (
-        f"https://{region}-aiplatform.googleapis.com/v1/projects/{project}"
-        f"/locations/{region}/publishers/google/models"
-    )
-    url = f"{base_url}/{MODEL}:generateContent?key={api_key}"
-
-    payload = {
-        "contents": [
-            {
-                "role": "user",
-                "parts": [
-                    {"text": prompt},
-                    {"inlineData": {"mimeType": "image/png", "data": image_b64}},
-                ],
-            }
-        ]
-    }
-    body = json.dumps(payload).encode("utf-8")
-    req = urllib.request.Request(
-        url,
-        data=body,
-        headers={"Content-Type": "application/json"},
-        method="POST",
-    )
-
-    with urllib.request.urlopen(req, timeout=60) as r:
-        raw = r.read().decode("utf-8")
-
-    data = json.loads(raw)
-    text_parts = []
-    for c in data.get("candidates", []):
-        for p in c.get("content", {}).get("parts", []):
-            if "text" in p:
-                text_parts.append(p["text"])
-    result = "".join(text_parts).strip()
-    if not result:
-        raise Exception("Empty or invalid response from vision model")
-    return result
+# Default model (context caches are built for it); model_routing may pick another.
+MODEL = gemini_rest.MODEL
 
+_vision_flight = SingleFlight("vision")
 
-class VisionService:
-    def __init__(self):
-        self._api_key = os.getenv("VERTEX_AI_API_KEY") or os.getenv("GOOGLE_API_KEY") or VERTEX_AI_API_KEY or GOOGLE_API_KEY
-
-    async def analyze_screenshot(self, screenshot_data: str) -> str:
-        """Analyze screenshot (base64) using Gemini Vision REST."""
-        try:
-            image_bytes = base64.b64decode(screenshot_data)
-            return await self.analyze_screenshot_bytes(image_bytes)
-        except Exception as e:
-            raise Exception(f"Vision analysis error: {str(e)}")
-
-    async def analyze_screenshot_bytes(self, screenshot_bytes: bytes) -> str:
-        """
-        Analyze screenshot bytes using Gemini Vision via REST.
-        Uses gemini-2.5-flash-lite + API key (Vertex SDK models 404 for this project).
-        """
-        if not self._api_key:
-            raise Exception(
-                "Vision requires VERTEX_AI_API_KEY or GOOGLE_API_KEY in environment"
-            )
-
-        prompt = """You are Intentify's screen analyst. Intentify diagnoses why the user is failing, not what the project offers.
+# Static analyst instructions, sent as systemInstruction (or via a cachedContent
+# handle) so each screenshot request only carries the image.
+VISION_INSTRUCTION = """You are Intentify's screen analyst. Intentify diagnoses why the user is failing, not what the project offers.
 
 CORE RULE (non-negotiable):
 If the screen contains a documented hard constraint that can block the user entirely (whitelists, OAuth restrictions, disclaimers, "not allowed", "supported clients only"), surface it FIRST and center the analysis around it. Be willing to say: "Stop debugging. This isn't fixable yet." when that is true.
@@ -128,14 +75,134 @@ Only if it clarifies runnability or constraints.
 
 QUALITY BAR: If the output explains what the project offers instead of why the user is failing, it is wrong. If the user walks away knowing "I'm not doing anything wrong; I either need approval or a supported client," it is correct. Be assertive."""
 
-        image_b64 = base64.b64encode(screenshot_bytes).decode("ascii")
+_vision_cache = ContextCache("vision", VISION_INSTRUCTION)
+
+
+def _image_parts(images: list[tuple[str, str]]) -> list[dict]:
+    """User-turn parts for (mime type, base64) images: one screenshot, or ordered frames."""
+    if len(images) == 1:
+        mime_type, data = images[0]
+        return [{"text": "Analyze this screenshot."}, {"inlineData": {"mimeType": mime_type, "data": data}}]
+    parts = [{
+        "text": f"Analyze these {len(images)} screenshots, taken in order during one screen recording. "
+        "Base the analysis on the final state and call out anything that appeared or changed "
+        "between frames (for example an error)."
+    }]
+    for i, (mime_type, data) in enumerate(images, start=1):
+        parts.append({"text": f"Frame {i} of {len(images)}:"})
+        parts.append({"inlineData": {"mimeType": mime_type, "data": data}})
+    return parts
+
+
+def _vision_rest(
+    region: Region,
+    timeout: float,
+    images: list[tuple[str, str]],
+    api_key: str,
+    cached_content: Optional[str] = None,
+    choice: ModelChoice = ModelChoice(model=gemini_rest.MODEL, tier="default"),
+) -> str:
+    payload = {
+        "contents": [
+            {
+                "role": "user",
+                "parts": _image_parts(images),
+            }
+        ]
+    }
+    cached_content = gemini_rest.usable_cache(cached_content, region, choice)
+    if cached_content:
+        payload["cachedContent"] = cached_content
+    else:
+        payload["systemInstruction"] = {"parts": [{"text": VISION_INSTRUCTION}]}
+    generation_config = choice.generation_config()
+    if generation_config:
+        payload["generationConfig"] = generation_config
+    data = gemini_rest.post_generate(
+        gemini_rest.model_url("generateContent", api_key, region, choice.model), payload, timeout, "vision"
+    )
+    metrics.record_usage(
+        "vision", data.get("usageMetadata"), mode="cached" if cached_content else "inline"
+    )
+    result = gemini_rest.response_text(data)
+    if not result:
+        raise Exception("Empty or invalid response from vision model")
+    return result
+
 
+class VisionService:
+    def __init__(self):
+        self._api_key = os.getenv("VERTEX_AI_API_KEY") or os.getenv("GOOGLE_API_KEY") or VERTEX_AI_API_KEY or GOOGLE_API_KEY
+
+    async def analyze_screenshot(self, screenshot_data: str) -> str:
+        """Analyze screenshot (base64) using Gemini Vision REST."""
         try:
-            return await asyncio.to_thread(
-                _vision_rest, prompt, image_b64, self._api_key
+            image_bytes = base64.b64decode(screenshot_data)
+            return await self.analyze_screenshot_bytes(image_bytes)
+        except UpstreamBusy:
+            raise
+        except Exception as e:
+            raise Exception(f"Vision analysis error: {str(e)}")
+
+    async def analyze_screenshot_bytes(self, screenshot_bytes: bytes) -> str:
+        """
+        Analyze screenshot bytes using Gemini Vision via REST.
+        Uses Gemini REST + API key (Vertex SDK models 404 for this project); the
+        model is chosen by services/model_routing.py.
+        """
+        return await self.analyze_frames([Frame(screenshot_bytes, "image/png")])
+
+    async def analyze_frames(self, frames: list[Frame]) -> str:
+        """
+        Analyze one or more screen frames (in capture order) in a single vision call.
+        Concurrent calls for the same frames share one upstream request.
+        """
+        digest = hashlib.sha256()
+        for frame in frames:
+            digest.update(hashlib.sha256(frame.data).digest())
+        return await _vision_flight.do(digest.hexdigest(), lambda: self._analyze_frames(frames))
+
+    async def _analyze_frames(self, frames: list[Frame]) -> str:
+        if not self._api_key:
+            raise Exception(
+                "Vision requires VERTEX_AI_API_KEY or GOOGLE_API_KEY in environment"
             )
+
+        images = [(frame.mime_type, base64.b64encode(frame.data).decode("ascii")) for frame in frames]
+        total_bytes = 0
+        input_tokens = estimate_tokens(VISION_INSTRUCTION)
+        for frame in frames:
+            metrics.record_upload("screen", len(frame.data))
+            total_bytes += len(frame.data)
+            input_tokens += model_routing.estimate_image_tokens(len(frame.data))
+        choice = model_routing.choose("vision", input_tokens)
+        start = time.perf_counter()
+        ok = False
+        try:
+            async with gemini_scheduler.slot("interactive", cost=input_tokens / 1000):
+                result = await self._call_vision(images, total_bytes, choice, use_cache=True)
+            ok = True
+            return result
+        finally:
+            model_routing.log_decision("vision", "interactive", input_tokens, choice, time.perf_counter() - start, ok)
+
+    async def _call_vision(self, images: list[tuple[str, str]], image_bytes: int, choice: ModelChoice, use_cache: bool) -> str:
+        use_cache = use_cache and choice.model == MODEL
+        handle = await _vision_cache.handle(self._api_key) if use_cache else None
+        try:
+            with tracing.span("vision", model=choice.model, tier=choice.tier, frames=len(images), image_bytes=image_bytes, cached=bool(handle)), metrics.track_upstream("vision"):
+                return await regions.call(
+                    "vision",
+                    lambda region, timeout: _vision_rest(region, timeout, images, self._api_key, handle, choice),
+                    deadline=60,
+                )
         except urllib.error.HTTPError as e:
             raw = e.read().decode("utf-8")
+            if handle and is_cache_error(e.code, raw):
+                _vision_cache.invalidate()
+                return await self._call_vision(images, image_bytes, choice, use_cache=False)
             raise Exception(f"Vision analysis error: HTTP {e.code} {raw}")
+        except UpstreamBusy:
+            raise
         except Exception as e:
             raise Exception(f"Vision analysis error: {str(e)}")
@@ -0,0 +1,204 @@
+"""
+Lightweight request tracing.
+Each HTTP request gets a root span; DB calls and upstream (Gemini, Vision, Speech)
+calls open child spans. Finished traces feed the Server-Timing header, any
+registered listeners (tests), and optionally an OpenTelemetry OTLP exporter.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional
+
+from app.config import OTEL_EXPORTER_OTLP_ENDPOINT, OTEL_SERVICE_NAME, TRACING_ENABLED
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    __slots__ = ("name", "start", "end", "attributes", "children", "wall_start_ns")
+
+    def __init__(self, name: str, start: float, attributes: Optional[dict] = None) -> None:
+        self.name = name
+        self.start = start
+        self.end: Optional[float] = None
+        self.attributes = attributes or {}
+        self.children: list[Span] = []
+        self.wall_start_ns = 0
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000.0
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": dict(self.attributes),
+            "children": [c.to_dict() for c in self.children],
+        }
+
+    def walk(self) -> Iterator["Span"]:
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("intentify_span", default=None)
+_listeners: list[Callable[[Span], None]] = []
+
+
+def add_listener(fn: Callable[[Span], None]) -> None:
+    """Register a callback receiving every finished root span (e.g. from tests)."""
+    _listeners.append(fn)
+
+
+def remove_listener(fn: Callable[[Span], None]) -> None:
+    if fn in _listeners:
+        _listeners.remove(fn)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+@contextmanager
+def start_trace(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Open a root span for the current context; finished traces go to listeners/exporter."""
+    if not TRACING_ENABLED:
+        yield None
+        return
+    root = Span(name, time.perf_counter(), attributes)
+    root.wall_start_ns = time.time_ns()
+    token = _current.set(root)
+    try:
+        yield root
+    finally:
+        root.end = time.perf_counter()
+        _current.reset(token)
+        _finish(root)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    Open a child span under the current one. Outside a trace this is a no-op,
+    so services can be instrumented unconditionally.
+    """
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(name, time.perf_counter(), attributes)
+    parent.children.append(child)
+    token = _current.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.attributes["error"] = type(e).__name__
+        raise
+    finally:
+        child.end = time.perf_counter()
+        _current.reset(token)
+
+
+def add_span(name: str, start: float, end: float, **attributes: Any) -> None:
+    """Record an already-measured interval (perf_counter timestamps) under the current span."""
+    parent = _current.get()
+    if parent is None:
+        return
+    child = Span(name, start, attributes)
+    child.end = end
+    parent.children.append(child)
+
+
+async def to_thread(name: str, func: Callable, *args: Any) -> Any:
+    """
+    asyncio.to_thread that records how long the call waited for a worker thread
+    as "<name>.queue". The copied context keeps spans opened in func attached.
+    """
+    queued = time.perf_counter()
+
+    def run():
+        add_span(f"{name}.queue", queued, time.perf_counter())
+        return func(*args)
+
+    return await asyncio.to_thread(run)
+
+
+def server_timing(root: Span) -> str:
+    """Server-Timing header value: total plus summed duration per span name."""
+    totals: dict[str, float] = {}
+    for s in root.walk():
+        if s is root:
+            continue
+        totals[s.name] = totals.get(s.name, 0.0) + s.duration_ms
+    parts = [f"{name};dur={dur:.1f}" for name, dur in totals.items()]
+    parts.append(f"total;dur={root.duration_ms:.1f}")
+    return ", ".join(parts)
+
+
+def _finish(root: Span) -> None:
+    for fn in list(_listeners):
+        try:
+            fn(root)
+        except Exception:
+            logger.exception("Trace listener failed")
+    if OTEL_EXPORTER_OTLP_ENDPOINT:
+        _export_otel(root)
+
+
+_otel_tracer = None
+_otel_failed = False
+
+
+def _get_otel_tracer():
+    global _otel_tracer, _otel_failed
+    if _otel_tracer is not None or _otel_failed:
+        return _otel_tracer
+    try:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError:
+        logger.warning("OTEL_EXPORTER_OTLP_ENDPOINT is set but opentelemetry-sdk is not installed")
+        _otel_failed = True
+        return None
+    provider = TracerProvider(resource=Resource.create({"service.name": OTEL_SERVICE_NAME}))
+    provider.add_span_processor(
+        BatchSpanProcessor(OTLPSpanExporter(endpoint=f"{OTEL_EXPORTER_OTLP_ENDPOINT.rstrip('/')}/v1/traces"))
+    )
+    _otel_tracer = provider.get_tracer("intentify")
+    return _otel_tracer
+
+
+def _export_otel(root: Span) -> None:
+    tracer = _get_otel_tracer()
+    if tracer is None:
+        return
+    from opentelemetry import trace as otel_trace
+
+    def to_ns(t: float) -> int:
+        return root.wall_start_ns + int((t - root.start) * 1e9)
+
+    def emit(s: Span, parent_ctx) -> None:
+        otel_span = tracer.start_span(
+            s.name,
+            context=parent_ctx,
+            start_time=to_ns(s.start),
+            attributes={k: str(v) for k, v in s.attributes.items()},
+        )
+        ctx = otel_trace.set_span_in_context(otel_span)
+        for child in s.children:
+            emit(child, ctx)
+        otel_span.end(end_time=to_ns(s.end if s.end is not None else s.start))
+
+    try:
+        emit(root, None)
+    except Exception:
+        logger.exception("OpenTelemetry export failed")
@@ -0,0 +1,91 @@
+"""
+Offline re-processing of stored sessions through batch prediction (app/services/batch.py).
+
+    python batch.py run --stage intent          # export, submit, wait, ingest
+    python batch.py run --stage prompt
+    python batch.py export --stage intent [--limit N] [--force]
+    python batch.py submit JOB_ID
+    python batch.py refresh [JOB_ID]            # poll; ingest finished jobs
+    python batch.py status
+
+Run the intent stage before the prompt stage when the intent instruction changed:
+prompts are only current when generated from the current intent.
+"""
+import argparse
+import asyncio
+import logging
+from uuid import UUID
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+
+def _describe(job) -> str:
+    return (
+        f"{job.id}  {job.stage:<6}  {job.backend:<6}  {job.status:<9}  "
+        f"requests={job.request_count} ingested={job.ingested_count} "
+        f"skipped={job.skipped_count} failed={job.failed_count}"
+        + (f"  error={job.error}" if job.error else "")
+    )
+
+
+async def _main(args: argparse.Namespace) -> None:
+    from sqlalchemy import select
+
+    from app.database import AsyncSessionLocal, dispose_engines, init_db
+    from app.models import BatchJob
+    from app.services import batch
+
+    await init_db()
+    try:
+        if args.command == "export":
+            print(_describe(await batch.export(args.stage, args.limit, args.force)))
+        elif args.command == "submit":
+            print(_describe(await batch.submit(args.job_id)))
+        elif args.command == "refresh":
+            if args.job_id:
+                print(_describe(await batch.refresh(args.job_id)))
+            else:
+                await batch.refresh_all()
+        elif args.command == "status":
+            async with AsyncSessionLocal() as db:
+                jobs = (await db.execute(
+                    select(BatchJob).order_by(BatchJob.created_at.desc()).limit(args.limit or 20)
+                )).scalars().all()
+            for job in jobs:
+                print(_describe(job))
+        elif args.command == "run":
+            job = await batch.export(args.stage, args.limit, args.force)
+            job = await batch.submit(job.id)
+            while job.status in ("submitted", "succeeded", "ingesting"):
+                await asyncio.sleep(args.poll_seconds)
+                job = await batch.refresh(job.id)
+            print(_describe(job))
+    finally:
+        await dispose_engines()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name in ("export", "run"):
+        p = sub.add_parser(name)
+        p.add_argument("--stage", choices=("intent", "prompt"), required=True)
+        p.add_argument("--limit", type=int, default=None, help="Export at most N sessions")
+        p.add_argument("--force", action="store_true", help="Export even if a job for the stage is active")
+        if name == "run":
+            p.add_argument("--poll-seconds", type=float, default=30.0)
+    sub.add_parser("submit").add_argument("job_id", type=UUID)
+    sub.add_parser("refresh").add_argument("job_id", type=UUID, nargs="?")
+    sub.add_parser("status").add_argument("--limit", type=int, default=20)
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Compare two benchmark result files and flag regressions.
+
+    python -m bench.compare bench/results/BASE.json bench/results/NEW.json --threshold 0.10
+
+Exits 1 if any scenario's p95/p99 latency grew, or throughput dropped, by more
+than the threshold (relative).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# metric -> True if higher is better
+METRICS = {
+    "throughput_rps": True,
+    "p50_ms": False,
+    "p95_ms": False,
+    "p99_ms": False,
+    "error_rate": False,
+}
+GATED = ("throughput_rps", "p95_ms", "p99_ms")
+
+
+def compare(base: dict, new: dict, threshold: float) -> tuple[list[str], bool]:
+    lines = []
+    regressed = False
+    for name, new_stats in new["scenarios"].items():
+        base_stats = base["scenarios"].get(name)
+        if base_stats is None:
+            lines.append(f"{name}: no baseline")
+            continue
+        lines.append(f"{name}:")
+        for metric, higher_better in METRICS.items():
+            b, n = base_stats.get(metric), new_stats.get(metric)
+            if b is None or n is None:
+                continue
+            change = (n - b) / b if b else 0.0
+            worse = change < -threshold if higher_better else change > threshold
+            flag = ""
+            if worse and metric in GATED:
+                regressed = True
+                flag = "  REGRESSION"
+            lines.append(f"  {metric:>15}: {b:>10} -> {n:>10} ({change:+.1%}){flag}")
+    return lines, regressed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args()
+    base = json.loads(Path(args.base).read_text())
+    new = json.loads(Path(args.new).read_text())
+    print(f"base {base.get('git_sha')} ({base.get('timestamp')}) vs new {new.get('git_sha')} ({new.get('timestamp')})")
+    lines, regressed = compare(base, new, args.threshold)
+    print("\n".join(lines))
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
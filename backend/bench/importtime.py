@@ -0,0 +1,77 @@
+"""
+Import-time budget for the API.
+
+Imports app.main in a fresh interpreter under `-X importtime` and fails (exit 1)
+when the cumulative time exceeds the budget, or when a module that is meant to be
+loaded lazily (Speech/gRPC SDK, numpy) is pulled in at import.
+
+    python -m bench.importtime --budget-ms 1500 --runs 3
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+# Deferred to first use; importing any of these at startup is a regression.
+LAZY_MODULES = ("google.cloud.speech_v1", "grpc", "numpy", "fastembed", "redis", "opentelemetry")
+
+# Cumulative import time of app.main, in milliseconds.
+BUDGET_MS = 1500.0
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure(module: str) -> dict[str, tuple[int, int]]:
+    """module -> (self_us, cumulative_us) for one cold import."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=Path(__file__).parent.parent,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    timings: dict[str, tuple[int, int]] = {}
+    for line in result.stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            timings[m.group(4)] = (int(m.group(1)), int(m.group(2)))
+    return timings
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS, help="Max cumulative import time")
+    parser.add_argument("--runs", type=int, default=3, help="Best of N (first run also warms the OS cache)")
+    parser.add_argument("--top", type=int, default=15, help="Slowest modules to list")
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(args.runs)]
+    best = min(runs, key=lambda t: t.get(args.module, (0, 0))[1])
+    total_ms = best.get(args.module, (0, 0))[1] / 1000.0
+
+    print(f"{'cumulative_ms':>14} {'self_ms':>9}  module")
+    for name, (self_us, cum_us) in sorted(best.items(), key=lambda kv: -kv[1][1])[: args.top]:
+        print(f"{cum_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name}")
+
+    failed = False
+    eager = sorted(name for name in best if name in LAZY_MODULES)
+    if eager:
+        print(f"\nFAIL: lazily loaded modules imported at startup: {', '.join(eager)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"\nFAIL: import {args.module} took {total_ms:.0f} ms (budget {args.budget_ms:.0f} ms)")
+        failed = True
+    if not failed:
+        print(f"\nOK: import {args.module} took {total_ms:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""
+Local stand-in for Vertex generateContent/countTokens and Speech-to-Text recognize.
+
+Point the API at it with:
+    VERTEX_API_ENDPOINT=http://127.0.0.1:8099 SPEECH_API_ENDPOINT=http://127.0.0.1:8099
+
+Run standalone:
+    python -m bench.mock_upstream --port 8099 --latency lognormal:250,0.4 --error-rate 0.01
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+INTENT_JSON = {
+    "goal": "Fix a CORS error in a FastAPI backend",
+    "current_state": "Browser blocks requests from localhost:3000 to the API",
+    "constraints": ["must keep credentials enabled"],
+    "tools": ["FastAPI", "Next.js"],
+    "skill_level": "intermediate",
+    "desired_output": "Working CORS configuration",
+}
+PROMPTS_JSON = {
+    "short_prompt": "Fix CORS between my Next.js frontend and FastAPI backend.",
+    "detailed_prompt": "I am running a Next.js frontend on localhost:3000 ... " * 10,
+    "expert_prompt": "Given a FastAPI app behind CORSMiddleware with credentials ... " * 15,
+}
+SCREEN_SUMMARY = "### Feasibility Verdict\nPossible\n\n### Blocker / Verdict\nNo single blocker identified.\n" * 20
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """
+    Latency spec in milliseconds -> sampler returning seconds.
+    fixed:MS | uniform:LO,HI | normal:MEAN,STDDEV | lognormal:MEDIAN,SIGMA
+    """
+    kind, _, args = spec.partition(":")
+    vals = [float(v) for v in args.split(",") if v]
+    if kind == "fixed":
+        return lambda: vals[0] / 1000.0
+    if kind == "uniform":
+        return lambda: random.uniform(vals[0], vals[1]) / 1000.0
+    if kind == "normal":
+        return lambda: max(0.0, random.gauss(vals[0], vals[1])) / 1000.0
+    if kind == "lognormal":
+        mu = math.log(vals[0])
+        return lambda: random.lognormvariate(mu, vals[1]) / 1000.0
+    raise ValueError(f"Unknown latency spec: {spec}")
+
+
+def _reply_text(request_body: dict) -> str:
+    text = ""
+    for content in request_body.get("contents", []):
+        for part in content.get("parts", []):
+            if "inlineData" in part:
+                return SCREEN_SUMMARY
+            text += part.get("text", "")
+    if "three prompts" in text or "short_prompt" in text:
+        return json.dumps(PROMPTS_JSON)
+    return json.dumps(INTENT_JSON)
+
+
+class MockUpstream:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8099,
+        latency: str = "lognormal:250,0.4",
+        speech_latency: Optional[str] = None,
+        error_rate: float = 0.0,
+    ) -> None:
+        self.sample_latency = parse_latency(latency)
+        self.sample_speech_latency = parse_latency(speech_latency or latency)
+        self.error_rate = error_rate
+        self.calls: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _count(self, op: str) -> None:
+        with self._lock:
+            self.calls[op] = self.calls.get(op, 0) + 1
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, payload: dict) -> None:
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_PATCH(self):
+                # cachedContents TTL extension
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    self.rfile.read(length)
+                mock._count("cachedContents.patch")
+                return self._send(200, {})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b"{}"
+                try:
+                    req = json.loads(raw or b"{}")
+                except json.JSONDecodeError:
+                    req = {}
+                path = self.path.split("?", 1)[0]
+
+                if path.endswith("/cachedContents"):
+                    mock._count("cachedContents.create")
+                    n = mock.calls["cachedContents.create"]
+                    return self._send(200, {"name": f"{path.split('/v1/', 1)[-1]}/{n}"})
+
+                if path.endswith(":countTokens"):
+                    mock._count("countTokens")
+                    return self._send(200, {"totalTokens": 1})
+
+                if path.endswith(":generateContent"):
+                    op = "generateContent"
+                    time.sleep(mock.sample_latency())
+                elif path.endswith("speech:recognize"):
+                    op = "recognize"
+                    time.sleep(mock.sample_speech_latency())
+                else:
+                    return self._send(404, {"error": {"code": 404, "message": f"No mock for {path}"}})
+
+                mock._count(op)
+                if mock.error_rate and random.random() < mock.error_rate:
+                    mock._count(f"{op}_error")
+                    code = random.choice((429, 500, 503))
+                    return self._send(code, {"error": {"code": code, "message": "injected failure"}})
+
+                if op == "recognize":
+                    return self._send(200, {"results": [{"alternatives": [{"transcript": "fix this cors error in fastapi"}]}]})
+
+                text = _reply_text(req)
+                cached_tokens = 1100 if req.get("cachedContent") else 0
+                return self._send(200, {
+                    "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}],
+                    "usageMetadata": {
+                        "promptTokenCount": len(raw) // 4 + cached_tokens,
+                        "cachedContentTokenCount": cached_tokens,
+                        "candidatesTokenCount": len(text) // 4,
+                        "totalTokenCount": (len(raw) + len(text)) // 4 + cached_tokens,
+                    },
+                })
+
+        return Handler
+
+    def start(self) -> "MockUpstream":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", default="lognormal:250,0.4", help="Gemini latency spec (ms)")
+    parser.add_argument("--speech-latency", default=None, help="Speech latency spec (ms); defaults to --latency")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    mock = MockUpstream(args.host, args.port, args.latency, args.speech_latency, args.error_rate)
+    print(f"Mock upstream listening on {mock.url}")
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""
+Offline load test for the Intentify API.
+
+Starts the local upstream stand-in, boots the API against it (unless --target
+is given), drives the scenarios and writes a JSON report for later comparison
+with bench/compare.py. Requires a reachable Postgres (DATABASE_URL) and the
+packages in bench/requirements.txt.
+
+    python -m bench.run --scenario all --concurrency 16 --duration 30
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+import httpx
+
+from bench.mock_upstream import MockUpstream
+from bench.scenarios import SCENARIOS
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def _percentile(sorted_values: list[float], pct: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    k = min(len(sorted_values) - 1, max(0, round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict:
+    ordered = sorted(latencies)
+    ms = lambda v: round(v * 1000, 2) if v is not None else None  # noqa: E731
+    total = len(latencies) + errors
+    return {
+        "requests": total,
+        "errors": errors,
+        "error_rate": round(errors / total, 4) if total else 0.0,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": ms(_percentile(ordered, 50)),
+        "p95_ms": ms(_percentile(ordered, 95)),
+        "p99_ms": ms(_percentile(ordered, 99)),
+        "max_ms": ms(ordered[-1] if ordered else None),
+    }
+
+
+class ProcessSampler:
+    """Samples CPU and RSS of the API process (needs psutil; skipped otherwise)."""
+
+    def __init__(self, pid: Optional[int]) -> None:
+        self.samples: list[tuple[float, float]] = []
+        self._proc = None
+        if pid is None:
+            return
+        try:
+            import psutil
+        except ImportError:
+            return
+        self._proc = psutil.Process(pid)
+
+    def _all(self):
+        try:
+            return [self._proc] + self._proc.children(recursive=True)
+        except Exception:
+            return [self._proc]
+
+    async def run(self, stop: asyncio.Event) -> None:
+        if self._proc is None:
+            return
+        for p in self._all():
+            p.cpu_percent(None)
+        while not stop.is_set():
+            await asyncio.sleep(0.5)
+            cpu = rss = 0.0
+            for p in self._all():
+                try:
+                    cpu += p.cpu_percent(None)
+                    rss += p.memory_info().rss
+                except Exception:
+                    pass
+            self.samples.append((cpu, rss / (1024 * 1024)))
+
+    def report(self) -> Optional[dict]:
+        if not self.samples:
+            return None
+        cpus = [c for c, _ in self.samples]
+        rss = [r for _, r in self.samples]
+        return {
+            "cpu_percent_avg": round(sum(cpus) / len(cpus), 1),
+            "cpu_percent_max": round(max(cpus), 1),
+            "rss_mb_max": round(max(rss), 1),
+        }
+
+
+async def run_scenario(client: httpx.AsyncClient, name: str, concurrency: int, duration: float) -> dict:
+    scenario = SCENARIOS[name]
+    latencies: list[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker() -> None:
+        nonlocal errors
+        state = await scenario.setup(client)
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                await scenario.step(client, state)
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+async def _wait_ready(base_url: str, timeout: float = 60.0) -> None:
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.perf_counter() < deadline:
+            try:
+                if (await client.get("/health/live")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.25)
+    raise RuntimeError(f"API at {base_url} did not become live within {timeout}s")
+
+
+def _start_api(port: int, mock_url: str, extra_env: dict) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "PORT": str(port),
+        "VERTEX_API_ENDPOINT": mock_url,
+        "SPEECH_API_ENDPOINT": mock_url,
+        "VERTEX_AI_API_KEY": os.getenv("VERTEX_AI_API_KEY") or "bench-key",
+        **extra_env,
+    }
+    return subprocess.Popen(
+        [sys.executable, "run.py"],
+        cwd=Path(__file__).parent.parent,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.STDOUT,
+    )
+
+
+def _git_sha() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+
+async def main_async(args: argparse.Namespace) -> dict:
+    region_latency = dict(kv.split("=", 1) for kv in args.region_latency)
+    region_errors = {k: float(v) for k, v in (kv.split("=", 1) for kv in args.region_error_rate)}
+    mock = MockUpstream(
+        port=args.mock_port,
+        latency=region_latency.get(args.regions[0], args.latency),
+        error_rate=region_errors.get(args.regions[0], args.error_rate),
+    ).start()
+    # Extra Vertex regions, one stand-in each on the following ports.
+    region_mocks = {}
+    for i, name in enumerate(args.regions[1:], start=1):
+        region_mocks[name] = MockUpstream(
+            port=args.mock_port + i,
+            latency=region_latency.get(name, args.latency),
+            error_rate=region_errors.get(name, args.error_rate),
+        ).start()
+    api = None
+    base_url = args.target
+    try:
+        if base_url is None:
+            base_url = f"http://127.0.0.1:{args.port}"
+            extra_env = dict(kv.split("=", 1) for kv in args.env)
+            extra_env.setdefault("WEB_CONCURRENCY", str(args.workers))
+            if region_mocks:
+                extra_env.setdefault("GOOGLE_LOCATIONS", ",".join(args.regions))
+                extra_env.setdefault("VERTEX_REGION_ENDPOINTS", ",".join(
+                    [f"{args.regions[0]}={mock.url}"] + [f"{n}={m.url}" for n, m in region_mocks.items()]
+                ))
+            api = _start_api(args.port, mock.url, extra_env)
+        await _wait_ready(base_url)
+
+        names = list(SCENARIOS) if args.scenario == "all" else args.scenario.split(",")
+        results: dict[str, dict] = {}
+        sampler = ProcessSampler(api.pid if api else None)
+        stop = asyncio.Event()
+        sampling = asyncio.create_task(sampler.run(stop))
+        limits = httpx.Limits(max_connections=args.concurrency * 2)
+        async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+            for name in names:
+                results[name] = await run_scenario(client, name, args.concurrency, args.duration)
+                print(f"{name:>14}: {results[name]}")
+        stop.set()
+        await sampling
+
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_sha": _git_sha(),
+            "python": platform.python_version(),
+            "config": {
+                "concurrency": args.concurrency,
+                "workers": args.workers,
+                "duration_s": args.duration,
+                "latency": args.latency,
+                "error_rate": args.error_rate,
+                "env": args.env,
+            },
+            "scenarios": results,
+            "upstream_calls": dict(mock.calls),
+            "region_upstream_calls": {
+                name: dict(m.calls) for name, m in [(args.regions[0], mock), *region_mocks.items()]
+            } if region_mocks else None,
+            "server_resources": sampler.report(),
+            "loadgen_resources": {
+                "cpu_user_s": round(usage.ru_utime, 2),
+                "cpu_system_s": round(usage.ru_stime, 2),
+                "max_rss_mb": round(usage.ru_maxrss / 1024, 1),
+            },
+        }
+    finally:
+        if api is not None:
+            api.terminate()
+            try:
+                api.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                api.kill()
+        mock.stop()
+        for m in region_mocks.values():
+            m.stop()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", default="all", help=f"Comma-separated: {', '.join(SCENARIOS)} (or all)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per scenario")
+    parser.add_argument("--latency", default="lognormal:250,0.4", help="Upstream latency spec (ms)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--regions", type=lambda v: [r for r in v.split(",") if r], default=["us-central1"],
+        help="Vertex regions; each beyond the first gets its own stand-in on --mock-port+i",
+    )
+    parser.add_argument("--region-latency", action="append", default=[], help="REGION=SPEC latency override")
+    parser.add_argument("--region-error-rate", action="append", default=[], help="REGION=RATE error-rate override")
+    parser.add_argument("--workers", type=int, default=1, help="API worker processes (WEB_CONCURRENCY)")
+    parser.add_argument("--port", type=int, default=8013)
+    parser.add_argument("--mock-port", type=int, default=8099)
+    parser.add_argument("--target", default=None, help="Use an already-running API (must be pointed at the mock)")
+    parser.add_argument("--env", action="append", default=[], help="Extra KEY=VALUE for the API process")
+    parser.add_argument("--output", default=None, help="Result file (default: bench/results/<sha>-<time>.json)")
+    return parser
+
+
+def main() -> None:
+    args = build_parser().parse_args()
+
+    report = asyncio.run(main_async(args))
+    out = Path(args.output) if args.output else RESULTS_DIR / (
+        f"{report['git_sha'] or 'nogit'}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2))
+    print(f"Wrote {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Throughput vs. worker count.
+
+Runs the load test once per worker count against the local upstream stand-in and
+prints how throughput and latency scale. Accepts the same options as bench.run.
+
+    python -m bench.scaling --workers-list 1,2,4 --scenario capture,generate --concurrency 32
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from bench.run import RESULTS_DIR, build_parser, main_async
+
+
+def main() -> int:
+    parser = build_parser()
+    parser.description = __doc__
+    parser.add_argument("--workers-list", default="1,2,4", help="Comma-separated worker counts")
+    args = parser.parse_args()
+
+    counts = [int(n) for n in args.workers_list.split(",") if n]
+    runs = {}
+    for workers in counts:
+        args.workers = workers
+        print(f"--- {workers} worker(s) ---")
+        runs[workers] = asyncio.run(main_async(args))
+
+    base = runs[counts[0]]["scenarios"]
+    print(f"\n{'scenario':>14} {'workers':>8} {'rps':>9} {'speedup':>8} {'p50_ms':>9} {'p99_ms':>9}")
+    for name in base:
+        for workers in counts:
+            r = runs[workers]["scenarios"][name]
+            speedup = r["throughput_rps"] / base[name]["throughput_rps"] if base[name]["throughput_rps"] else 0.0
+            print(f"{name:>14} {workers:>8} {r['throughput_rps']:>9} {speedup:>7.2f}x {r['p50_ms']:>9} {r['p99_ms']:>9}")
+
+    out = Path(args.output) if args.output else RESULTS_DIR / f"scaling-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps({str(k): v for k, v in runs.items()}, indent=2))
+    print(f"Wrote {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""
+Benchmark scenarios. Each has an async setup (per worker) and a step that
+performs one measured request; step raises on any non-2xx response.
+"""
+from __future__ import annotations
+
+import os
+import struct
+import zlib
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+import httpx
+
+
+def _png(width: int = 64, height: int = 64) -> bytes:
+    """Small valid PNG so the API does not need real screenshots."""
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    rows = b"".join(b"\x00" + os.urandom(width * 3) for _ in range(height))
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(rows))
+        + chunk(b"IEND", b"")
+    )
+
+
+SCREENSHOT = _png()
+# Content is never decoded: the speech stand-in answers regardless of payload.
+AUDIO = b"\x1aE\xdf\xa3" + os.urandom(16 * 1024)
+
+
+def _check(resp: httpx.Response) -> httpx.Response:
+    resp.raise_for_status()
+    return resp
+
+
+async def _new_session(client: httpx.AsyncClient) -> str:
+    resp = _check(await client.post("/session/start", json={}))
+    return resp.json()["id"]
+
+
+async def _captured_session(client: httpx.AsyncClient) -> str:
+    session_id = await _new_session(client)
+    files = {
+        "audio": ("chunk.webm", AUDIO, "audio/webm"),
+        "screen": ("screen.png", SCREENSHOT, "image/png"),
+    }
+    _check(await client.post(f"/session/{session_id}/capture", files=files))
+    return session_id
+
+
+async def _no_setup(client: httpx.AsyncClient) -> dict:
+    return {}
+
+
+async def _start_step(client: httpx.AsyncClient, state: dict) -> None:
+    await _new_session(client)
+
+
+async def _capture_setup(client: httpx.AsyncClient) -> dict:
+    return {"session_id": await _new_session(client)}
+
+
+async def _capture_step(client: httpx.AsyncClient, state: dict) -> None:
+    files = {
+        "audio": ("chunk.webm", AUDIO, "audio/webm"),
+        "screen": ("screen.png", SCREENSHOT, "image/png"),
+    }
+    _check(await client.post(f"/session/{state['session_id']}/capture", files=files))
+
+
+async def _captured_setup(client: httpx.AsyncClient) -> dict:
+    return {"session_id": await _captured_session(client)}
+
+
+async def _intent_step(client: httpx.AsyncClient, state: dict) -> None:
+    _check(await client.post(f"/prompts/{state['session_id']}/intent", json={}))
+
+
+async def _generate_step(client: httpx.AsyncClient, state: dict) -> None:
+    _check(await client.post(f"/prompts/{state['session_id']}/generate", json={}))
+
+
+async def _get_step(client: httpx.AsyncClient, state: dict) -> None:
+    _check(await client.get(f"/session/{state['session_id']}"))
+
+
+@dataclass(frozen=True)
+class Scenario:
+    setup: Callable[[httpx.AsyncClient], Awaitable[dict]]
+    step: Callable[[httpx.AsyncClient, dict], Awaitable[None]]
+
+
+SCENARIOS: dict[str, Scenario] = {
+    "session_start": Scenario(_no_setup, _start_step),
+    "capture": Scenario(_capture_setup, _capture_step),
+    "intent": Scenario(_captured_setup, _intent_step),
+    "generate": Scenario(_captured_setup, _generate_step),
+    "get_session": Scenario(_captured_setup, _get_step),
+}
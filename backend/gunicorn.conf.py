@@ -0,0 +1,41 @@
+"""
+Gunicorn settings for multi-worker serving; run.py uses this when WEB_CONCURRENCY > 1.
+
+The app is imported once in the master (preload_app) and forked. Nothing imported
+at module level holds a socket or gRPC channel: the Speech client, the shared cache
+backend and DB connections are all created on first use inside each worker.
+"""
+import os
+import tempfile
+
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+worker_class = "uvicorn.workers.UvicornWorker"
+bind = f"0.0.0.0:{os.getenv('PORT', '8003')}"
+preload_app = True
+timeout = 120
+# Lifespan shutdown drains for up to DRAIN_TIMEOUT_SECONDS; leave room to close pools.
+graceful_timeout = int(float(os.getenv("DRAIN_TIMEOUT_SECONDS", "25"))) + 5
+keepalive = 5
+loglevel = "info"
+
+# prometheus_client picks multiprocess mode at import time, so this must be set
+# before the app is preloaded.
+if workers > 1 and not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="intentify-metrics-")
+
+
+def post_fork(server, worker):
+    # Drop any pooled connections inherited from the master without closing them
+    # (they belong to the parent); each worker opens its own.
+    from app.database import engine, read_engine
+
+    engine.sync_engine.dispose(close=False)
+    if read_engine is not engine:
+        read_engine.sync_engine.dispose(close=False)
+
+
+def child_exit(server, worker):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,5 +1,6 @@
 import uvicorn
 import os
+import sys
 import logging
 from dotenv import load_dotenv
 
@@ -14,6 +15,12 @@ logging.basicConfig(
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8003))
     reload = os.getenv("RELOAD", "false").lower() == "true"
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    if workers > 1 and not reload:
+        # Preloaded, forked workers under gunicorn (see gunicorn.conf.py).
+        here = os.path.dirname(os.path.abspath(__file__))
+        os.chdir(here)
+        os.execvp(sys.executable, [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app.main:app"])
     uvicorn.run(
         "app.main:app",
         host="0.0.0.0",
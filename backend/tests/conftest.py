@@ -0,0 +1,74 @@
+"""
+Shared test setup.
+
+Database tests need a disposable Postgres in TEST_DATABASE_URL (its tables are
+dropped and recreated) and are skipped without one. Batch files go to a temporary
+BATCH_DIR and always use the local backend. Gemini and Speech point at the offline
+stand-in (bench/mock_upstream.py); the mock_upstream fixture starts it.
+"""
+import asyncio
+import os
+import socket
+import tempfile
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# Before anything imports app.config.
+MOCK_PORT = _free_port()
+os.environ["VERTEX_API_ENDPOINT"] = os.environ["SPEECH_API_ENDPOINT"] = f"http://127.0.0.1:{MOCK_PORT}"
+os.environ["VERTEX_AI_API_KEY"] = "test-key"
+os.environ["TRACING_ENABLED"] = "true"
+os.environ["BATCH_DIR"] = tempfile.mkdtemp(prefix="intentify-test-batch-")
+os.environ["BATCH_BACKEND"] = "local"
+os.environ["BATCH_POLL_INTERVAL_SECONDS"] = "0"
+if os.getenv("TEST_DATABASE_URL"):
+    os.environ["DATABASE_URL"] = os.environ["TEST_DATABASE_URL"]
+
+import pytest
+
+
+def _run(coro):
+    """Run coro on a fresh loop; pooled connections are bound to it, so dispose them."""
+    from app.database import dispose_engines
+
+    async def main():
+        try:
+            return await coro
+        finally:
+            await dispose_engines()
+
+    return asyncio.run(main())
+
+
+@pytest.fixture(scope="session")
+def mock_upstream():
+    from bench.mock_upstream import MockUpstream
+
+    mock = MockUpstream(port=MOCK_PORT, latency="fixed:5").start()
+    yield mock
+    mock.stop()
+
+
+@pytest.fixture
+def run():
+    return _run
+
+
+@pytest.fixture
+def database():
+    if not os.getenv("TEST_DATABASE_URL"):
+        pytest.skip("TEST_DATABASE_URL is not set")
+    from app import models  # noqa: F401  (registers the tables)
+    from app.database import Base, _init_db_once, engine
+
+    async def reset():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+        await _init_db_once()
+
+    _run(reset())
@@ -0,0 +1,175 @@
+"""Batch re-processing end to end: export -> submit -> refresh -> ingest, with the local
+backend and a predictions.jsonl dropped into the job directory (no Gemini calls)."""
+import json
+import os
+from uuid import UUID
+
+from sqlalchemy import func, select, update
+
+from app.config import BATCH_DIR
+from app.database import AsyncSessionLocal
+from app.models import BatchJob, Prompt as PromptModel, Session as SessionModel
+from app.services import batch, blobstore, intent, prompt
+from app.services.intent_refinement import coverage
+
+OLD_INTENT = {
+    "goal": "old goal",
+    "current_state": "",
+    "constraints": [],
+    "tools": [],
+    "skill_level": "beginner",
+    "desired_output": "",
+}
+
+
+def _new_intent(transcript: str) -> dict:
+    return {**OLD_INTENT, "goal": f"refreshed: {transcript}"}
+
+
+async def _add_session(transcript: str, template="outdated", with_intent: bool = True) -> UUID:
+    async with AsyncSessionLocal() as db:
+        session = SessionModel(transcript=transcript)
+        if with_intent:
+            session.structured_intent_hash = await blobstore.put_json(db, OLD_INTENT)
+            session.structured_intent_template = template
+        db.add(session)
+        await db.commit()
+        return session.id
+
+
+async def _get_session(session_id: UUID) -> tuple[SessionModel, dict]:
+    async with AsyncSessionLocal() as db:
+        session = await db.get(SessionModel, session_id)
+        return session, await blobstore.get_json(db, session.structured_intent_hash)
+
+
+def _drop_predictions(job: BatchJob, texts: dict[UUID, str]) -> None:
+    """Answer every exported request the way a finished batch job would."""
+    job_dir = os.path.join(BATCH_DIR, "local", str(job.id))
+    os.makedirs(job_dir, exist_ok=True)
+    with open(job.input_path) as f:
+        lines = [json.loads(line) for line in f if line.strip()]
+    with open(os.path.join(job_dir, "predictions.jsonl"), "w") as f:
+        for line in lines:
+            session_id = UUID(line["request"]["labels"]["intentify_key"])
+            response = {"candidates": [{"content": {"parts": [{"text": texts[session_id]}]}}]}
+            f.write(json.dumps({**line, "response": response, "status": ""}) + "\n")
+
+
+async def _export_and_answer(stage: str, answer) -> BatchJob:
+    job = await batch.export(stage)
+    with open(job.input_path) as f:
+        ids = [UUID(json.loads(line)["request"]["labels"]["intentify_key"]) for line in f]
+    _drop_predictions(job, {session_id: answer(session_id) for session_id in ids})
+    return job
+
+
+async def _reingest(job_id: UUID) -> BatchJob:
+    # As if the first ingest crashed after writing: the job is claimed again.
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(BatchJob).where(BatchJob.id == job_id).values(status="succeeded"))
+        await db.commit()
+    return await batch.refresh(job_id)
+
+
+def test_intent_stage_round_trip(database, run):
+    async def scenario():
+        stale = [await _add_session("first"), await _add_session("second")]
+        await _add_session("never extracted", with_intent=False)
+        await _add_session("already current", template=intent.TEMPLATE_VERSION)
+        transcripts = {session_id: (await _get_session(session_id))[0].transcript for session_id in stale}
+
+        job = await _export_and_answer("intent", lambda sid: json.dumps(_new_intent(transcripts[sid])))
+        assert job.request_count == 2
+
+        job = await batch.submit(job.id)
+        assert job.status == "submitted"
+        job = await batch.refresh(job.id)
+        assert (job.status, job.ingested_count, job.skipped_count, job.failed_count) == ("ingested", 2, 0, 0)
+
+        for session_id in stale:
+            session, structured_intent = await _get_session(session_id)
+            assert structured_intent == _new_intent(session.transcript)
+            assert session.structured_intent_template == intent.TEMPLATE_VERSION
+            assert session.intent_transcript_hash == coverage(session.transcript, "")["intent_transcript_hash"]
+
+    run(scenario())
+
+
+def test_intent_reingest_is_idempotent(database, run):
+    async def scenario():
+        session_id = await _add_session("only")
+        job = await _export_and_answer("intent", lambda sid: json.dumps(_new_intent("only")))
+        await batch.submit(job.id)
+        await batch.refresh(job.id)
+        before, _ = await _get_session(session_id)
+
+        job = await _reingest(job.id)
+        assert job.status == "ingested"
+        after, structured_intent = await _get_session(session_id)
+        assert structured_intent == _new_intent("only")
+        assert after.structured_intent_hash == before.structured_intent_hash
+        assert after.updated_at == before.updated_at
+
+    run(scenario())
+
+
+def test_prompt_reingest_is_idempotent(database, run):
+    prompts = {"short_prompt": "s", "detailed_prompt": "d", "expert_prompt": "e"}
+
+    async def scenario():
+        session_id = await _add_session("with prompts", template=intent.TEMPLATE_VERSION)
+        session, _ = await _get_session(session_id)
+        async with AsyncSessionLocal() as db:
+            db.add(PromptModel(
+                session_id=session_id,
+                structured_intent_hash=session.structured_intent_hash,
+                template_version="outdated",
+                short_prompt="old",
+            ))
+            await db.commit()
+
+        job = await _export_and_answer("prompt", lambda sid: json.dumps(prompts))
+        assert job.request_count == 1
+        await batch.submit(job.id)
+        job = await batch.refresh(job.id)
+        assert (job.status, job.ingested_count) == ("ingested", 1)
+        await _reingest(job.id)
+
+        async with AsyncSessionLocal() as db:
+            current = (await db.execute(
+                select(PromptModel).where(
+                    PromptModel.session_id == session_id,
+                    PromptModel.template_version == prompt.TEMPLATE_VERSION,
+                )
+            )).scalars().all()
+        assert len(current) == 1
+        assert current[0].expert_prompt == "e"
+
+    run(scenario())
+
+
+def test_sessions_changed_after_export_are_skipped(database, run):
+    async def scenario():
+        kept = await _add_session("kept")
+        edited = await _add_session("edited")
+        job = await _export_and_answer("intent", lambda sid: json.dumps(_new_intent("batch")))
+
+        # An online write after the export started must win over the batch result.
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(SessionModel)
+                .where(SessionModel.id == edited)
+                .values(transcript="edited online", updated_at=func.now())
+            )
+            await db.commit()
+
+        await batch.submit(job.id)
+        job = await batch.refresh(job.id)
+        assert (job.ingested_count, job.skipped_count) == (1, 1)
+        assert (await _get_session(kept))[1] == _new_intent("batch")
+        session, structured_intent = await _get_session(edited)
+        assert structured_intent == OLD_INTENT
+        assert session.structured_intent_template == "outdated"
+
+    run(scenario())
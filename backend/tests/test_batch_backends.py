@@ -0,0 +1,38 @@
+"""LocalFileBackend job ownership across processes (simulated with two instances)."""
+import os
+import time
+
+from app.services.batch_backends import LocalFileBackend, _OWNER, _OWNER_STALE_SECONDS
+
+
+def _job(tmp_path, name: str = "job-1") -> str:
+    (tmp_path / name).mkdir()
+    (tmp_path / name / "input.jsonl").write_text("")
+    return name
+
+
+def test_only_one_process_claims_a_job(tmp_path):
+    job = _job(tmp_path)
+    first, second = LocalFileBackend(str(tmp_path)), LocalFileBackend(str(tmp_path))
+    assert first._claim(job)
+    assert not second._claim(job)
+    assert not first._claim(job)
+
+
+def test_stale_owner_is_taken_over(tmp_path):
+    job = _job(tmp_path)
+    assert LocalFileBackend(str(tmp_path))._claim(job)
+    owner = tmp_path / job / _OWNER
+    old = time.time() - _OWNER_STALE_SECONDS - 5
+    os.utime(owner, (old, old))
+    assert LocalFileBackend(str(tmp_path))._claim(job)
+    assert time.time() - owner.stat().st_mtime < _OWNER_STALE_SECONDS
+
+
+def test_dropped_predictions_complete_the_job_without_running_it(tmp_path, run):
+    job = _job(tmp_path)
+    (tmp_path / job / "predictions.jsonl").write_text("")
+    backend = LocalFileBackend(str(tmp_path))
+    assert run(backend.poll(job)).state == "succeeded"
+    backend._start(job)
+    assert not (tmp_path / job / _OWNER).exists()
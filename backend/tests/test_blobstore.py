@@ -0,0 +1,46 @@
+"""Blob hashes are remembered only once their rows are known to be committed."""
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from app.services import blobstore
+
+
+@pytest.fixture(autouse=True)
+def empty_known(monkeypatch):
+    monkeypatch.setattr(blobstore, "_known", {})
+
+
+def _pending(session: Session, digest: str) -> None:
+    session.execute(text("SELECT 1"))  # begin a transaction
+    session.info.setdefault(blobstore._PENDING, set()).add(digest)
+
+
+def test_pending_digests_are_remembered_on_commit_only():
+    with Session(create_engine("sqlite://")) as session:
+        _pending(session, "committed")
+        session.commit()
+        _pending(session, "rolled-back")
+        session.rollback()
+        _pending(session, "discarded")
+    assert list(blobstore._known) == ["committed"]
+    assert blobstore._PENDING not in session.info
+
+
+def test_put_remembers_stored_content_after_commit(database, run):
+    from app.database import AsyncSessionLocal
+
+    async def main():
+        async with AsyncSessionLocal() as db:
+            digest = await blobstore.put_text(db, "summary")
+            await blobstore.put_text(db, "summary")  # sees its own uncommitted row
+            assert digest not in blobstore._known
+            await db.commit()
+        assert digest in blobstore._known
+
+        blobstore._known.clear()
+        async with AsyncSessionLocal() as db:
+            await blobstore.put_text(db, "summary")  # already stored: a select hit
+        assert digest in blobstore._known
+
+    run(main())
@@ -0,0 +1,17 @@
+"""A draining instance refuses new work with a 503 browsers can read."""
+from fastapi.testclient import TestClient
+
+from app.config import CORS_ORIGINS
+from app.main import app
+from app.services.drain import drainer
+
+
+def test_draining_503_carries_cors_headers(monkeypatch):
+    monkeypatch.setattr(drainer, "draining", True)
+    origin = CORS_ORIGINS[0]
+    # No lifespan: the refusal happens before anything touches the database.
+    response = TestClient(app).post("/session/start", json={}, headers={"Origin": origin})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    assert response.headers["access-control-allow-origin"] == origin
+    assert "Retry-After" in response.headers["access-control-expose-headers"]
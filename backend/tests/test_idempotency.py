@@ -0,0 +1,95 @@
+"""Idempotency-Key request fingerprints: retries replay, a reused key with another body is refused."""
+from contextlib import contextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.database import dispose_engines
+from app.services import idempotency
+
+
+def _app() -> tuple[FastAPI, list]:
+    app = FastAPI()
+    calls = []
+
+    @app.middleware("http")
+    async def idempotent_requests(request: Request, call_next):
+        return await idempotency.handle(request, call_next)
+
+    @app.post("/echo")
+    async def echo(request: Request):
+        body = await request.body()
+        calls.append(body)
+        return {"body": body.decode("utf-8"), "calls": len(calls)}
+
+    return app, calls
+
+
+@contextmanager
+def _client(app: FastAPI):
+    # One event loop for the whole test; pooled connections are bound to it.
+    with TestClient(app) as client:
+        try:
+            yield client
+        finally:
+            client.portal.call(dispose_engines)
+
+
+def test_fingerprint_ignores_multipart_boundary(run):
+    def request(boundary: str, text: str) -> Request:
+        body = (
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"t\"\r\n\r\n{text}\r\n--{boundary}--\r\n"
+        ).encode("utf-8")
+
+        async def receive():
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        return Request({
+            "type": "http",
+            "method": "POST",
+            "headers": [(b"content-type", f"multipart/form-data; boundary={boundary}".encode("utf-8"))],
+        }, receive)
+
+    first, _ = run(idempotency._fingerprint(request("aaaa", "hello")))
+    retry, _ = run(idempotency._fingerprint(request("bbbb", "hello")))
+    other, _ = run(idempotency._fingerprint(request("aaaa", "bye")))
+    assert first == retry
+    assert first != other
+
+
+def test_body_still_reaches_the_endpoint(database):
+    app, calls = _app()
+    with _client(app) as client:
+        response = client.post("/echo", content=b"payload", headers={"Idempotency-Key": "k-body"})
+    assert response.json() == {"body": "payload", "calls": 1}
+
+
+def test_retry_replays_and_different_body_is_refused(database):
+    app, calls = _app()
+    headers = {"Idempotency-Key": "k-reuse"}
+    with _client(app) as client:
+        first = client.post("/echo", content=b"one", headers=headers)
+        retry = client.post("/echo", content=b"one", headers=headers)
+        reused = client.post("/echo", content=b"two", headers=headers)
+    assert retry.json() == first.json()
+    assert retry.headers.get("Idempotent-Replayed") == "true"
+    assert reused.status_code == 422
+    assert calls == [b"one"]
+
+
+def test_replays_and_refusals_carry_cors_headers(database):
+    from app.config import CORS_ORIGINS
+    from app.main import app
+
+    origin = CORS_ORIGINS[0]
+    headers = {"Idempotency-Key": "k-cors", "Origin": origin}
+    with _client(app) as client:
+        first = client.post("/session/start", json={}, headers=headers)
+        retry = client.post("/session/start", json={}, headers=headers)
+        reused = client.post("/session/start", json={"other": 1}, headers=headers)
+    assert first.status_code == retry.status_code == 200
+    assert retry.headers.get("Idempotent-Replayed") == "true"
+    assert reused.status_code == 422
+    for response in (retry, reused):
+        assert response.headers["access-control-allow-origin"] == origin
+    assert "Idempotent-Replayed" in retry.headers["access-control-expose-headers"]
@@ -0,0 +1,11 @@
+"""Importing the API stays within its startup budget and leaves deferred SDKs unloaded."""
+from bench.importtime import BUDGET_MS, LAZY_MODULES, measure
+
+
+def test_import_budget_and_lazy_modules():
+    # Best of three, like `make importtime`: the first run also warms the OS cache.
+    runs = [measure("app.main") for _ in range(3)]
+    eager = {name for timings in runs for name in timings if name in LAZY_MODULES}
+    assert not eager
+    best_ms = min(timings["app.main"][1] for timings in runs) / 1000.0
+    assert best_ms <= BUDGET_MS
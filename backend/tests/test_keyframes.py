@@ -0,0 +1,79 @@
+"""Screen uploads: video sampling keeps the final state; bad or oversized media is refused early."""
+import io
+
+import pytest
+
+av = pytest.importorskip("av")
+Image = pytest.importorskip("PIL.Image")
+
+from app.config import SCREEN_MAX_FRAMES
+from app.services import keyframes
+
+
+def _video(seconds: int, fps: int = 2) -> bytes:
+    """An MPEG-4 clip whose frames are solid gray levels rising over time."""
+    out = io.BytesIO()
+    with av.open(out, mode="w", format="mp4") as container:
+        stream = container.add_stream("mpeg4", rate=fps)
+        stream.width, stream.height, stream.pix_fmt = 64, 64, "yuv420p"
+        total = seconds * fps
+        for i in range(total):
+            level = round(255 * i / (total - 1))
+            frame = av.VideoFrame.from_image(Image.new("RGB", (64, 64), (level, level, level)))
+            for packet in stream.encode(frame):
+                container.mux(packet)
+        for packet in stream.encode():
+            container.mux(packet)
+    return out.getvalue()
+
+
+def _level(image) -> int:
+    return image.convert("L").getpixel((32, 32))
+
+
+@pytest.mark.parametrize("seconds", [10, SCREEN_MAX_FRAMES * 3])
+def test_video_samples_end_with_the_final_frame(seconds):
+    images = keyframes._video_frames(_video(seconds))
+    assert 1 < len(images) <= SCREEN_MAX_FRAMES
+    assert _level(images[-1]) > 245
+    levels = [_level(image) for image in images]
+    assert levels == sorted(levels)
+
+
+def test_long_video_is_sampled_across_its_duration():
+    images = keyframes._video_frames(_video(SCREEN_MAX_FRAMES * 3))
+    levels = [_level(image) for image in images]
+    # Evenly spread, not the first SCREEN_MAX_FRAMES seconds plus the last frame.
+    assert levels[len(levels) // 2] > 100
+
+
+def _png(size: int = 64) -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", (size, size)).save(out, format="PNG")
+    return out.getvalue()
+
+
+def test_decompression_bomb_is_too_large(monkeypatch):
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 64)
+    with pytest.raises(keyframes.MediaTooLarge):
+        keyframes._open_image(_png())
+
+
+def test_bad_screen_is_refused_before_speech(database, mock_upstream):
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app) as client:
+        session_id = client.post("/session/start", json={}).json()["id"]
+        recognized = mock_upstream.calls.get("recognize", 0)
+        response = client.post(
+            f"/session/{session_id}/capture",
+            files=[
+                ("audio", ("a.webm", b"\x1aE\xdf\xa3", "audio/webm")),
+                ("frames", ("1.png", _png(), "image/png")),
+                ("screen", ("2.png", b"not an image", "image/png")),
+            ],
+        )
+    assert response.status_code == 415
+    assert mock_upstream.calls.get("recognize", 0) == recognized
@@ -0,0 +1,20 @@
+"""Read-your-writes stickiness matches the session however its id is spelled."""
+import asyncio
+from uuid import uuid4
+
+from app.services import read_routing
+
+
+def test_recent_write_matches_any_spelling_of_the_session_id(monkeypatch):
+    monkeypatch.setattr(read_routing, "DATABASE_READ_URL", "postgresql+asyncpg://replica/db")
+    written, other = uuid4(), uuid4()
+
+    async def main():
+        await read_routing.note_write(written)
+        return [
+            await read_routing._recently_written(session_id)
+            for session_id in (str(written).upper(), written.hex, str(other), "not-a-uuid")
+        ]
+
+    # Unparseable ids go to the primary; the handler rejects them anyway.
+    assert asyncio.run(main()) == [True, True, False, True]
@@ -0,0 +1,61 @@
+"""Fair scheduling order and admission of upstream calls."""
+import asyncio
+
+import pytest
+
+from app.services import scheduler
+from app.services.scheduler import FairScheduler, UpstreamBusy, set_tenant
+
+
+async def _call(sched: FairScheduler, tenant: str, order: list, gate: asyncio.Event = None) -> None:
+    set_tenant(tenant)
+    async with sched.slot("interactive"):
+        order.append(tenant)
+        if gate is not None:
+            await gate.wait()
+
+
+def test_uncontended_history_does_not_count_against_a_tenant(monkeypatch):
+    monkeypatch.setattr(scheduler, "UPSTREAM_USER_QUEUE_LIMIT", 100)
+
+    async def scenario():
+        sched = FairScheduler("test", 1)
+        order: list[str] = []
+        for _ in range(200):
+            await _call(sched, "a", order)
+        order.clear()
+
+        gate = asyncio.Event()
+        blocker = asyncio.create_task(_call(sched, "c", order, gate))
+        await asyncio.sleep(0)
+        queued = [asyncio.create_task(_call(sched, "b", order)) for _ in range(30)]
+        queued += [asyncio.create_task(_call(sched, "a", order)) for _ in range(3)]
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(blocker, *queued)
+        return order
+
+    order = asyncio.run(scenario())
+    # a's three calls interleave with b's instead of waiting behind all 30.
+    assert [i for i, tenant in enumerate(order) if tenant == "a"] == [2, 4, 6]
+
+
+def test_rejected_calls_are_not_charged(monkeypatch):
+    monkeypatch.setattr(scheduler, "UPSTREAM_USER_QUEUE_LIMIT", 1)
+
+    async def scenario():
+        sched = FairScheduler("test", 1)
+        gate = asyncio.Event()
+        order: list[str] = []
+        blocker = asyncio.create_task(_call(sched, "c", order, gate))
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(_call(sched, "a", order))
+        await asyncio.sleep(0)
+        charged = dict(sched._last_finish)
+        with pytest.raises(UpstreamBusy):
+            await _call(sched, "a", order)
+        assert sched._last_finish == charged
+        gate.set()
+        await asyncio.gather(blocker, waiting)
+
+    asyncio.run(scenario())
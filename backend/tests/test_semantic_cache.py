@@ -0,0 +1,57 @@
+"""Semantic cache snapshots from several workers merge instead of overwriting each other."""
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from app.services import semantic_cache as semantic_cache_module
+from app.services.semantic_cache import SemanticCache, SemanticQuery
+
+
+@pytest.fixture
+def make_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(semantic_cache_module, "np", np)
+
+    def make(max_entries: int = 8) -> SemanticCache:
+        return SemanticCache(path=str(tmp_path / "cache"), max_entries=max_entries, enabled=True)
+
+    return make
+
+
+def _store(cache: SemanticCache, axis: int, goal: str) -> None:
+    vec = np.zeros(16, dtype=np.float32)
+    vec[axis] = 1.0
+    cache.store(SemanticQuery(vector=vec), {"goal": goal})
+
+
+def _goals(cache: SemanticCache) -> list:
+    return [entry["structured_intent"]["goal"] for entry in cache._entries if entry is not None]
+
+
+def test_worker_snapshots_merge(make_cache):
+    first, second = make_cache(), make_cache()
+    _store(first, 0, "a")
+    _store(first, 1, "b")
+    _store(second, 1, "b")
+    _store(second, 2, "c")
+    first.snapshot()
+    second.snapshot()
+
+    loaded = make_cache()
+    loaded.load()
+    assert _goals(loaded) == ["a", "b", "c"]
+    assert sorted(entry["id"] for entry in loaded._entries if entry) == [1, 2, 3]
+    _store(loaded, 3, "d")
+    assert loaded._entries[3]["id"] == 4
+
+
+def test_merged_snapshot_keeps_newest_entries(make_cache):
+    first, second = make_cache(max_entries=3), make_cache(max_entries=3)
+    for axis, goal in enumerate("abcd"):  # wraps the ring: a is evicted
+        _store(first, axis, goal)
+    _store(second, 9, "z")
+    first.snapshot()
+    second.snapshot()
+
+    loaded = make_cache(max_entries=3)
+    loaded.load()
+    assert _goals(loaded) == ["c", "d", "z"]
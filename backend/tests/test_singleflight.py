@@ -0,0 +1,50 @@
+"""Single-flight callers share a call; an abandoned call is not handed to newcomers."""
+import asyncio
+
+import pytest
+
+from app.services.singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def main():
+        return await asyncio.gather(*(flight.do("k", fetch) for _ in range(3)))
+
+    assert asyncio.run(main()) == ["result"] * 3
+    assert calls == [1]
+    assert flight.in_flight() == 0
+
+
+def test_caller_after_cancel_starts_a_new_call():
+    flight = SingleFlight("test")
+    started = []
+
+    async def fetch():
+        started.append(1)
+        try:
+            await asyncio.sleep(0.05)
+        except asyncio.CancelledError:
+            await asyncio.sleep(0.01)  # unwinds slowly, like a closing connection
+            raise
+        return len(started)
+
+    async def main():
+        first = asyncio.ensure_future(flight.do("k", fetch))
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        # The abandoned call is still unwinding; joining it would raise CancelledError.
+        return await flight.do("k", fetch)
+
+    assert asyncio.run(main()) == 2
+    assert started == [1, 1]
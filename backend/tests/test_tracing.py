@@ -0,0 +1,90 @@
+"""Span trees and Server-Timing for calls through the Gemini and Speech stand-in."""
+import asyncio
+import re
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import tracing
+from app.services.intent import IntentService
+
+
+def _child(span: tracing.Span, name: str) -> tracing.Span:
+    matches = [c for c in span.children if c.name == name]
+    assert matches, f"{span.name} has no child {name}: {[c.name for c in span.children]}"
+    return matches[0]
+
+
+def _timing(header: str) -> dict[str, float]:
+    return {name: float(dur) for name, dur in re.findall(r"([\w.]+);dur=([\d.]+)", header)}
+
+
+@pytest.fixture
+def traces():
+    finished: list[tracing.Span] = []
+    tracing.add_listener(finished.append)
+    yield finished
+    tracing.remove_listener(finished.append)
+
+
+def test_gemini_call_span_tree(mock_upstream, traces):
+    with tracing.start_trace("test") as root:
+        asyncio.run(IntentService().extract_intent("fix my cors error", "browser console"))
+
+    assert traces == [root]
+    text = _child(root, "gemini.text")
+    region = _child(text, "gemini.region")
+    assert region.attributes["attempt"] == 0
+    network = _child(region, "gemini.network")
+    assert network.attributes["bytes_out"] > 0
+    _child(region, "gemini.parse")
+    _child(root, "intent.parse")
+    assert [c.name for c in root.children] == ["gemini.text", "intent.parse"]
+    assert text.start <= region.start <= network.start and network.end <= region.end <= text.end
+
+    timing = _timing(tracing.server_timing(root))
+    assert list(timing)[-1] == "total"
+    assert {"gemini.text", "gemini.region", "gemini.network", "gemini.parse", "intent.parse"} <= set(timing)
+    assert timing["gemini.network"] <= timing["gemini.text"] <= timing["total"]
+
+
+def test_speech_call_span_tree(mock_upstream, traces):
+    pytest.importorskip("google.cloud.speech_v1")
+    from app.services.speech import SpeechService
+
+    with tracing.start_trace("test") as root:
+        transcript = asyncio.run(SpeechService().transcribe_audio(b"\x1aE\xdf\xa3"))
+
+    assert transcript
+    speech = _child(root, "speech")
+    assert speech.attributes["audio_bytes"] == 4
+    _child(speech, "speech.queue")
+    assert "speech;dur=" in tracing.server_timing(root)
+
+
+def test_spans_outside_a_trace_are_no_ops():
+    with tracing.span("orphan") as orphan:
+        assert orphan is None
+    assert tracing.current_span() is None
+
+
+def test_request_trace_and_server_timing(database, mock_upstream, traces):
+    from app.main import app
+
+    with TestClient(app) as client:
+        session_id = client.post("/session/start", json={}).json()["id"]
+        traces.clear()
+        response = client.post(
+            f"/prompts/{session_id}/intent",
+            json={"transcript": "fix my cors error", "screen_summary": "browser console"},
+        )
+
+    assert response.status_code == 200
+    root = next(t for t in traces if t.name == f"POST /prompts/{session_id}/intent")
+    assert any(c.name == "db" for c in root.children)
+    network = _child(_child(_child(root, "gemini.text"), "gemini.region"), "gemini.network")
+    assert network.end <= root.end
+
+    timing = _timing(response.headers["Server-Timing"])
+    assert {"db", "gemini.text", "gemini.network", "total"} <= set(timing)
+    assert timing["gemini.text"] <= timing["total"]
@@ -7,6 +7,11 @@ const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8003'
 
 const CAPTURE_STOP_MESSAGE = 'intentify-stop-capture'
 
+// Frames grabbed while recording; the backend keeps the visually distinct ones
+// (plus the final screenshot) and analyzes them in one call.
+const FRAME_INTERVAL_MS = 3000
+const MAX_FRAMES = 20
+
 const STOP_POPUP_HTML = `
 <!DOCTYPE html>
 <html>
@@ -105,9 +110,41 @@ export default function UnifiedCapture({
   const previewVideoRef = useRef<HTMLVideoElement | null>(null)
   const captureVideoRef = useRef<HTMLVideoElement | null>(null) // hidden, used for frame grab
   const stopPopupRef = useRef<Window | null>(null)
+  const framesRef = useRef<Blob[]>([])
+  const frameTimerRef = useRef<number | null>(null)
   const stopCaptureRef = useRef<(() => void) | null>(null)
 
+  const stopFrameTimer = useCallback(() => {
+    if (frameTimerRef.current !== null) {
+      window.clearInterval(frameTimerRef.current)
+      frameTimerRef.current = null
+    }
+  }, [])
+
+  const grabFrame = useCallback(() => {
+    const src = captureVideoRef.current
+    if (!src || !src.videoWidth) return
+    const canvas = document.createElement('canvas')
+    canvas.width = src.videoWidth
+    canvas.height = src.videoHeight
+    const ctx = canvas.getContext('2d')
+    if (!ctx) return
+    ctx.drawImage(src, 0, 0)
+    canvas.toBlob(
+      (blob) => {
+        if (!blob) return
+        const frames = framesRef.current
+        frames.push(blob)
+        // Keep the first frame; drop the oldest after it.
+        if (frames.length > MAX_FRAMES) frames.splice(1, 1)
+      },
+      'image/jpeg',
+      0.8
+    )
+  }, [])
+
   const cleanup = useCallback(() => {
+    stopFrameTimer()
     if (audioStreamRef.current) {
       audioStreamRef.current.getTracks().forEach((t) => t.stop())
       audioStreamRef.current = null
@@ -125,11 +162,12 @@ export default function UnifiedCapture({
     stopPopupRef.current = null
     setIsCapturing(false)
     setIsRecording(false)
-  }, [])
+  }, [stopFrameTimer])
 
   const stopCapture = useCallback(() => {
     const mr = mediaRecorderRef.current
     if (!mr || mr.state === 'inactive') return
+    stopFrameTimer()
     if (mr.state === 'recording') {
       mr.requestData()
       mr.stop()
@@ -141,7 +179,7 @@ export default function UnifiedCapture({
       }
     } catch (_) {}
     stopPopupRef.current = null
-  }, [])
+  }, [stopFrameTimer])
 
   stopCaptureRef.current = stopCapture
 
@@ -186,6 +224,8 @@ export default function UnifiedCapture({
       video.srcObject = screenStream
       video.play().catch(() => {})
       captureVideoRef.current = video
+      framesRef.current = []
+      frameTimerRef.current = window.setInterval(grabFrame, FRAME_INTERVAL_MS)
 
       // Prefer opus for backend (WEBM_OPUS); fallback for Safari/other browsers
       const mimeOptions =
@@ -263,6 +303,7 @@ export default function UnifiedCapture({
           if (audioBlob.size > 0) {
             formData.append('audio', audioBlob, 'audio.webm')
           }
+          framesRef.current.forEach((frame, i) => formData.append('frames', frame, `frame-${i}.jpg`))
           formData.append('screen', screenBlob, 'screenshot.png')
           try {
             const response = await axios.post(
@@ -283,6 +324,7 @@ export default function UnifiedCapture({
           } finally {
             setIsProcessing(false)
             audioChunksRef.current = []
+            framesRef.current = []
             cleanup()
           }
         },